@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Summarizes the slow-query log written by the API (see utils/slow_query_log.py).
+
+Entries are grouped by question pattern: the question folded to lowercase with
+known skills, locations, degrees and numbers replaced by placeholders, so
+"React developers in Brazil" and "Python developers in Chile" count as one
+pattern. Each pattern reports how often it was slow, its latency percentiles,
+the agent's time, the searches the agent ran for it and a hint where one
+applies:
+
+    cache  - the same question was slow more than once; the response cache
+             missed it (disabled, expired or evicted)
+    route  - the query router would answer the question directly now, or the
+             agent only filtered or aggregated, which the router could take on
+
+Examples:
+    python analyze_slow_queries.py
+    python analyze_slow_queries.py "slow_queries_*.jsonl*" --top 10
+    python analyze_slow_queries.py slow_queries.jsonl --endpoint chat --output report.json
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import argparse
+import contextlib
+
+import numpy as np
+
+from config import SLOW_QUERY_LOG_PATH
+from utils.query_router import DEGREE_PATTERNS, Vocabulary, fold, parse_query
+
+_NUMBER = re.compile(r"\$?\d[\d,.]*\s*k?\b")
+_SPACES = re.compile(r"\s+")
+
+def log_files(patterns):
+    """
+    Expands file names and globs to the log files to read, rotated ones included.
+
+    Args:
+        patterns: File names or glob patterns.
+
+    Returns:
+        Sorted list of paths, oldest rotation first.
+    """
+    paths = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern) or ([pattern] if os.path.exists(pattern) else [])
+        for path in matches:
+            paths.add(path)
+            # RotatingFileHandler keeps older entries in path.1, path.2, ...
+            paths.update(glob.glob(glob.escape(path) + ".[0-9]*"))
+
+    def rotation(path):
+        suffix = path.rsplit(".", 1)[-1]
+        return (-int(suffix) if suffix.isdigit() else 0, path)
+    return sorted(paths, key=rotation)
+
+def read_entries(paths):
+    """Reads the JSON Lines entries of the given files, skipping unreadable lines."""
+    entries = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    print(f"Skipping malformed line {number} of {path}", file=sys.stderr)
+    return entries
+
+def load_vocabulary():
+    """The router's vocabulary from the local candidate index, or None if it isn't available."""
+    try:
+        # The index logs with print(); keep stdout for the report
+        with contextlib.redirect_stdout(sys.stderr):
+            from utils.candidate_index import get_candidate_index
+            index = get_candidate_index()
+        if index is not None:
+            return Vocabulary(index.skills(), index.locations())
+    except Exception as e:
+        print(f"Note: Could not load the router vocabulary: {e}", file=sys.stderr)
+    return None
+
+def question_pattern(message, vocabulary=None):
+    """
+    The pattern a question is grouped under.
+
+    Args:
+        message: The logged question.
+        vocabulary: Optional Vocabulary whose skills and locations become placeholders.
+
+    Returns:
+        The question folded to lowercase with <skill>, <location>, <degree>
+        and <n> placeholders.
+    """
+    text = fold(message)
+    if vocabulary is not None:
+        # Locations first: "New York" must not lose a word to a skill match
+        if vocabulary.location_pattern:
+            text = vocabulary.location_pattern.sub("<location>", text)
+        if vocabulary.skill_pattern:
+            text = vocabulary.skill_pattern.sub("<skill>", text)
+    for pattern, level in DEGREE_PATTERNS:
+        text = re.sub(pattern, "<degree>", text)
+    text = _NUMBER.sub("<n>", text)
+    return _SPACES.sub(" ", text).strip(" ?.!")
+
+def search_signature(search):
+    """A short description of one agent search: collection, whether it had query text, filtered properties."""
+    filters = sorted({
+        item.get("property_name")
+        for group in search.get("filters") or []
+        for item in (group if isinstance(group, list) else [group])
+        if isinstance(item, dict) and item.get("property_name")
+    })
+    kind = "search" if any(query for query in search.get("queries") or []) else "filter"
+    signature = f"{search.get('collection', '?')}:{kind}"
+    return signature + (f"[{','.join(filters)}]" if filters else "")
+
+def only_filters(entry):
+    """Whether the agent answered without any semantic search: filters and aggregations only."""
+    searches = entry.get("searches") or []
+    if not searches and not entry.get("aggregations"):
+        return False
+    return all(search_signature(search).split(":", 1)[1].startswith("filter") for search in searches)
+
+def _percentiles(values):
+    if not values:
+        return {}
+    values = np.asarray(values, dtype=float)
+    return {
+        "p50": round(float(np.percentile(values, 50)), 1),
+        "p95": round(float(np.percentile(values, 95)), 1),
+        "max": round(float(values.max()), 1),
+    }
+
+def _counts(values, limit=None):
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    return dict(sorted(counts.items(), key=lambda item: -item[1])[:limit])
+
+def analyze(entries, vocabulary=None, top=20, examples=3):
+    """
+    Groups slow-query log entries by question pattern.
+
+    Args:
+        entries: Parsed log entries.
+        vocabulary: Optional Vocabulary for the patterns and route hints.
+        top: How many patterns to report, slowest total time first.
+        examples: How many example questions to keep per pattern.
+
+    Returns:
+        The report's "patterns" list.
+    """
+    groups = {}
+    for entry in entries:
+        message = entry.get("message")
+        if message:
+            groups.setdefault(question_pattern(message, vocabulary), []).append(entry)
+
+    patterns = []
+    for pattern, group in groups.items():
+        messages = _counts(fold(entry["message"]).strip() for entry in group)
+        stages = {}
+        for entry in group:
+            for stage, ms in (entry.get("stages_ms") or {}).items():
+                stages.setdefault(stage, []).append(ms)
+
+        hints = []
+        standalone = _counts(fold(entry["message"]).strip() for entry in group if not entry.get("follow_up"))
+        if any(count > 1 for count in standalone.values()):
+            hints.append("cache")
+        agent_entries = [entry for entry in group if entry.get("route") == "agent"]
+        routable = vocabulary is not None and any(
+            not entry.get("follow_up") and parse_query(entry["message"], vocabulary) is not None for entry in agent_entries
+        )
+        if routable or (agent_entries and all(only_filters(entry) for entry in agent_entries)):
+            hints.append("route")
+
+        patterns.append({
+            "pattern": pattern,
+            "count": len(group),
+            "distinct_questions": len(messages),
+            "total_time_ms": round(sum(entry.get("total_ms") or 0 for entry in group), 1),
+            "total_ms": _percentiles([entry["total_ms"] for entry in group if entry.get("total_ms") is not None]),
+            "agent_ms": _percentiles([entry["agent_total_time_ms"] for entry in group if entry.get("agent_total_time_ms") is not None]),
+            "stages_ms": {stage: _percentiles(values) for stage, values in sorted(stages.items())},
+            "routes": _counts(entry.get("route") or "unknown" for entry in group),
+            "endpoints": _counts(entry.get("endpoint") or "unknown" for entry in group),
+            "errors": sum(1 for entry in group if entry.get("error")),
+            "searches": _counts((search_signature(search) for entry in group for search in entry.get("searches") or []), 5),
+            "aggregations": sum(len(entry.get("aggregations") or []) for entry in group),
+            "hints": hints,
+            "examples": list(messages)[:examples],
+        })
+    patterns.sort(key=lambda item: -item["total_time_ms"])
+    return patterns[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Group slow-query log entries by question pattern")
+    parser.add_argument("paths", nargs="*", default=[SLOW_QUERY_LOG_PATH.replace("{pid}", "*")],
+                        help="Log files or globs; rotated .1, .2, ... files are read too (default: SLOW_QUERY_LOG_PATH)")
+    parser.add_argument("--endpoint", help="Only entries of this endpoint (chat, chat_stream, chat_batch)")
+    parser.add_argument("--min-ms", type=float, default=0, help="Only entries slower than this")
+    parser.add_argument("--top", type=int, default=20, help="Number of patterns to report (default 20)")
+    parser.add_argument("--examples", type=int, default=3, help="Example questions per pattern (default 3)")
+    parser.add_argument("--no-vocabulary", action="store_true", help="Don't load the candidate index for skill/location placeholders")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+
+    paths = log_files(args.paths)
+    if not paths:
+        parser.error(f"no slow-query log found at {', '.join(args.paths)}")
+    entries = [
+        entry for entry in read_entries(paths)
+        if (not args.endpoint or entry.get("endpoint") == args.endpoint) and (entry.get("total_ms") or 0) >= args.min_ms
+    ]
+    vocabulary = None if args.no_vocabulary else load_vocabulary()
+    patterns = analyze(entries, vocabulary, args.top, args.examples)
+
+    report = {
+        "files": paths,
+        "entries": len(entries),
+        "patterns_total": len({question_pattern(entry["message"], vocabulary) for entry in entries if entry.get("message")}),
+        "vocabulary": vocabulary is not None,
+        "total_ms": _percentiles([entry["total_ms"] for entry in entries if entry.get("total_ms") is not None]),
+        "patterns": patterns,
+    }
+
+    encoded = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(encoded + "\n")
+    else:
+        print(encoded)
+
+    print(f"{len(entries)} slow requests in {len(paths)} file(s), {report['patterns_total']} question patterns", file=sys.stderr)
+    for item in patterns[:5]:
+        hints = f" [{', '.join(item['hints'])}]" if item["hints"] else ""
+        print(f"  {item['count']:>5}x p95 {item['total_ms'].get('p95')} ms  {item['pattern']}{hints}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
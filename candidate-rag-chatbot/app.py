@@ -1,23 +1,211 @@
-import json
+import os
+import math
+import time
+import functools
 import traceback
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g, make_response, send_from_directory
 from flask_cors import CORS
 import uuid
 
 # Import configuration and utilities
-from config import DEBUG, PORT, HOST
-from utils.weaviate_client import run_query
-from utils.response_formatter import format_chatbot_response, enhance_candidate_response
+from config import DEBUG, PORT, HOST, COALESCING_TIMEOUT, BATCH_MAX_MESSAGES, BATCH_MAX_CONCURRENCY
+from utils.query_backend import run_query, run_query_stream
+from utils.candidate_index import candidate_index_stats
+from utils.chat_pipeline import (
+    conversation_store,
+    response_cache,
+    get_context,
+    query_router,
+    route_stats,
+    context_stats,
+    route_query,
+    agent_flights,
+    agent_breaker,
+    admission_control,
+    coalescing_stats,
+    DEGRADABLE_ERRORS,
+    degraded_answer,
+    flight_key,
+    get_cached_response,
+    cache_response,
+    build_chat_response,
+    sse_event,
+    ChatStream,
+)
+from utils.batch import run_batch, timed, batch_summary
+from utils.warmup import start_warmup, readiness
+from utils.deadline import Deadline, DEADLINE_HEADER, call_with_deadline, iterate_with_deadline
+from utils.circuit_breaker import CircuitOpenError
+from utils.admission import AdmissionRejected, client_key
+from utils.slow_query_log import start_trace, trace_question, trace_error
+from utils.profiler import (
+    profiler,
+    attach_thread,
+    admin_authorized,
+    valid_profile_id,
+    PROFILE_HEADER,
+    ADMIN_TOKEN_HEADER,
+    PROFILE_ID_HEADER,
+    PROFILE_KINDS,
+)
+from utils.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    JSON_SERIALIZATION,
+    REQUEST_SECONDS,
+    REQUESTS,
+    IN_FLIGHT,
+    record_error,
+    render_metrics,
+)
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Store conversation history - in production this would use a database
-# For simplicity, we're using an in-memory dictionary here
-conversation_history = {}
+# Connect, build the agent and load the index in the background; see /api/ready
+start_warmup()
+
+# Chat routes traced for the slow-query log (batch questions are traced one by one)
+TRACED_ENDPOINTS = ("chat", "chat_stream")
+# Routes profiled at PROFILER_SAMPLE_RATE; any route can ask with the X-Profile header
+PROFILED_ENDPOINTS = ("chat", "chat_stream", "chat_batch")
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_endpoint = request.endpoint or "unknown"
+    # First, so the profile covers the whole request
+    trigger = profiler.trigger(g.metrics_endpoint in PROFILED_ENDPOINTS, request.headers.get(PROFILE_HEADER), request.headers.get(ADMIN_TOKEN_HEADER))
+    g.profile = profiler.start(g.metrics_endpoint, request.method, request.path, trigger) if trigger else None
+    g.metrics_start = time.perf_counter()
+    g.metrics_pending = True
+    g.trace = start_trace(g.metrics_endpoint) if g.metrics_endpoint in TRACED_ENDPOINTS else None
+    IN_FLIGHT.labels(endpoint=g.metrics_endpoint).inc()
+    # A no-op once this worker's warm-up has started
+    start_warmup()
+
+def finish_request_metrics(endpoint, start_time, status, trace, profile):
+    IN_FLIGHT.labels(endpoint=endpoint).dec()
+    REQUEST_SECONDS.labels(endpoint=endpoint).observe(time.perf_counter() - start_time)
+    REQUESTS.labels(endpoint=endpoint, status=status).inc()
+    if trace is not None:
+        trace.finish(status)
+    if profile is not None:
+        profile.finish(status)
+
+@app.after_request
+def defer_request_metrics(response):
+    # Streamed responses are still being sent here; finish when the body is closed
+    endpoint, start_time, trace, profile = g.metrics_endpoint, g.metrics_start, g.trace, g.profile
+    g.metrics_pending = False
+    if profile is not None:
+        response.headers[PROFILE_ID_HEADER] = profile.id
+    response.call_on_close(lambda: finish_request_metrics(endpoint, start_time, response.status_code, trace, profile))
+    return response
+
+@app.teardown_request
+def abandon_request_metrics(error=None):
+    # Requests that ended without a response (unhandled exception)
+    if g.get('metrics_pending'):
+        g.metrics_pending = False
+        finish_request_metrics(g.metrics_endpoint, g.metrics_start, 500, g.trace, g.profile)
+
+def answer_message(message, context, deadline):
+    """
+    Answers a chat message: repeated questions from the cache, structured questions
+    with a direct query, and everything else through the Weaviate Query Agent,
+    sharing the call with identical requests already in flight.
+
+    The agent call goes through the circuit breaker and must finish before the
+    deadline; when it can't, the answer is degraded (see degraded_answer).
+
+    Args:
+        message: The user's chat message.
+        context: The conversation context, or None for a new conversation.
+        deadline: The request's Deadline.
+
+    Returns:
+        (agent_response, route)
+    """
+    trace_question(message, context)
+
+    agent_response = get_cached_response(message, context)
+    if agent_response is not None:
+        return agent_response, "cache"
+
+    agent_response = route_query(message, context)
+    if agent_response is not None:
+        return agent_response, "direct"
+
+    def call_agent():
+        # Runs to completion even if the request stops waiting, so a late answer is still cached
+        response = run_query(message, context)
+        cache_response(message, context, response)
+        return response
+
+    def ask_agent():
+        # A deadline already spent (e.g. in the admission queue) says nothing about upstream
+        deadline.check()
+        return agent_breaker.call(call_with_deadline, call_agent, deadline)
+
+    try:
+        agent_response, leader = agent_flights.run(
+            flight_key(message, context), ask_agent, min(COALESCING_TIMEOUT, deadline.remaining())
+        )
+    except DEGRADABLE_ERRORS as e:
+        print(f"Degrading answer: {str(e)}")
+        agent_response = degraded_answer(message, context, e)
+        if agent_response is None:
+            raise
+        return agent_response, "degraded"
+    return agent_response, "agent" if leader else "coalesced"
+
+def unavailable_response(e):
+    """The error response for an agent failure that couldn't be degraded: 503 with Retry-After, or 504."""
+    if isinstance(e, CircuitOpenError):
+        return jsonify({"error": str(e), "success": False}), 503, {"Retry-After": str(math.ceil(e.retry_after))}
+    return jsonify({"error": f"Request timed out: {str(e)}", "success": False}), 504
+
+def request_client():
+    """The client of the current request for rate limiting and fair queuing (see utils/admission.py)"""
+    return client_key(
+        request.headers.get('X-API-Key'),
+        request.headers.get('Authorization'),
+        request.headers.get('X-Forwarded-For'),
+        request.remote_addr,
+    )
+
+def rejected_response(e):
+    """The response to a request shed by admission control: 429 or 503 with Retry-After."""
+    return jsonify({"error": str(e), "success": False}), e.status, {"Retry-After": str(math.ceil(e.retry_after))}
+
+def admitted(view):
+    """
+    Runs a chat view under admission control.
+    
+    The request's deadline (g.deadline) also bounds its wait in the queue. The
+    slot is held until the response is closed, so a streamed answer keeps it
+    while streaming; the queue wait is reported in the Server-Timing header.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER))
+        try:
+            admission = admission_control.acquire(request_client(), g.deadline, request.endpoint)
+        except AdmissionRejected as e:
+            print(f"Request shed by admission control: {str(e)}")
+            return rejected_response(e)
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            admission.release()
+            raise
+        response.headers['Server-Timing'] = admission.server_timing()
+        response.call_on_close(admission.release)
+        return response
+    return wrapper
 
 @app.route('/api/chat', methods=['POST'])
+@admitted
 def chat():
     """
     Process a chatbot query and return a formatted conversational response with candidate recommendations.
@@ -27,7 +215,11 @@ def chat():
         "message": "Find top full-stack candidates with diverse backgrounds",
         "conversation_id": "optional-uuid-for-conversation-tracking"
     }
+    
+    The optional X-Request-Timeout header (seconds) sets the request's deadline.
+    Requests over the client's rate or beyond the server's queue are answered 429 or 503.
     """
+    deadline = g.deadline
     try:
         data = request.json
         
@@ -42,32 +234,24 @@ def chat():
             conversation_id = str(uuid.uuid4())
         
         # Get previous context if available
-        context = None
-        if conversation_id in conversation_history:
-            context = conversation_history[conversation_id]['last_response']
-        
-        # Run the query through the Weaviate Query Agent
-        agent_response = run_query(message, context)
-        
-        # Format the response for the chatbot interface
-        formatted_response = format_chatbot_response(agent_response)
+        context = get_context(conversation_id)
         
-        # Enhance the text with better formatting for candidate information
-        if formatted_response['success']:
-            formatted_response['response'] = enhance_candidate_response(formatted_response['response'])
+        # Answer from the cache, a direct query or the Query Agent
+        agent_response, route = answer_message(message, context, deadline)
         
-        # Store the response in conversation history
-        conversation_history[conversation_id] = {
-            'last_query': message,
-            'last_response': agent_response
-        }
+        # Format, enhance and record the response
+        formatted_response = build_chat_response(message, conversation_id, agent_response, route)
         
-        # Include conversation_id in the response
-        formatted_response['conversation_id'] = conversation_id
-        
-        return jsonify(formatted_response)
+        with JSON_SERIALIZATION.time():
+            return jsonify(formatted_response)
     
+    except DEGRADABLE_ERRORS as e:
+        record_error("chat", e)
+        trace_error(e)
+        return unavailable_response(e)
     except Exception as e:
+        record_error("chat", e)
+        trace_error(e)
         print(f"Error processing chat request: {str(e)}")
         traceback.print_exc()
         return jsonify({
@@ -75,6 +259,196 @@ def chat():
             "success": False
         }), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+@admitted
+def chat_stream():
+    """
+    Streaming variant of /api/chat using Server-Sent Events.
+    
+    Accepts the same request body as /api/chat and emits these events:
+        start     {"conversation_id": ...}
+        progress  {"stage": ..., "message": ..., "queries": [...]}  (query rewriting, searches issued)
+        token     {"text": ...}  enhanced answer text, in order
+        results   {"result_count": ..., "has_results": ...}
+        done      the same JSON body /api/chat returns, without "response"
+        error     {"error": ..., "success": false}
+    
+    A failed or late agent call is answered with a degraded answer (route
+    "degraded") as long as no answer tokens were sent yet.
+    """
+    deadline = g.deadline
+    data = request.json
+    
+    if not data or 'message' not in data:
+        return jsonify({"error": "Missing required field: message"}), 400
+    
+    message = data['message']
+    conversation_id = data.get('conversation_id') or str(uuid.uuid4())
+    context = get_context(conversation_id)
+    
+    def generate():
+        stream = ChatStream(message, conversation_id, context)
+        yield stream.start()
+        
+        try:
+            route = "cache"
+            stream.agent_response = get_cached_response(message, context)
+            if stream.agent_response is None:
+                route = "direct"
+                stream.agent_response = route_query(message, context)
+            
+            if stream.agent_response is None:
+                key = flight_key(message, context)
+                flight, leader = agent_flights.join(key)
+                if leader:
+                    route = "agent"
+                    try:
+                        outputs = agent_breaker.iterate(
+                            lambda: iterate_with_deadline(lambda: run_query_stream(message, context), deadline)
+                        )
+                        for output in outputs:
+                            event = stream.handle(output)
+                            if event:
+                                yield event
+                        cache_response(message, context, stream.agent_response)
+                    except BaseException as e:
+                        agent_flights.complete(key, flight, error=e)
+                        raise
+                    agent_flights.complete(key, flight, stream.agent_response)
+                else:
+                    # An identical request is already streaming; wait for its final answer
+                    route = "coalesced"
+                    stream.agent_response = agent_flights.wait(flight, min(COALESCING_TIMEOUT, deadline.remaining()))
+            
+            for event in stream.finish(route):
+                yield event
+        
+        except Exception as e:
+            events = stream.degrade(e)
+            if events is not None:
+                print(f"Degrading answer: {str(e)}")
+                for event in events:
+                    yield event
+                return
+            record_error("chat_stream", e)
+            print(f"Error processing streaming chat request: {str(e)}")
+            traceback.print_exc()
+            yield stream.error(e)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """
+    Answer many questions concurrently, e.g. the screening questions of an opening.
+    
+    Request body should contain:
+    {
+        "messages": ["Who knows Docker and AWS?", "Find candidates with a Master's degree"],
+        "conversation_id": "optional-uuid; every message is then a follow-up to its last exchange",
+        "stream": false
+    }
+    
+    Questions run with bounded parallelism (BATCH_MAX_CONCURRENCY). A failed question
+    doesn't fail the batch; its result has "success": false and an "error".
+    The X-Request-Timeout header (seconds) is the deadline of each question,
+    counted from when it starts, so late questions of a large batch get the
+    same budget as the first ones.
+    Every message counts against the client's rate, and each question waits for
+    its own admission slot; its "queue_ms" is the time it waited.
+    Without "stream", returns {"results": [...in request order...], "summary": {...}}.
+    With "stream": true, emits Server-Sent Events:
+        result    one result, as soon as it is ready (completion order, see "index")
+        done      the summary: counts, wall_time_ms versus summed_latency_ms
+    """
+    data = request.json
+    
+    if not data or 'messages' not in data:
+        return jsonify({"error": "Missing required field: messages"}), 400
+    
+    messages = data['messages']
+    if not isinstance(messages, list) or not messages or not all(isinstance(message, str) for message in messages):
+        return jsonify({"error": "messages must be a non-empty list of strings"}), 400
+    if len(messages) > BATCH_MAX_MESSAGES:
+        return jsonify({"error": f"A batch can hold at most {BATCH_MAX_MESSAGES} messages"}), 400
+    
+    # With a shared conversation every question is answered against its latest
+    # exchange; the answers run concurrently, so none of them is stored as the next one
+    shared_conversation_id = data.get('conversation_id')
+    context = get_context(shared_conversation_id) if shared_conversation_id else None
+    timeout_header = request.headers.get(DEADLINE_HEADER)
+    
+    client = request_client()
+    profile = g.profile
+    try:
+        admission_control.take_tokens(client, len(messages), request.endpoint)
+    except AdmissionRejected as e:
+        print(f"Request shed by admission control: {str(e)}")
+        return rejected_response(e)
+    
+    def answer_question(index, message):
+        deadline = Deadline.from_header(timeout_header)
+        try:
+            with admission_control.acquire(client, deadline, "chat_batch", cost=0) as admission:
+                agent_response, route = answer_message(message, context, deadline)
+                if shared_conversation_id:
+                    result = build_chat_response(message, shared_conversation_id, agent_response, route, remember=False)
+                else:
+                    result = build_chat_response(message, str(uuid.uuid4()), agent_response, route)
+            result['queue_ms'] = round(admission.queue_seconds * 1000, 1)
+            return result
+        except AdmissionRejected as e:
+            print(f"Batch question {index} shed by admission control: {str(e)}")
+            return {
+                "error": str(e),
+                "success": False
+            }
+        except Exception as e:
+            record_error("chat_batch", e)
+            trace_error(e)
+            print(f"Error processing batch question {index}: {str(e)}")
+            traceback.print_exc()
+            return {
+                "error": f"Failed to process request: {str(e)}",
+                "success": False
+            }
+    
+    @timed
+    def answer(index, message):
+        # Each question is its own entry in the slow-query log
+        trace = start_trace("chat_batch")
+        try:
+            # Batch threads are part of the request's profile, if it is profiled
+            with attach_thread(profile, "batch"):
+                return answer_question(index, message)
+        finally:
+            if trace is not None:
+                trace.finish()
+    
+    start_time = time.perf_counter()
+    
+    if not data.get('stream'):
+        results = sorted(run_batch(messages, answer, BATCH_MAX_CONCURRENCY), key=lambda result: result['index'])
+        summary = batch_summary(results, time.perf_counter() - start_time, BATCH_MAX_CONCURRENCY)
+        return jsonify({"results": results, "summary": summary})
+    
+    def generate():
+        results = []
+        for result in run_batch(messages, answer, BATCH_MAX_CONCURRENCY):
+            results.append(result)
+            yield sse_event("result", result)
+        yield sse_event("done", batch_summary(results, time.perf_counter() - start_time, BATCH_MAX_CONCURRENCY))
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/conversation/clear', methods=['POST'])
 def clear_conversation():
     """
@@ -92,14 +466,13 @@ def clear_conversation():
         conversation_id = data.get('conversation_id')
         
         if conversation_id:
-            if conversation_id in conversation_history:
-                del conversation_history[conversation_id]
+            if conversation_store.delete(conversation_id):
                 return jsonify({"success": True, "message": f"Conversation {conversation_id} cleared"})
             else:
                 return jsonify({"success": False, "message": "Conversation ID not found"}), 404
         else:
             # Clear all conversations
-            conversation_history.clear()
+            conversation_store.clear()
             return jsonify({"success": True, "message": "All conversations cleared"})
     
     except Exception as e:
@@ -109,11 +482,95 @@ def clear_conversation():
             "success": False
         }), 500
 
+@app.route('/api/conversation/stats', methods=['GET'])
+def conversation_stats():
+    """Size, memory footprint and eviction counters of the conversation store, and follow-up context savings"""
+    return jsonify({**conversation_store.stats(), "context": context_stats.stats()})
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters and size of the response cache"""
+    if not response_cache:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **response_cache.stats()})
+
+@app.route('/api/cache/clear', methods=['POST'])
+def clear_cache():
+    """Drop every cached response"""
+    if response_cache:
+        response_cache.clear()
+    return jsonify({"success": True, "message": "Response cache cleared"})
+
+@app.route('/api/router/stats', methods=['GET'])
+def router_stats():
+    """How many requests were answered from the cache, by a direct query or by the agent"""
+    stats = route_stats.stats()
+    stats["enabled"] = query_router is not None
+    if query_router:
+        stats.update(query_router.stats())
+    stats["local_index"] = candidate_index_stats()
+    return jsonify(stats)
+
+@app.route('/api/coalescing/stats', methods=['GET'])
+def coalescing_stats_route():
+    """Upstream calls made versus identical concurrent requests that shared them"""
+    return jsonify({"enabled": agent_flights.enabled, **coalescing_stats.stats()})
+
+@app.route('/api/circuit/stats', methods=['GET'])
+def circuit_stats():
+    """Get the state of the circuit breaker around agent calls"""
+    return jsonify(agent_breaker.stats())
+
+@app.route('/api/admission/stats', methods=['GET'])
+def admission_stats():
+    """Get admission control counters: slots in use, queued requests, queue wait versus processing time and sheds"""
+    return jsonify(admission_control.stats())
+
+def admin_only(view):
+    """Answers 403 unless the request carries the admin token (PROFILER_ADMIN_TOKEN) in X-Admin-Token."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not admin_authorized(request.headers.get(ADMIN_TOKEN_HEADER)):
+            return jsonify({"error": f"Missing or wrong {ADMIN_TOKEN_HEADER} header", "success": False}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/api/profiles', methods=['GET'])
+@admin_only
+def list_profiles():
+    """List the request profiles on disk, newest first, and the profiler's settings"""
+    return jsonify({"profiles": profiler.list_profiles(), "profiler": profiler.stats()})
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+@admin_only
+def download_profile(profile_id):
+    """Download a profile as collapsed stacks (?kind=wall, the default, or ?kind=cpu)"""
+    kind = request.args.get('kind', 'wall')
+    if kind not in PROFILE_KINDS:
+        return jsonify({"error": f"kind must be one of: {', '.join(PROFILE_KINDS)}"}), 400
+    if not valid_profile_id(profile_id):
+        return jsonify({"error": "Profile not found"}), 404
+    filename = f"{profile_id}.{kind}.folded"
+    if not os.path.exists(os.path.join(profiler.directory, filename)):
+        return jsonify({"error": "Profile not found"}), 404
+    return send_from_directory(profiler.directory, filename, mimetype='text/plain', as_attachment=True)
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Per-stage latency histograms and request, cache and error counters in the Prometheus text format"""
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Simple health check endpoint"""
+    """Liveness: the process is up and serving, whether or not Weaviate is reachable"""
     return jsonify({"status": "healthy"})
 
+@app.route('/api/ready', methods=['GET'])
+def ready_check():
+    """Readiness: 200 once this worker's warm-up has finished, 503 until then"""
+    ready, body = readiness()
+    return jsonify(body), 200 if ready else 503
+
 @app.route('/', methods=['GET'])
 def homepage():
     """Simple homepage with basic information about the API"""
@@ -122,8 +579,21 @@ def homepage():
         "description": "RESTful API for a chat-based interface to query candidate profiles",
         "endpoints": [
             {"path": "/api/chat", "method": "POST", "description": "Process chat messages"},
+            {"path": "/api/chat/stream", "method": "POST", "description": "Process chat messages, streaming progress and answer as Server-Sent Events"},
+            {"path": "/api/chat/batch", "method": "POST", "description": "Answer a list of chat messages concurrently"},
             {"path": "/api/conversation/clear", "method": "POST", "description": "Clear conversation history"},
-            {"path": "/api/health", "method": "GET", "description": "Health check endpoint"}
+            {"path": "/api/conversation/stats", "method": "GET", "description": "Conversation store statistics"},
+            {"path": "/api/cache/stats", "method": "GET", "description": "Response cache statistics"},
+            {"path": "/api/cache/clear", "method": "POST", "description": "Clear the response cache"},
+            {"path": "/api/router/stats", "method": "GET", "description": "Cache, direct-query and agent routing statistics"},
+            {"path": "/api/coalescing/stats", "method": "GET", "description": "Request coalescing statistics"},
+            {"path": "/api/circuit/stats", "method": "GET", "description": "Circuit breaker state around Query Agent calls"},
+            {"path": "/api/admission/stats", "method": "GET", "description": "Admission control: per-client rate limits, fair queue and shed requests"},
+            {"path": "/api/profiles", "method": "GET", "description": "Recent request profiles (admin token required)"},
+            {"path": "/api/profiles/<profile_id>", "method": "GET", "description": "Download a profile as flame graph collapsed stacks (admin token required)"},
+            {"path": "/api/metrics", "method": "GET", "description": "Prometheus metrics: per-stage latency, requests, cache hits and errors"},
+            {"path": "/api/health", "method": "GET", "description": "Health check endpoint"},
+            {"path": "/api/ready", "method": "GET", "description": "Readiness: 200 once warm-up has finished, 503 until then"}
         ],
         "version": "1.0.0"
     }
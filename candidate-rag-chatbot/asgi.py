@@ -0,0 +1,392 @@
+"""
+Async (ASGI) serving mode for the Candidate RAG Chatbot API.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+The chat routes (/api/chat and /api/chat/stream) are served natively on the
+event loop through the async Weaviate client and AsyncQueryAgent, so a waiting
+agent call costs a coroutine instead of a worker thread. Upstream calls are
+bounded by ASYNC_MAX_CONCURRENCY; when ASYNC_MAX_QUEUE more are already
+waiting, requests are rejected immediately with 503 and Retry-After.
+Identical concurrent questions share one upstream call (and one slot). Every
+other route is delegated to the Flask app in app.py, so both modes expose the
+same API. In front of all this, the chat routes go through the same admission
+control as the Flask routes of the process (per-client rate limits and a fair
+queue, see utils/admission.py).
+"""
+
+import sys
+import json
+import math
+import time
+import uuid
+import asyncio
+import functools
+import traceback
+from asgiref.wsgi import WsgiToAsgi
+
+from config import ASYNC_MAX_CONCURRENCY, ASYNC_MAX_QUEUE, ASYNC_RETRY_AFTER, COALESCING_ENABLED, COALESCING_TIMEOUT
+from app import app as flask_app
+from utils.warmup import start_async_warmup
+from utils.query_backend import run_query_async, run_query_stream_async
+from utils.concurrency import AgentConcurrencyLimiter, QueueFullError
+from utils.coalescing import AsyncSingleFlight
+from utils.deadline import Deadline, DEADLINE_HEADER, await_with_deadline, aiterate_with_deadline
+from utils.circuit_breaker import CircuitOpenError
+from utils.admission import AdmissionRejected, client_key
+from utils.slow_query_log import start_trace, trace_question, trace_error
+from utils.metrics import JSON_SERIALIZATION, REQUEST_SECONDS, REQUESTS, IN_FLIGHT, record_error
+from utils.chat_pipeline import (
+    get_context,
+    route_query,
+    coalescing_stats,
+    flight_key,
+    get_cached_response,
+    cache_response,
+    build_chat_response,
+    agent_breaker,
+    admission_control,
+    DEGRADABLE_ERRORS,
+    degraded_answer,
+    ChatStream,
+)
+
+# Routes not handled natively below run on the Flask app in a thread pool
+wsgi_app = WsgiToAsgi(flask_app)
+
+agent_limiter = AgentConcurrencyLimiter(ASYNC_MAX_CONCURRENCY, ASYNC_MAX_QUEUE, ASYNC_RETRY_AFTER)
+
+# Followers of an in-flight identical question wait on it without taking a slot
+agent_flights = AsyncSingleFlight(coalescing_stats, enabled=COALESCING_ENABLED)
+
+# Flask-CORS allows every origin; native routes send the same header
+CORS_HEADERS = [(b"access-control-allow-origin", b"*")]
+
+
+class BadRequest(Exception):
+    pass
+
+
+async def read_json(receive):
+    """Reads the full request body and parses it as JSON."""
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        raise BadRequest("Request body must be valid JSON")
+
+async def send_json(send, status, data, headers=None):
+    with JSON_SERIALIZATION.time():
+        body = json.dumps(data).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ] + CORS_HEADERS + (headers or []),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def send_overloaded(send, e):
+    await send_json(
+        send,
+        503,
+        {"error": "Server is busy, please retry shortly", "success": False},
+        headers=[(b"retry-after", str(e.retry_after).encode())],
+    )
+
+async def send_unavailable(send, e):
+    """Answers an agent failure that couldn't be degraded (see app.unavailable_response)."""
+    if isinstance(e, CircuitOpenError):
+        await send_json(send, 503, {"error": str(e), "success": False}, headers=[(b"retry-after", str(math.ceil(e.retry_after)).encode())])
+    else:
+        await send_json(send, 504, {"error": f"Request timed out: {str(e)}", "success": False})
+
+async def send_rejected(send, e):
+    """Answers a request shed by admission control (see app.rejected_response)."""
+    await send_json(send, e.status, {"error": str(e), "success": False}, headers=[(b"retry-after", str(math.ceil(e.retry_after)).encode())])
+
+def request_header(scope, name):
+    """The value of a request header, or None."""
+    name = name.lower().encode()
+    value = next((value for key, value in scope["headers"] if key == name), None)
+    return value.decode("latin-1") if value else None
+
+def request_deadline(scope):
+    """The Deadline of a request, from its X-Request-Timeout header."""
+    return Deadline.from_header(request_header(scope, DEADLINE_HEADER))
+
+def request_client(scope):
+    """The client of a request for rate limiting and fair queuing (see app.request_client)."""
+    client = scope.get("client")
+    return client_key(
+        request_header(scope, "X-API-Key"),
+        request_header(scope, "Authorization"),
+        request_header(scope, "X-Forwarded-For"),
+        client[0] if client else None,
+    )
+
+def admitted(handler):
+    """
+    Runs a native chat route under admission control (see app.admitted).
+
+    The route finds the request's Deadline in scope["deadline"]; the slot is
+    held until the response has been sent.
+    """
+    @functools.wraps(handler)
+    async def run(scope, receive, send):
+        deadline = request_deadline(scope)
+        try:
+            admission = await admission_control.acquire_async(request_client(scope), deadline, handler.__name__)
+        except AdmissionRejected as e:
+            print(f"Request shed by admission control: {str(e)}")
+            await send_rejected(send, e)
+            return
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", [])) + [(b"server-timing", admission.server_timing().encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await handler({**scope, "deadline": deadline}, receive, send_with_timing)
+        finally:
+            admission.release()
+    return run
+
+async def parse_chat_request(receive, send):
+    """
+    Validates a chat request body.
+
+    Returns:
+        (message, conversation_id), or None after an error response was sent.
+    """
+    try:
+        data = await read_json(receive)
+    except BadRequest as e:
+        await send_json(send, 400, {"error": str(e)})
+        return None
+
+    if not data or 'message' not in data:
+        await send_json(send, 400, {"error": "Missing required field: message"})
+        return None
+
+    return data['message'], data.get('conversation_id') or str(uuid.uuid4())
+
+@admitted
+async def chat(scope, receive, send):
+    """Async implementation of POST /api/chat (see app.chat)."""
+    parsed = await parse_chat_request(receive, send)
+    if parsed is None:
+        return
+    message, conversation_id = parsed
+    deadline = scope["deadline"]
+
+    try:
+        context = get_context(conversation_id)
+        trace_question(message, context)
+
+        route = "cache"
+        # The cache may read SQLite or the data version; keep it off the event loop
+        agent_response = await asyncio.to_thread(get_cached_response, message, context)
+        if agent_response is None:
+            # Direct queries use the pooled sync client, off the event loop
+            route = "direct"
+            agent_response = await asyncio.to_thread(route_query, message, context)
+        if agent_response is None:
+            async def call_agent():
+                async with agent_limiter:
+                    return await agent_breaker.call_async(run_query_async(message, context), deadline)
+
+            async def ask_agent():
+                # Waiting for a slot counts against the deadline too; the call is cancelled when it passes
+                response = await await_with_deadline(call_agent(), deadline)
+                await asyncio.to_thread(cache_response, message, context, response)
+                return response
+
+            try:
+                agent_response, leader = await agent_flights.run(
+                    flight_key(message, context), ask_agent, min(COALESCING_TIMEOUT, deadline.remaining())
+                )
+                route = "agent" if leader else "coalesced"
+            except DEGRADABLE_ERRORS as e:
+                print(f"Degrading answer: {str(e)}")
+                agent_response = await asyncio.to_thread(degraded_answer, message, context, e)
+                if agent_response is None:
+                    raise
+                route = "degraded"
+
+        formatted_response = build_chat_response(message, conversation_id, agent_response, route)
+        await send_json(send, 200, formatted_response)
+
+    except QueueFullError as e:
+        record_error("chat", e)
+        trace_error(e)
+        await send_overloaded(send, e)
+    except DEGRADABLE_ERRORS as e:
+        record_error("chat", e)
+        trace_error(e)
+        await send_unavailable(send, e)
+    except Exception as e:
+        record_error("chat", e)
+        trace_error(e)
+        print(f"Error processing chat request: {str(e)}")
+        traceback.print_exc()
+        await send_json(send, 500, {
+            "error": f"Failed to process request: {str(e)}",
+            "success": False
+        })
+
+@admitted
+async def chat_stream(scope, receive, send):
+    """Async implementation of POST /api/chat/stream (see app.chat_stream)."""
+    parsed = await parse_chat_request(receive, send)
+    if parsed is None:
+        return
+    message, conversation_id = parsed
+    deadline = scope["deadline"]
+
+    context = get_context(conversation_id)
+    stream = ChatStream(message, conversation_id, context)
+
+    route = "cache"
+    stream.agent_response = await asyncio.to_thread(get_cached_response, message, context)
+    if stream.agent_response is None:
+        route = "direct"
+        try:
+            stream.agent_response = await asyncio.to_thread(route_query, message, context)
+        except Exception as e:
+            print(f"Query routing failed: {str(e)}")
+    if stream.agent_response is None:
+        key = flight_key(message, context)
+        flight, leader = agent_flights.join(key)
+        route = "agent" if leader else "coalesced"
+
+    if route == "agent":
+        try:
+            # Reserve the upstream slot before committing to a 200 response
+            await agent_limiter.__aenter__()
+        except QueueFullError as e:
+            record_error("chat_stream", e)
+            agent_flights.complete(key, flight, error=e)
+            await send_overloaded(send, e)
+            return
+
+    async def send_event(event):
+        await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ] + CORS_HEADERS,
+        })
+        await send_event(stream.start())
+
+        try:
+            if route == "agent":
+                try:
+                    outputs = agent_breaker.aiterate(aiterate_with_deadline(run_query_stream_async(message, context), deadline))
+                    async for output in outputs:
+                        event = stream.handle(output)
+                        if event:
+                            await send_event(event)
+                    await asyncio.to_thread(cache_response, message, context, stream.agent_response)
+                except BaseException as e:
+                    agent_flights.complete(key, flight, error=e)
+                    raise
+                agent_flights.complete(key, flight, stream.agent_response)
+            elif route == "coalesced":
+                # An identical request is already streaming; wait for its final answer
+                stream.agent_response = await agent_flights.wait(flight, min(COALESCING_TIMEOUT, deadline.remaining()))
+
+            for event in stream.finish(route):
+                await send_event(event)
+
+        except Exception as e:
+            events = await asyncio.to_thread(stream.degrade, e)
+            if events is not None:
+                print(f"Degrading answer: {str(e)}")
+                for event in events:
+                    await send_event(event)
+            else:
+                record_error("chat_stream", e)
+                print(f"Error processing streaming chat request: {str(e)}")
+                traceback.print_exc()
+                await send_event(stream.error(e))
+
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    finally:
+        if route == "agent":
+            # No-op unless the response failed before the agent call finished
+            agent_flights.complete(key, flight, error=RuntimeError("The identical request this one was waiting for failed"))
+            await agent_limiter.__aexit__(None, None, None)
+
+NATIVE_ROUTES = {
+    ("POST", "/api/chat"): chat,
+    ("POST", "/api/chat/stream"): chat_stream,
+}
+
+async def handle_with_metrics(handler, scope, receive, send):
+    """Runs a native route, recording the same request metrics and slow-query trace as the Flask app (endpoint = view name)."""
+    endpoint = handler.__name__
+    status = 500
+    start_time = time.perf_counter()
+    trace = start_trace(endpoint)
+
+    async def send_with_status(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        await send(message)
+
+    IN_FLIGHT.labels(endpoint=endpoint).inc()
+    try:
+        await handler(scope, receive, send_with_status)
+    finally:
+        IN_FLIGHT.labels(endpoint=endpoint).dec()
+        REQUEST_SECONDS.labels(endpoint=endpoint).observe(time.perf_counter() - start_time)
+        REQUESTS.labels(endpoint=endpoint, status=status).inc()
+        if trace is not None:
+            trace.finish(status)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            start_async_warmup()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # Nothing to close if weaviate was never imported (offline backends)
+            weaviate_client = sys.modules.get("utils.weaviate_client")
+            if weaviate_client is not None:
+                await weaviate_client.close_async_weaviate_client()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    """ASGI entry point."""
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    if scope["type"] == "http":
+        handler = NATIVE_ROUTES.get((scope["method"], scope["path"].rstrip("/") or "/"))
+        if handler is not None:
+            await handle_with_metrics(handler, scope, receive, send)
+            return
+
+    await wsgi_app(scope, receive, send)
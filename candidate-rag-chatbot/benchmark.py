@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Load-generation benchmark for the Candidate RAG Chatbot API.
+Replays a query corpus (example_queries.md plus optional recorded traffic)
+against the API at a configurable concurrency or arrival rate, and reports
+latency percentiles, throughput and error rate as JSON.
+
+Without --url the app is started in process on a local port, by default with
+the stub Query Agent (QUERY_BACKEND=stub), so runs are offline and
+reproducible: every query's simulated latency is derived from --seed.
+
+Examples:
+    python benchmark.py --requests 500 --concurrency 16 --output before.json
+    python benchmark.py --rate 20 --duration 30 --stub-latency uniform:200:900
+    python benchmark.py --output after.json --baseline before.json
+    python benchmark.py --url http://localhost:5000 --traffic recorded.jsonl
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import contextlib
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PERCENTILES = (50, 90, 95, 99)
+
+def load_corpus(markdown_path, traffic_paths):
+    """
+    Reads the queries to replay.
+
+    Args:
+        markdown_path: Markdown file whose fenced code blocks are queries (example_queries.md).
+        traffic_paths: JSON Lines files of recorded requests with a "message" field.
+
+    Returns:
+        A list of query strings.
+    """
+    queries = []
+    if markdown_path:
+        with open(markdown_path, "r", encoding="utf-8") as f:
+            queries.extend(block.strip() for block in re.findall(r"```\n(.*?)\n```", f.read(), re.S))
+    for path in traffic_paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    message = json.loads(line).get("message")
+                    if message:
+                        queries.append(message)
+    queries = [query for query in queries if query and "\n" not in query]
+    if not queries:
+        raise ValueError("The query corpus is empty")
+    return queries
+
+def build_schedule(queries, count, seed):
+    """Picks `count` queries: the corpus in a seeded random order, repeated as needed."""
+    rng = random.Random(seed)
+    schedule = []
+    while len(schedule) < count:
+        round_ = list(queries)
+        rng.shuffle(round_)
+        schedule.extend(round_)
+    return schedule[:count]
+
+def arrival_times(count, rate, seed):
+    """Poisson arrivals: offsets in seconds from the start of the run."""
+    rng = random.Random(seed + 1)
+    offsets = []
+    elapsed = 0.0
+    for _ in range(count):
+        offsets.append(elapsed)
+        elapsed += rng.expovariate(rate)
+    return offsets
+
+def queue_wait(headers):
+    """Seconds the request waited in the server's admission queue, from its Server-Timing header (None without)."""
+    match = re.search(r"queue;dur=([\d.]+)", headers.get("Server-Timing") or "")
+    return float(match.group(1)) / 1000 if match else None
+
+def send(url, message, timeout, api_key=None):
+    """
+    Posts one chat message.
+
+    Returns:
+        (status, route, error, queue_seconds): status is 0 when no HTTP response arrived.
+    """
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["X-API-Key"] = api_key
+    request = urllib.request.Request(
+        url,
+        data=json.dumps({"message": message}).encode("utf-8"),
+        headers=headers,
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = json.loads(response.read())
+            if not body.get("success"):
+                return response.status, None, body.get("error", "unsuccessful response"), queue_wait(response.headers)
+            return response.status, body.get("meta", {}).get("route"), None, queue_wait(response.headers)
+    except urllib.error.HTTPError as e:
+        try:
+            detail = json.loads(e.read()).get("error")
+        except Exception:
+            detail = None
+        return e.code, None, f"HTTP {e.code}: {detail}" if detail else f"HTTP {e.code}", None
+    except Exception as e:
+        return 0, None, f"{type(e).__name__}: {e}", None
+
+def run_load(url, schedule, concurrency, rate, timeout, seed=0, api_key=None):
+    """
+    Replays the schedule.
+
+    Closed loop (rate None): `concurrency` clients send back to back.
+    Open loop: requests arrive at `rate` per second (Poisson) and are sent by
+    up to `concurrency` clients. Latency is measured from the scheduled
+    arrival, so time spent waiting for a free client counts (no coordinated
+    omission).
+
+    Returns:
+        (samples, wall_time): one dict per request and the total run time.
+    """
+    samples = [None] * len(schedule)
+    offsets = arrival_times(len(schedule), rate, seed) if rate else None
+    start = time.perf_counter()
+
+    def one(index):
+        scheduled = start + offsets[index] if offsets else time.perf_counter()
+        status, route, error, queue_seconds = send(url, schedule[index], timeout, api_key)
+        samples[index] = {
+            "latency": time.perf_counter() - scheduled,
+            "queue_wait": queue_seconds,
+            "status": status,
+            "route": route,
+            "error": error,
+        }
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        if offsets is None:
+            list(executor.map(one, range(len(schedule))))
+        else:
+            futures = []
+            for index, offset in enumerate(offsets):
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(one, index))
+            for future in futures:
+                future.result()
+    return samples, time.perf_counter() - start
+
+def latency_summary(latencies):
+    if not latencies:
+        return {}
+    values = np.asarray(latencies) * 1000
+    summary = {"min": values.min(), "mean": values.mean(), "max": values.max()}
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}"] = np.percentile(values, percentile)
+    return {key: round(float(value), 2) for key, value in summary.items()}
+
+def summarize(samples, wall_time):
+    """Aggregates the samples of a run into the report's "results"."""
+    errors = [sample for sample in samples if sample["error"]]
+    status_codes = {}
+    routes = {}
+    for sample in samples:
+        status_codes[str(sample["status"])] = status_codes.get(str(sample["status"]), 0) + 1
+        if not sample["error"]:
+            routes.setdefault(sample["route"] or "unknown", []).append(sample["latency"])
+
+    error_types = {}
+    for sample in errors:
+        error_types[sample["error"]] = error_types.get(sample["error"], 0) + 1
+
+    return {
+        "requests": len(samples),
+        "errors": len(errors),
+        "error_rate": round(len(errors) / len(samples), 4) if samples else 0.0,
+        "wall_time_s": round(wall_time, 3),
+        "throughput_rps": round(len(samples) / wall_time, 2) if wall_time else 0.0,
+        "latency_ms": latency_summary([sample["latency"] for sample in samples]),
+        # Part of the latency spent in the server's admission queue (Server-Timing), not processing
+        "queue_wait_ms": latency_summary([sample["queue_wait"] for sample in samples if sample["queue_wait"] is not None]),
+        "latency_by_route_ms": {
+            route: {"count": len(latencies), **latency_summary(latencies)} for route, latencies in sorted(routes.items())
+        },
+        "status_codes": status_codes,
+        "error_types": dict(sorted(error_types.items(), key=lambda item: -item[1])[:10]),
+    }
+
+def compare(results, baseline, tolerance):
+    """
+    Compares a run with a baseline report.
+
+    Returns:
+        (lines, regressed): a printable table and whether any key figure got
+        worse by more than `tolerance` (relative; absolute for the error rate).
+    """
+    checks = [("latency_ms", f"p{percentile}", "lower") for percentile in PERCENTILES]
+    checks += [(None, "throughput_rps", "higher"), (None, "error_rate", "lower")]
+    lines = [f"{'metric':<22}{'baseline':>12}{'current':>12}{'change':>10}"]
+    regressed = False
+    for group, key, better in checks:
+        old = (baseline.get(group, {}) if group else baseline).get(key)
+        new = (results.get(group, {}) if group else results).get(key)
+        if old is None or new is None:
+            continue
+        if key == "error_rate":
+            change = new - old
+            worse = change > tolerance
+            label = f"{change * 100:+.2f}pt"
+        else:
+            change = (new - old) / old if old else 0.0
+            worse = change > tolerance if better == "lower" else change < -tolerance
+            label = f"{change * 100:+.1f}%"
+        regressed = regressed or worse
+        name = f"{group}.{key}" if group else key
+        lines.append(f"{name:<22}{old:>12}{new:>12}{label:>10}{'  REGRESSION' if worse else ''}")
+    return lines, regressed
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def start_local_server(args):
+    """
+    Starts the Flask app in this process on a free local port.
+
+    The app reads its configuration at import time, so the backend settings
+    are put in the environment first.
+
+    Returns:
+        The server's base URL.
+    """
+    os.environ["QUERY_BACKEND"] = args.backend
+    os.environ["STUB_LATENCY"] = args.stub_latency
+    os.environ["STUB_ERROR_RATE"] = str(args.stub_error_rate)
+    os.environ["STUB_SEED"] = str(args.seed)
+    if args.no_cache:
+        os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+    # Every simulated client shares one address, so per-client rate limits are off unless asked for
+    os.environ["ADMISSION_RATE"] = str(args.admission_rate)
+
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from app import app
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def wait_until_ready(base_url, timeout):
+    """Polls /api/ready so the run doesn't measure the app's warm-up; deployments without it are taken as ready."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(base_url + "/api/ready", timeout=5):
+                return
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{base_url} not ready after {timeout:.0f} s")
+        except urllib.error.URLError:
+            if time.monotonic() > deadline:
+                raise
+        time.sleep(0.2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay chat queries against the API and report latency percentiles")
+    parser.add_argument("--url", help="Base URL of a running API (default: start the app in process)")
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "example_queries.md"),
+                        help="Markdown file whose code blocks are queries ('' to skip)")
+    parser.add_argument("--traffic", action="append", default=[], help="JSON Lines file of recorded requests (repeatable)")
+    parser.add_argument("--requests", type=int, default=200, help="Number of requests (default 200)")
+    parser.add_argument("--duration", type=float, help="With --rate: run for this many seconds instead of --requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients (default 8)")
+    parser.add_argument("--rate", type=float, help="Open-loop arrival rate in requests/second (default: closed loop)")
+    parser.add_argument("--endpoint", default="/api/chat", help="Endpoint to post to (default /api/chat)")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for query order, arrivals and stub latencies")
+    parser.add_argument("--backend", default="stub", choices=["stub", "bm25", "weaviate"], help="In-process backend (default stub)")
+    parser.add_argument("--stub-latency", default="lognormal:1500:0.5", help="Stub agent latency spec in ms (see utils/stub_backend.py)")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Fraction of stub agent calls that fail")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the response cache of the in-process app")
+    parser.add_argument("--admission-rate", type=float, default=0, help="Per-client rate limit of the in-process app in requests/second (default 0: off)")
+    parser.add_argument("--api-key", help="Send this X-API-Key, so the requests count as one client of the API's admission control")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare with; exits 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative slowdown before a regression (default 0.1)")
+    args = parser.parse_args()
+
+    if args.duration and not args.rate:
+        parser.error("--duration requires --rate")
+    count = int(args.duration * args.rate) if args.duration else args.requests
+
+    queries = load_corpus(args.corpus, args.traffic)
+    schedule = build_schedule(queries, count, args.seed)
+
+    # Keep stdout for the report; the in-process app logs with print()
+    with contextlib.redirect_stdout(sys.stderr):
+        base_url = args.url.rstrip("/") if args.url else start_local_server(args)
+        wait_until_ready(base_url, args.timeout)
+        print(f"Replaying {count} requests ({len(queries)} distinct queries) against {base_url}{args.endpoint}")
+        samples, wall_time = run_load(base_url + args.endpoint, schedule, args.concurrency, args.rate, args.timeout, args.seed, args.api_key)
+    results = summarize(samples, wall_time)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "url": args.url,
+            "endpoint": args.endpoint,
+            "requests": count,
+            "distinct_queries": len(queries),
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "seed": args.seed,
+            "backend": None if args.url else args.backend,
+            "stub_latency": None if args.url or args.backend != "stub" else args.stub_latency,
+            "stub_error_rate": None if args.url or args.backend != "stub" else args.stub_error_rate,
+            "response_cache": None if args.url else not args.no_cache,
+            "admission_rate": None if args.url else args.admission_rate,
+        },
+        "results": results,
+    }
+
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(encoded + "\n")
+    else:
+        print(encoded)
+
+    latency = results["latency_ms"]
+    print(
+        f"{results['requests']} requests in {results['wall_time_s']}s: {results['throughput_rps']} req/s, "
+        f"p50 {latency.get('p50')} ms, p95 {latency.get('p95')} ms, p99 {latency.get('p99')} ms, "
+        f"errors {results['error_rate'] * 100:.2f}%",
+        file=sys.stderr,
+    )
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines, regressed = compare(results, baseline["results"], args.tolerance)
+        print("\n".join(lines), file=sys.stderr)
+        return 1 if regressed else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
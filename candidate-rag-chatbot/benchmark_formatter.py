@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the response post-processor (utils/response_formatter.py).
+Times enhance_candidate_response and the streaming enhancer on synthetic
+answers listing more and more candidates, and reports how the time grows with
+the answer.
+
+A growth exponent close to 1 means linear time: ten times the candidates take
+ten times as long.
+
+Examples:
+    python benchmark_formatter.py
+    python benchmark_formatter.py --sizes 10,100,1000,10000 --repeat 5
+"""
+
+import sys
+import math
+import json
+import time
+import argparse
+
+from utils.response_formatter import CANDIDATE_MARKERS, enhance_candidate_response, marker_spans, StreamingEnhancer
+from utils.query_router import format_candidate
+
+CANDIDATE = {
+    "name": "Jordan Silva",
+    "email": "jordan.silva@example.com",
+    "location": "São Paulo",
+    "current_role": "Senior Software Engineer",
+    "current_company": "Example Labs",
+    "skills": ["Python", "React", "Docker", "Amazon Web Services"],
+    "education_highest_level": "Master's Degree",
+    "salary_expectation": 120000,
+}
+
+def make_answer(candidates):
+    """An agent-style answer listing `candidates` profiles."""
+    paragraphs = [f"Here are {candidates} candidates matching your question:"]
+    paragraphs.extend(format_candidate(index, CANDIDATE) for index in range(1, candidates + 1))
+    return "\n\n".join(paragraphs)
+
+def streamed(response_text, chunk_size=16):
+    """Feeds the text through StreamingEnhancer in small chunks, like agent tokens."""
+    enhancer = StreamingEnhancer()
+    parts = [enhancer.feed(response_text[start:start + chunk_size]) for start in range(0, len(response_text), chunk_size)]
+    parts.append(enhancer.flush())
+    return "".join(parts)
+
+IMPLEMENTATIONS = {
+    "enhance": enhance_candidate_response,
+    "streaming": streamed,
+}
+
+def best_time(function, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def growth_exponent(points):
+    """Slope of log(time) over log(size) between the smallest and largest size."""
+    (small_size, small_time), (large_size, large_time) = points[0], points[-1]
+    if small_time <= 0 or large_size == small_size:
+        return None
+    return round(math.log(large_time / small_time) / math.log(large_size / small_size), 2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the response post-processor on growing multi-candidate answers.")
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="Comma-separated candidate counts (default: 10,100,1000,10000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per size; the fastest is reported (default: 5)")
+    args = parser.parse_args()
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    report = {"sizes": [], "growth_exponent": {}}
+    points = {name: [] for name in IMPLEMENTATIONS}
+
+    for size in sizes:
+        text = make_answer(size)
+        row = {"candidates": size, "chars": len(text)}
+        for name, function in IMPLEMENTATIONS.items():
+            seconds = best_time(function, text, args.repeat)
+            points[name].append((len(text), seconds))
+            row[f"{name}_ms"] = round(seconds * 1000, 3)
+            row[f"{name}_ns_per_char"] = round(seconds * 1e9 / len(text), 1)
+        report["sizes"].append(row)
+        print(f"{size:>7} candidates  {len(text):>9} chars  " + "  ".join(
+            f"{name} {row[f'{name}_ms']:>9.3f} ms" for name in IMPLEMENTATIONS
+        ), file=sys.stderr)
+
+    for name in IMPLEMENTATIONS:
+        report["growth_exponent"][name] = growth_exponent(points[name])
+
+    # Every marker is enhanced exactly once: no pass rewrites what another inserted
+    text = make_answer(sizes[0])
+    enhanced = enhance_candidate_response(text)
+    report["markers_enhanced_once"] = sum(enhanced.count(replacement) for _, replacement in CANDIDATE_MARKERS) == len(marker_spans(text))
+    report["streaming_matches"] = streamed(text) == enhanced
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Schema bootstrap for the Candidates collection.
+Run once per deploy (before starting the API) to create or migrate the collection
+definition in utils/schema.py. Safe to re-run: nothing is written when the live
+schema already matches.
+"""
+
+import argparse
+import sys
+
+from utils.schema import bootstrap_schema, recreate_collection
+from utils.data_version import bump_data_version
+from utils.weaviate_client import get_weaviate_client, close_weaviate_client
+
+def main():
+    parser = argparse.ArgumentParser(description="Create or migrate the Candidates collection schema")
+    parser.add_argument("--dry-run", action="store_true", help="Show planned changes without applying them")
+    parser.add_argument(
+        "--recreate",
+        action="store_true",
+        help="Drop and recreate the collection to apply conflicting changes (deletes all objects; re-import with ingest.py --full)",
+    )
+    args = parser.parse_args()
+
+    client = get_weaviate_client()
+    try:
+        if args.recreate:
+            summary = recreate_collection(client, dry_run=args.dry_run)
+            if not args.dry_run:
+                bump_data_version()
+        else:
+            summary = bootstrap_schema(client, dry_run=args.dry_run)
+    finally:
+        close_weaviate_client()
+
+    print(f"Collection: {summary['collection']} (schema version {summary['schema_version']})")
+    print(f"Recorded schema version: {summary['stored_version'] if summary['stored_version'] is not None else 'none'}")
+    print(f"Desired hash: {summary['desired_hash']}")
+    print(f"Live hash:    {summary['live_hash'] or 'n/a'}")
+
+    if not summary["actions"] and not summary["conflicts"]:
+        print("Schema is up to date, nothing to do.")
+
+    prefix = "Would apply" if args.dry_run else "Applied"
+    for action in summary["actions"]:
+        print(f"{prefix}: {action}")
+
+    for conflict in summary["conflicts"]:
+        print(f"Conflict (requires --recreate): {conflict}")
+
+    return 1 if summary["conflicts"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Builds the precompiled candidate artifact.
+Parses and transforms form-submissions.json once into a compact binary file
+(fixed-width columns, interned string tables, offset-indexed lists) that API
+workers memory-map read-only instead of parsing the JSON themselves. Re-run
+after the source file changes; workers ignore an artifact that is older
+than the source.
+"""
+
+import argparse
+import sys
+import time
+
+from config import INGEST_SOURCE_FILE, CANDIDATE_ARTIFACT_PATH
+from utils.candidate_index import CandidateIndex
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the memory-mappable candidate artifact")
+    parser.add_argument("--file", default=INGEST_SOURCE_FILE, help="Path to form-submissions.json")
+    parser.add_argument("--output", default=CANDIDATE_ARTIFACT_PATH, help="Artifact file to write")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    index = CandidateIndex.from_file(args.file)
+    size = index.save(args.output, source_path=args.file)
+    print(f"Wrote {args.output}: {index.size} candidates, {size / 1024:.1f} KiB in {time.perf_counter() - start_time:.2f}s")
+
+    start_time = time.perf_counter()
+    loaded = CandidateIndex.load(args.output)
+    print(f"Verified: {loaded.size} candidates mapped in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+    return 0 if loaded.size == index.size else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,15 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+# Relative file paths are resolved against this directory, not the working directory, so the API,
+# ingest.py and the other commands find the same files wherever they are started from
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _app_path(name, default):
+    # An empty value stays empty: it turns the file off
+    value = os.getenv(name, default)
+    return os.path.join(APP_DIR, value) if value else value
+
 # Weaviate Configuration
 WEAVIATE_URL = os.getenv("WEAVIATE_URL", "https://p6ce0pj5rbib30et8ie7ug.c0.us-west3.gcp.weaviate.cloud")
 WEAVIATE_API_KEY = os.getenv("WEAVIATE_API_KEY", "HSJEaIn0nUSl3ZOEHmaXd68KryjWAR8CX8vy")
@@ -15,8 +24,172 @@ CANDIDATE_COLLECTION_DESCRIPTION = """
 Professional job candidate profiles containing work experience, education history, 
 skills, salary expectations, and contact information for hiring purposes.
 """
+# One-object collection recording the schema version and hash bootstrap_schema.py last applied
+SCHEMA_VERSION_COLLECTION = "CandidatesSchemaVersion"
 
 # Flask Configuration
 DEBUG = os.getenv("DEBUG", "False").lower() in ["true", "1", "t"]
 PORT = int(os.getenv("PORT", "5000"))
 HOST = os.getenv("HOST", "0.0.0.0")
+
+# Connection Pool Configuration
+# Seconds between readiness checks of the pooled Weaviate connection
+WEAVIATE_HEALTH_CHECK_INTERVAL = float(os.getenv("WEAVIATE_HEALTH_CHECK_INTERVAL", "30"))
+
+# Response Cache Configuration
+# Backend is "memory" (per process) or "sqlite" (shared by all workers on the host)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "True").lower() in ["true", "1", "t"]
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_PATH = _app_path("RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+
+# Candidates data version; ingestion bumps it to invalidate caches. Store is "weaviate" (a one-object
+# DATA_VERSION_COLLECTION, seen by every API instance) or "file" (DATA_VERSION_FILE, one host only).
+# Unset, it is "weaviate" with the weaviate query backend and "file" with the offline ones. Weaviate is
+# read at most every DATA_VERSION_CHECK_INTERVAL seconds.
+DATA_VERSION_STORE = (os.getenv("DATA_VERSION_STORE") or ("weaviate" if os.getenv("QUERY_BACKEND", "weaviate").lower() == "weaviate" else "file")).lower()
+DATA_VERSION_COLLECTION = os.getenv("DATA_VERSION_COLLECTION", "CandidatesDataVersion")
+DATA_VERSION_CHECK_INTERVAL = float(os.getenv("DATA_VERSION_CHECK_INTERVAL", "10"))
+DATA_VERSION_FILE = _app_path("DATA_VERSION_FILE", ".data_version")
+
+# Async Server Configuration (asgi.py)
+# Concurrent upstream agent calls per worker, and how many more may wait for a slot
+ASYNC_MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", "32"))
+ASYNC_MAX_QUEUE = int(os.getenv("ASYNC_MAX_QUEUE", "256"))
+ASYNC_RETRY_AFTER = int(os.getenv("ASYNC_RETRY_AFTER", "2"))
+
+# Request Coalescing Configuration
+# Identical concurrent agent questions (same normalized message and context) share one upstream call;
+# followers give up after COALESCING_TIMEOUT seconds
+COALESCING_ENABLED = os.getenv("COALESCING_ENABLED", "True").lower() in ["true", "1", "t"]
+COALESCING_TIMEOUT = float(os.getenv("COALESCING_TIMEOUT", "120"))
+
+# Batch API Configuration (/api/chat/batch)
+# Messages accepted per batch, and how many of them are answered at once
+BATCH_MAX_MESSAGES = int(os.getenv("BATCH_MAX_MESSAGES", "100"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+# Deadline Configuration
+# Each chat request must be answered within the X-Request-Timeout header (seconds, capped at
+# REQUEST_TIMEOUT_MAX) or REQUEST_TIMEOUT; agent calls run in a pool of UPSTREAM_MAX_WORKERS threads
+# so the request can stop waiting. AGENT_TIMEOUT is the Query Agent's own HTTP timeout.
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "30"))
+REQUEST_TIMEOUT_MAX = float(os.getenv("REQUEST_TIMEOUT_MAX", "120"))
+UPSTREAM_MAX_WORKERS = int(os.getenv("UPSTREAM_MAX_WORKERS", "32"))
+AGENT_TIMEOUT = int(os.getenv("AGENT_TIMEOUT", "60"))
+
+# Circuit Breaker Configuration
+# Agent calls fail fast for CIRCUIT_OPEN_SECONDS once, over the last CIRCUIT_WINDOW calls (at least
+# CIRCUIT_MIN_CALLS), the share of errors or of calls slower than CIRCUIT_SLOW_CALL_SECONDS reaches its
+# rate. A call cut off by its request's deadline before CIRCUIT_SLOW_CALL_SECONDS is not counted.
+# Meanwhile (and on a missed deadline) answers degrade to the cache or a local keyword search.
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "True").lower() in ["true", "1", "t"]
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "20"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "5"))
+CIRCUIT_ERROR_RATE = float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))
+CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "20"))
+CIRCUIT_SLOW_CALL_RATE = float(os.getenv("CIRCUIT_SLOW_CALL_RATE", "0.8"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+DEGRADED_LOCAL_SEARCH = os.getenv("DEGRADED_LOCAL_SEARCH", "True").lower() in ["true", "1", "t"]
+
+# Admission Control Configuration
+# At most ADMISSION_MAX_CONCURRENCY chat requests per worker are processed at once; the rest wait in a
+# fair (round-robin per client) queue of ADMISSION_MAX_QUEUE, at most ADMISSION_MAX_QUEUE_PER_CLIENT
+# per client. Each client (API key, or IP address) gets ADMISSION_RATE requests per second with bursts
+# of ADMISSION_BURST; ADMISSION_RATE=0 (the default) turns rate limiting off. Behind a reverse proxy,
+# set ADMISSION_TRUST_PROXY so clients are told apart by X-Forwarded-For; without it every client that
+# has no API key shares the proxy's address, and so one bucket and one queue.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "True").lower() in ["true", "1", "t"]
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "32"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_MAX_QUEUE_PER_CLIENT = int(os.getenv("ADMISSION_MAX_QUEUE_PER_CLIENT", "8"))
+ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", "0"))
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", "30"))
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", "10000"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+ADMISSION_TRUST_PROXY = os.getenv("ADMISSION_TRUST_PROXY", "False").lower() in ["true", "1", "t"]
+
+# Conversation Store Configuration
+# Backend is "memory" (per process) or "sqlite" (shared by all workers on the host)
+CONVERSATION_STORE_BACKEND = os.getenv("CONVERSATION_STORE_BACKEND", "memory").lower()
+CONVERSATION_TTL = float(os.getenv("CONVERSATION_TTL", "3600"))
+CONVERSATION_MAX_ENTRIES = int(os.getenv("CONVERSATION_MAX_ENTRIES", "10000"))
+CONVERSATION_STORE_PATH = _app_path("CONVERSATION_STORE_PATH", "conversations.sqlite3")
+
+# Follow-up Context Configuration
+# The previous exchange passed to the agent is fitted into this many (estimated) tokens,
+# keeping at most CONTEXT_MAX_CANDIDATES referenced candidate IDs
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+CONTEXT_MAX_CANDIDATES = int(os.getenv("CONTEXT_MAX_CANDIDATES", "25"))
+
+# Response Formatting Configuration
+# Answers that carry candidate objects (direct and offline answers) include up to this many structured cards
+RESPONSE_MAX_CARDS = int(os.getenv("RESPONSE_MAX_CARDS", "20"))
+
+# Slow-query Log Configuration
+# Chat requests taking SLOW_QUERY_THRESHOLD_MS or longer are logged as JSON Lines (the agent's searches,
+# stage timings, response size) to SLOW_QUERY_LOG_PATH, rotated at SLOW_QUERY_LOG_MAX_BYTES. With several
+# worker processes put "{pid}" in the path so each writes its own file.
+SLOW_QUERY_LOG_ENABLED = os.getenv("SLOW_QUERY_LOG_ENABLED", "True").lower() in ["true", "1", "t"]
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "5000"))
+SLOW_QUERY_LOG_PATH = _app_path("SLOW_QUERY_LOG_PATH", "slow_queries.jsonl")
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+
+# Profiler Configuration
+# Requests sent with "X-Profile: 1" and the admin token in X-Admin-Token, plus a PROFILER_SAMPLE_RATE share
+# of chat requests, are profiled by a sampling profiler. Collapsed-stack (flame graph) files are written to
+# PROFILER_DIR, which keeps the newest PROFILER_MAX_PROFILES. Without PROFILER_ADMIN_TOKEN requests can't
+# ask to be profiled and the /api/profiles endpoints are closed.
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "True").lower() in ["true", "1", "t"]
+PROFILER_ADMIN_TOKEN = os.getenv("PROFILER_ADMIN_TOKEN", "")
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", "0"))
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "10"))
+PROFILER_DIR = _app_path("PROFILER_DIR", "profiles")
+PROFILER_MAX_PROFILES = int(os.getenv("PROFILER_MAX_PROFILES", "50"))
+PROFILER_MAX_CONCURRENT = int(os.getenv("PROFILER_MAX_CONCURRENT", "4"))
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "120"))
+
+# Warm-up Configuration
+# Each worker connects to Weaviate, builds the Query Agent and loads the local index in the background
+# at startup; /api/ready answers 503 until that has finished. Failed steps are retried every
+# WARMUP_RETRY_INTERVAL seconds.
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "True").lower() in ["true", "1", "t"]
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "5"))
+# Optional queries answered into the response cache during warm-up: a markdown file of fenced
+# queries (example_queries.md), JSON Lines with a "message" field, or one query per line
+WARMUP_QUERIES_FILE = _app_path("WARMUP_QUERIES_FILE", "")
+WARMUP_MAX_QUERIES = int(os.getenv("WARMUP_MAX_QUERIES", "50"))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+
+# Ingestion Configuration
+INGEST_SOURCE_FILE = _app_path("INGEST_SOURCE_FILE", os.path.join("..", "form-submissions.json"))
+
+# Query Router Configuration
+# Structured questions (filters, counts, sorting) are answered with direct Weaviate queries
+QUERY_ROUTER_ENABLED = os.getenv("QUERY_ROUTER_ENABLED", "True").lower() in ["true", "1", "t"]
+QUERY_ROUTER_RESULT_LIMIT = int(os.getenv("QUERY_ROUTER_RESULT_LIMIT", "10"))
+QUERY_ROUTER_MAX_RESULTS = int(os.getenv("QUERY_ROUTER_MAX_RESULTS", "50"))
+# Weight of novelty versus relevance (0-1) for "diverse" questions, see utils/diversity.py
+QUERY_ROUTER_DIVERSITY = float(os.getenv("QUERY_ROUTER_DIVERSITY", "0.5"))
+
+# Local Candidate Index Configuration
+# In-process columnar index for structured filters, built from the same source file ingestion reads
+LOCAL_INDEX_ENABLED = os.getenv("LOCAL_INDEX_ENABLED", "True").lower() in ["true", "1", "t"]
+LOCAL_INDEX_SOURCE = _app_path("LOCAL_INDEX_SOURCE", INGEST_SOURCE_FILE)
+
+# Query Backend Configuration
+# "weaviate" runs questions through the Query Agent; "bm25" answers offline from the source file
+# (no Weaviate or OpenAI calls), for load tests and CI; "stub" simulates the agent's latency (benchmark.py)
+QUERY_BACKEND = os.getenv("QUERY_BACKEND", "weaviate").lower()
+BM25_SOURCE_FILE = _app_path("BM25_SOURCE_FILE", INGEST_SOURCE_FILE)
+BM25_TOP_K = int(os.getenv("BM25_TOP_K", "5"))
+# Stub backend: latency distribution in ms (fixed:MS, uniform:LOW:HIGH, normal:MEAN:STD, lognormal:MEDIAN:SIGMA),
+# fraction of failing queries and the seed that makes both reproducible
+STUB_LATENCY = os.getenv("STUB_LATENCY", "lognormal:1500:0.5")
+STUB_ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+STUB_SEED = int(os.getenv("STUB_SEED", "0"))
+
+# Precompiled candidate artifact (build_artifact.py), mapped by the local index when up to date
+CANDIDATE_ARTIFACT_PATH = _app_path("CANDIDATE_ARTIFACT_PATH", "candidates.bin")
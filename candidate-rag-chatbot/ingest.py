@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Candidate ingestion for the Candidates collection.
+Streams form submissions into Weaviate: records are parsed incrementally,
+transformed in a worker pool and sent in concurrent fixed-size batches, so
+memory use stays flat regardless of the file size.
+
+By default only the delta is written: candidates have deterministic UUIDs and
+a content hash, unchanged candidates are skipped and candidates that
+disappeared from the source are deleted.
+"""
+
+import argparse
+import os
+import sys
+
+from config import CANDIDATE_COLLECTION, INGEST_SOURCE_FILE
+from utils.ingestion import ingest, fetch_existing_hashes
+from utils.data_version import bump_data_version
+from utils.weaviate_client import get_weaviate_client, close_weaviate_client
+
+def main():
+    parser = argparse.ArgumentParser(description="Import form submissions into the Candidates collection")
+    parser.add_argument("--file", default=INGEST_SOURCE_FILE, help="Path to form-submissions.json")
+    parser.add_argument("--batch-size", type=int, default=100, help="Objects per batch request")
+    parser.add_argument("--concurrency", type=int, default=2, help="Batch requests in flight at once")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Transform worker processes")
+    parser.add_argument("--retries", type=int, default=2, help="Retry attempts for failed objects")
+    parser.add_argument("--full", action="store_true", help="Re-send every candidate, even if unchanged")
+    parser.add_argument("--keep-missing", action="store_true", help="Don't delete candidates that are no longer in the source")
+    parser.add_argument("--dry-run", action="store_true", help="Parse and transform only, don't write to Weaviate")
+    args = parser.parse_args()
+
+    print(f"Importing {args.file} into {CANDIDATE_COLLECTION}")
+
+    collection = None
+    existing_hashes = None
+    if not args.dry_run:
+        collection = get_weaviate_client().collections.get(CANDIDATE_COLLECTION)
+
+    try:
+        if collection is not None and not (args.full and args.keep_missing):
+            existing_hashes = fetch_existing_hashes(collection)
+            print(f"Found {len(existing_hashes)} existing candidates")
+
+        stats = ingest(
+            args.file,
+            collection,
+            batch_size=args.batch_size,
+            concurrent_requests=args.concurrency,
+            workers=args.workers,
+            retries=args.retries,
+            existing_hashes=None if args.full else existing_hashes,
+            delete_missing=not args.keep_missing,
+        )
+    finally:
+        if not args.dry_run:
+            close_weaviate_client()
+
+    # Print summary
+    summary = stats.as_dict()
+    print("Import complete!" if not args.dry_run else "Dry run complete!")
+    print(f"Records read: {summary['read']}")
+    print(f"Successfully imported: {summary['imported']} candidates")
+    print(f"Unchanged (skipped): {summary['unchanged']}")
+    print(f"Deleted: {summary['deleted']}")
+    for reason, count in summary["skipped"].items():
+        print(f"Skipped ({reason}): {count}")
+    print(f"Retried: {summary['retried']}, failed after retries: {summary['failed']}")
+    print(f"Elapsed: {summary['elapsed_seconds']}s ({summary['objects_per_second']} objects/s)")
+
+    if not args.dry_run and stats.changed():
+        # Invalidate cached answers in every API worker
+        print(f"New data version: {bump_data_version()}")
+
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,6 +16,10 @@ load_dotenv()
 # API Base URL (default to localhost if not specified)
 API_BASE_URL = os.getenv("API_URL", "http://localhost:5000")
 
+# Seconds the API has to answer (sent as its X-Request-Timeout deadline); it
+# replies with a degraded answer or an error by then, so the client waits only a little longer
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "30"))
+
 def print_response(response):
     """Pretty print API response"""
     if response.status_code == 200:
@@ -61,7 +65,12 @@ def chat_query(message, conversation_id=None):
         print(f"With conversation ID: {conversation_id}")
     
     try:
-        response = requests.post(url, json=payload, timeout=60)
+        response = requests.post(
+            url,
+            json=payload,
+            headers={"X-Request-Timeout": str(REQUEST_TIMEOUT)},
+            timeout=REQUEST_TIMEOUT + 5,
+        )
         print_response(response)
         
         # Return conversation ID if successful
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Offline: the stub Query Agent, no warm-up, nothing written next to the app
+os.environ.setdefault("QUERY_BACKEND", "stub")
+os.environ.setdefault("STUB_LATENCY", "fixed:5")
+os.environ.setdefault("WARMUP_ENABLED", "False")
+os.environ.setdefault("SLOW_QUERY_LOG_ENABLED", "False")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,131 @@
+import time
+import threading
+
+import pytest
+
+from utils import admission
+from utils.admission import AdmissionController, OverloadedError, ThrottledError, client_key
+from utils.deadline import Deadline
+
+
+def make_controller(**overrides):
+    settings = dict(max_concurrency=1, max_queue=8, max_queue_per_client=4, rate=0, burst=2, max_clients=100, retry_after=2)
+    settings.update(overrides)
+    return AdmissionController(**settings)
+
+
+def wait_until(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.005)
+
+
+def queue_request(controller, client, admitted_order):
+    """Starts a request of `client` and returns once it waits in the queue."""
+    def run():
+        with controller.acquire(client, Deadline(5), "chat"):
+            admitted_order.append(client)
+
+    waiting = controller.waiting
+    thread = threading.Thread(target=run)
+    thread.start()
+    wait_until(lambda: controller.waiting == waiting + 1)
+    return thread
+
+
+def test_client_key_prefers_api_keys():
+    assert client_key(None, "Bearer secret", None, "10.0.0.1") == client_key("secret", None, None, "10.0.0.2")
+    assert "secret" not in client_key("secret", None, None, None)
+    assert client_key(None, None, "1.2.3.4", "10.0.0.1") == "ip:10.0.0.1"
+
+
+def test_untrusted_forwarded_header_warns_once(monkeypatch, capsys):
+    monkeypatch.setattr(admission, "ADMISSION_TRUST_PROXY", False)
+    monkeypatch.setattr(admission, "_warned_untrusted_proxy", False)
+    client_key(None, None, "1.2.3.4", "10.0.0.1")
+    client_key(None, None, "5.6.7.8", "10.0.0.1")
+    assert capsys.readouterr().out.count("Warning:") == 1
+
+    monkeypatch.setattr(admission, "ADMISSION_TRUST_PROXY", True)
+    assert client_key(None, None, "1.2.3.4, 10.0.0.9", "10.0.0.1") == "ip:1.2.3.4"
+
+
+def test_token_bucket_throttles_after_the_burst():
+    controller = make_controller(rate=1, burst=2)
+    controller.take_tokens("a", 1, "chat")
+    controller.take_tokens("a", 1, "chat")
+    with pytest.raises(ThrottledError) as error:
+        controller.take_tokens("a", 1, "chat")
+    assert error.value.status == 429
+    assert 0 < error.value.retry_after <= 1
+    # Other clients have their own bucket
+    controller.take_tokens("b", 1, "chat")
+
+
+def test_token_bucket_refills_and_batches_go_into_debt():
+    controller = make_controller(rate=1, burst=2)
+    controller.take_tokens("a", 5, "chat")
+    with pytest.raises(ThrottledError):
+        controller.take_tokens("a", 1, "chat")
+
+    # Four seconds later the debt of three tokens is repaid
+    controller._clients["a"].updated -= 4
+    controller.take_tokens("a", 1, "chat")
+
+
+def test_freed_slots_go_round_robin_across_clients():
+    controller = make_controller()
+    admitted = []
+    holder = controller.acquire("holder", Deadline(5), "chat")
+    threads = [queue_request(controller, client, admitted) for client in ("batch", "batch", "batch", "interactive")]
+
+    holder.release()
+    for thread in threads:
+        thread.join(5)
+    assert admitted == ["batch", "interactive", "batch", "batch"]
+    assert controller.in_flight == 0
+    assert controller.waiting == 0
+
+
+def test_full_client_queue_is_throttled():
+    controller = make_controller(max_queue_per_client=1)
+    admitted = []
+    holder = controller.acquire("holder", Deadline(5), "chat")
+    thread = queue_request(controller, "a", admitted)
+
+    with pytest.raises(ThrottledError) as error:
+        controller.acquire("a", Deadline(5), "chat")
+    assert error.value.reason == "client_queue_full"
+
+    holder.release()
+    thread.join(5)
+    assert admitted == ["a"]
+
+
+def test_full_queue_is_overloaded():
+    controller = make_controller(max_queue=1)
+    admitted = []
+    holder = controller.acquire("holder", Deadline(5), "chat")
+    thread = queue_request(controller, "a", admitted)
+
+    with pytest.raises(OverloadedError) as error:
+        controller.acquire("b", Deadline(5), "chat")
+    assert (error.value.status, error.value.reason) == (503, "queue_full")
+
+    holder.release()
+    thread.join(5)
+
+
+def test_deadline_passing_in_the_queue_sheds_the_request():
+    controller = make_controller()
+    holder = controller.acquire("holder", Deadline(5), "chat")
+
+    with pytest.raises(OverloadedError) as error:
+        controller.acquire("a", Deadline(0.05), "chat")
+    assert error.value.reason == "queue_timeout"
+    assert controller.waiting == 0
+
+    holder.release()
+    assert controller.in_flight == 0
+    assert controller.stats()["rejected"]["queue_timeout"] == 1
@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+from app import app
+from config import BATCH_MAX_MESSAGES
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def chat(client, message, **body):
+    response = client.post("/api/chat", json={"message": message, **body})
+    data = response.get_json()
+    response.close()
+    return response.status_code, data
+
+
+def test_missing_message_is_rejected(client):
+    response = client.post("/api/chat", json={})
+    assert response.status_code == 400
+
+
+def test_structured_question_is_answered_directly(client):
+    status, data = chat(client, "How many candidates know Python?")
+    assert status == 200
+    assert data["success"]
+    assert data["meta"]["route"] == "direct"
+    assert "candidates with skills in Python" in data["response"]
+
+
+def test_open_question_goes_to_the_agent(client):
+    status, data = chat(client, "Who would be the best fit for a mentoring role?")
+    assert status == 200
+    assert data["meta"]["route"] == "agent"
+    assert [card["object_id"] for card in data["candidates"]] == ["stub-0", "stub-1", "stub-2"]
+
+    _, again = chat(client, "Who would be the best fit for a mentoring role?")
+    assert again["meta"]["route"] == "cache"
+    assert again["response"] == data["response"]
+
+
+def test_follow_up_keeps_the_conversation(client):
+    _, first = chat(client, "Who would be the best fit for a leadership role?")
+    status, second = chat(client, "Which of them know Docker?", conversation_id=first["conversation_id"])
+    assert status == 200
+    assert second["conversation_id"] == first["conversation_id"]
+
+
+def sse_events(response):
+    """The (event, data) pairs of a Server-Sent Events response."""
+    events = []
+    for block in response.get_data(as_text=True).split("\n\n"):
+        if block:
+            event, data = block.split("\n", 1)
+            events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    response.close()
+    return events
+
+
+def stream_events(client, message):
+    return sse_events(client.post("/api/chat/stream", json={"message": message}))
+
+
+def test_stream_sends_start_tokens_and_done(client):
+    events = stream_events(client, "Who would be the best fit for a leadership role?")
+    names = [name for name, _ in events]
+    assert names[0] == "start"
+    assert names[-1] == "done"
+    assert names.count("token") >= 2
+
+    assert events[-1][1]["candidates"]
+
+    # The tokens add up to the answer /api/chat gives
+    text = "".join(data["text"] for name, data in events if name == "token")
+    response = client.post("/api/chat", json={"message": "Who would be the best fit for a leadership role?"})
+    assert text == response.get_json()["response"]
+    response.close()
+
+
+BATCH = ["How many candidates know Python?", "Who would be the best fit for a leadership role?", "Hello there"]
+
+
+def test_batch_answers_every_question_in_order(client):
+    response = client.post("/api/chat/batch", json={"messages": BATCH})
+    data = response.get_json()
+    response.close()
+    assert [result["message"] for result in data["results"]] == BATCH
+    assert [result["index"] for result in data["results"]] == [0, 1, 2]
+    assert all(result["success"] for result in data["results"])
+    assert data["results"][0]["meta"]["route"] == "direct"
+
+
+def test_batch_stream_sends_each_result_and_a_summary(client):
+    events = sse_events(client.post("/api/chat/batch", json={"messages": BATCH, "stream": True}))
+    assert sorted(data["index"] for name, data in events if name == "result") == [0, 1, 2]
+    assert events[-1][0] == "done"
+
+
+@pytest.mark.parametrize("body", [{}, {"messages": []}, {"messages": ["ok", 3]}, {"messages": ["q"] * (BATCH_MAX_MESSAGES + 1)}])
+def test_invalid_batches_are_rejected(client, body):
+    response = client.post("/api/chat/batch", json=body)
+    assert response.status_code == 400
+
+
+def metric_value(text, name):
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_metrics_count_chat_requests_and_stages(client):
+    requests = 'chat_request_duration_seconds_count{endpoint="chat"}'
+    routing = 'chat_stage_duration_seconds_count{stage="route_query"}'
+    before = client.get("/api/metrics").get_data(as_text=True)
+
+    response = client.post("/api/chat", json={"message": "How many candidates know Docker?"})
+    response.get_data()
+    response.close()
+
+    metrics = client.get("/api/metrics")
+    assert metrics.content_type.startswith("text/plain")
+    after = metrics.get_data(as_text=True)
+    assert metric_value(after, requests) == metric_value(before, requests) + 1
+    assert metric_value(after, routing) >= metric_value(before, routing) + 1
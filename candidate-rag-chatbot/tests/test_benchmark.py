@@ -0,0 +1,43 @@
+import pytest
+
+from benchmark import build_schedule, compare
+from utils.stub_backend import StubAgentError, StubQueryAgent, parse_latency
+
+
+def test_stub_latency_and_failures_are_reproducible():
+    agent = StubQueryAgent(latency="uniform:100:900", error_rate=0.3, seed=7)
+    plans = [agent.plan(f"query {number}") for number in range(200)]
+    assert plans == [StubQueryAgent("uniform:100:900", 0.3, 7).plan(f"query {number}") for number in range(200)]
+    assert all(0.1 <= seconds <= 0.9 for seconds, _ in plans)
+    assert 30 < sum(fails for _, fails in plans) < 90
+    assert plans != [StubQueryAgent("uniform:100:900", 0.3, 8).plan(f"query {number}") for number in range(200)]
+
+
+def test_stub_fails_the_planned_queries():
+    agent = StubQueryAgent(latency="fixed:0", error_rate=0.5, seed=1)
+    failing = next(query for query in map(str, range(100)) if agent.plan(query)[1])
+    passing = next(query for query in map(str, range(100)) if not agent.plan(query)[1])
+    with pytest.raises(StubAgentError):
+        agent.run(failing)
+    assert agent.run(passing).final_answer
+
+
+@pytest.mark.parametrize("spec", ["fixed", "fixed:a", "uniform:1", "gamma:1:2", ""])
+def test_invalid_latency_specs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        parse_latency(spec)
+
+
+def test_schedule_is_seeded():
+    queries = ["a", "b", "c"]
+    assert build_schedule(queries, 10, seed=3) == build_schedule(queries, 10, seed=3)
+    assert len(build_schedule(queries, 10, seed=3)) == 10
+
+
+def test_compare_flags_regressions_beyond_the_tolerance():
+    baseline = {"latency_ms": {"p50": 100, "p90": 200, "p95": 300, "p99": 400}, "throughput_rps": 50, "error_rate": 0.01}
+    slower = {"latency_ms": {"p50": 105, "p90": 200, "p95": 400, "p99": 400}, "throughput_rps": 50, "error_rate": 0.01}
+    _, regressed = compare(slower, baseline, tolerance=0.1)
+    assert regressed
+    _, regressed = compare(baseline, baseline, tolerance=0.1)
+    assert not regressed
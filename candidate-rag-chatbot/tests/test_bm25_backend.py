@@ -0,0 +1,55 @@
+import pytest
+
+from utils.bm25_backend import BM25Index, run_bm25_query, tokenize
+
+
+def candidate(object_id, skills, role="Engineer", company="Acme", location="Brazil"):
+    return object_id, {
+        "skills_text": skills,
+        "location": location,
+        "work_experiences": [{"roleName": role, "company": company}],
+        "education_degrees": [],
+    }
+
+
+@pytest.fixture
+def index():
+    return BM25Index([
+        candidate("a", "Python, Docker", role="Backend Engineer"),
+        candidate("b", "React, TypeScript", role="Frontend Developer"),
+        candidate("c", "Python, Machine Learning", role="Data Scientist", location="Chile"),
+        candidate("d", "C++, Node.js", company="Python Software Foundation"),
+    ])
+
+
+def test_tokenize_folds_accents_and_keeps_symbols():
+    assert tokenize("São Paulo C++ Node.js") == ["sao", "paulo", "c++", "node.js"]
+
+
+def test_search_ranks_matching_candidates_first(index):
+    results = index.search("python docker", k=3)
+    assert [index.ids[row] for row, _ in results][:1] == ["a"]
+    assert {index.ids[row] for row, _ in results} == {"a", "c", "d"}
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_skills_weigh_more_than_companies(index):
+    results = dict((index.ids[row], score) for row, score in index.search("python", k=4))
+    assert results["a"] > results["d"]
+
+
+def test_search_without_matches_is_empty(index):
+    assert index.search("cobol mainframe", k=3) == []
+    assert index.search("", k=3) == []
+
+
+def test_run_bm25_query_answers_like_the_agent():
+    response = run_bm25_query("Python developers", k=2)
+    assert response.final_answer.startswith("Here are the 2 best matching candidates")
+    assert len(response.sources) == 2
+    assert not response.is_partial_answer
+
+    empty = run_bm25_query("zzzz qqqq", k=2)
+    assert empty.is_partial_answer
+    assert empty.sources == []
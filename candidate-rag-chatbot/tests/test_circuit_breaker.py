@@ -0,0 +1,122 @@
+import pytest
+
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from utils.deadline import Deadline, DeadlineExceeded
+
+
+def make_breaker(**overrides):
+    settings = dict(window=10, min_calls=4, error_rate=0.5, slow_call_seconds=1.0, slow_call_rate=0.5, open_seconds=30)
+    settings.update(overrides)
+    return CircuitBreaker(**settings)
+
+
+def record_calls(breaker, outcomes):
+    for seconds, failed in outcomes:
+        breaker.allow()
+        breaker.record(seconds, failed)
+
+
+def expire_open_period(breaker):
+    breaker._opened_at -= breaker.open_seconds
+
+
+def test_stays_closed_below_min_calls():
+    breaker = make_breaker()
+    record_calls(breaker, [(0.1, True)] * 3)
+    assert breaker.state == CLOSED
+
+
+def test_opens_on_error_rate_and_rejects():
+    breaker = make_breaker()
+    record_calls(breaker, [(0.1, False), (0.1, False), (0.1, True), (0.1, True)])
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.allow()
+    assert error.value.retry_after > 1
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_opens_on_slow_calls():
+    breaker = make_breaker()
+    record_calls(breaker, [(0.1, False), (0.1, False), (2.0, False), (2.0, False)])
+    assert breaker.state == OPEN
+
+
+def test_old_outcomes_leave_the_window():
+    breaker = make_breaker(window=4)
+    record_calls(breaker, [(0.1, True)] + [(0.1, False)] * 6 + [(0.1, True)])
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_error_rate"] == 0.25
+
+
+def test_calls_cut_by_a_long_deadline_count_as_slow():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.allow()
+        breaker.record(1.5, False, timed_out=True)
+    assert breaker.state == OPEN
+
+
+def test_calls_cut_by_a_short_deadline_are_not_counted():
+    breaker = make_breaker()
+
+    def hang():
+        raise DeadlineExceeded(Deadline(0.05))
+
+    for _ in range(5):
+        with pytest.raises(DeadlineExceeded):
+            breaker.call(hang)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+def test_half_open_allows_a_single_trial():
+    breaker = make_breaker()
+    record_calls(breaker, [(0.1, True)] * 4)
+    expire_open_period(breaker)
+
+    breaker.allow()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_successful_trial_closes():
+    breaker = make_breaker()
+    record_calls(breaker, [(0.1, True)] * 4)
+    expire_open_period(breaker)
+
+    assert breaker.call(lambda: "answer") == "answer"
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+@pytest.mark.parametrize("seconds, failed, timed_out", [(0.1, True, False), (2.0, False, False), (2.0, False, True)])
+def test_failed_slow_or_timed_out_trial_reopens(seconds, failed, timed_out):
+    breaker = make_breaker()
+    record_calls(breaker, [(0.1, True)] * 4)
+    expire_open_period(breaker)
+
+    breaker.allow()
+    breaker.record(seconds, failed, timed_out)
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+
+
+def test_trial_cut_by_a_short_deadline_stays_half_open():
+    breaker = make_breaker()
+    record_calls(breaker, [(0.1, True)] * 4)
+    expire_open_period(breaker)
+
+    breaker.allow()
+    breaker.record(0.05, False, timed_out=True)
+    assert breaker.state == HALF_OPEN
+    breaker.allow()
+    breaker.record(0.1, False)
+    assert breaker.state == CLOSED
+
+
+def test_disabled_breaker_never_opens():
+    breaker = make_breaker(enabled=False)
+    record_calls(breaker, [(0.1, True)] * 10)
+    assert breaker.state == CLOSED
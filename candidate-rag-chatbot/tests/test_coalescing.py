@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+
+from utils.coalescing import CoalescedTimeoutError, CoalescingStats, SingleFlight
+
+
+def start_leader(flights, key, result=None, error=None):
+    """Joins `key` as its leader in a thread that completes the call once released."""
+    joined = threading.Event()
+    release = threading.Event()
+
+    def call():
+        release.wait(5)
+        if error is not None:
+            raise error
+        return result
+
+    def run():
+        flight, leader = flights.join(key)
+        assert leader
+        joined.set()
+        try:
+            flights.complete(key, flight, call())
+        except BaseException as e:
+            flights.complete(key, flight, error=e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    joined.wait(5)
+    return release, thread
+
+
+def test_followers_share_the_leaders_result():
+    flights = SingleFlight(CoalescingStats())
+    release, thread = start_leader(flights, "q", result="answer")
+
+    flight, leader = flights.join("q")
+    assert not leader
+    release.set()
+    assert flights.wait(flight, timeout=5) == "answer"
+    thread.join(5)
+
+    stats = flights.stats.stats()
+    assert (stats["upstream_calls"], stats["coalesced"], stats["saved_calls"]) == (1, 1, 1)
+    assert flights.in_flight() == 0
+
+
+def test_followers_share_the_leaders_error():
+    flights = SingleFlight(CoalescingStats())
+    release, thread = start_leader(flights, "q", error=ValueError("upstream failed"))
+
+    flight, _ = flights.join("q")
+    release.set()
+    with pytest.raises(ValueError, match="upstream failed"):
+        flights.wait(flight, timeout=5)
+    thread.join(5)
+    assert flights.stats.stats()["follower_errors"] == 1
+
+
+def test_follower_timeout_leaves_the_leader_running():
+    flights = SingleFlight(CoalescingStats())
+    release, thread = start_leader(flights, "q", result="answer")
+
+    flight, _ = flights.join("q")
+    with pytest.raises(CoalescedTimeoutError):
+        flights.wait(flight, timeout=0.02)
+    assert flights.in_flight() == 1
+
+    release.set()
+    thread.join(5)
+    assert flight.result == "answer"
+    assert flights.stats.stats()["follower_timeouts"] == 1
+
+
+def test_interrupted_leader_hands_followers_a_plain_error():
+    flights = SingleFlight(CoalescingStats())
+    flight, _ = flights.join("q")
+    follower, leader = flights.join("q")
+    assert not leader
+
+    flights.complete("q", flight, error=KeyboardInterrupt())
+    with pytest.raises(RuntimeError):
+        flights.wait(follower, timeout=1)
+
+
+def test_run_calls_once_per_flight_and_not_after_it():
+    flights = SingleFlight(CoalescingStats())
+    calls = []
+    assert flights.run("q", lambda: calls.append(1) or "answer") == ("answer", True)
+    assert flights.run("q", lambda: calls.append(1) or "again") == ("again", True)
+    assert len(calls) == 2
+
+
+def test_disabled_coalescing_never_shares():
+    flights = SingleFlight(CoalescingStats(), enabled=False)
+    flights.join("q")
+    _, leader = flights.join("q")
+    assert leader
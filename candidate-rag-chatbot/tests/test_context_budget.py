@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+from utils.context_budget import MIN_ANSWER_TOKENS, estimate_tokens, fit_context
+
+IDS = [f"00000000-0000-0000-0000-{number:012d}" for number in range(25)]
+ANSWER = "\n\n".join(
+    ["Here are the candidates matching your search:"]
+    + [f"**Candidate {number}** - Senior Engineer\nSkills: Python, Docker, React" for number in range(40)]
+)
+
+
+def context_tokens(context):
+    return estimate_tokens(context["query"]) + estimate_tokens(context["answer"]) + sum(
+        estimate_tokens(object_id) for object_id in context["candidate_ids"]
+    )
+
+
+@pytest.mark.parametrize("budget", [0, 1, 10, 40, 100, 800])
+def test_context_fits_the_budget(budget):
+    context = fit_context("Which of them know Python and live in Brazil?", ANSWER, IDS, budget=budget)
+    assert context_tokens(context) <= budget
+    json.dumps(context)
+
+
+def test_candidate_ids_leave_the_answer_its_minimum():
+    context = fit_context("Who knows Python?", ANSWER, IDS, budget=120)
+    assert context_tokens(context) - estimate_tokens(context["answer"]) <= 120 - MIN_ANSWER_TOKENS
+    assert context["candidate_ids"]
+    assert len(context["candidate_ids"]) < len(IDS)
+    assert context["candidate_ids"] == IDS[:len(context["candidate_ids"])]
+
+
+def test_short_exchange_is_kept_whole():
+    context = fit_context("Who knows Python?", "Only Ana does.", IDS[:2])
+    assert context == {"query": "Who knows Python?", "answer": "Only Ana does.", "candidate_ids": IDS[:2]}
@@ -0,0 +1,79 @@
+import pytest
+
+from utils.query_router import Vocabulary, parse_query
+
+VOCABULARY = Vocabulary(["Python", "React", "Docker", "Amazon Web Services"], ["Brazil", "São Paulo", "United States"])
+
+
+def test_skills_are_routed():
+    plan = parse_query("Find candidates who know Python and Docker", VOCABULARY)
+    assert plan is not None
+    assert plan.predicates == {"skills_all": ["Python", "Docker"]}
+
+
+@pytest.mark.parametrize("message", [
+    "Find candidates without Python experience",
+    "Candidates with no Python experience",
+    "Candidates who do not know Python",
+    "Candidates who don't know Python",
+    "Everyone except Python developers",
+])
+def test_negations_go_to_the_agent(message):
+    assert parse_query(message, VOCABULARY) is None
+
+
+def test_salary_range_and_sort():
+    plan = parse_query("Top 3 candidates with the lowest salary between $50k and 90,000 who know React", VOCABULARY)
+    assert plan is not None
+    assert plan.predicates == {"skills_all": ["React"], "salary_min": 50000, "salary_max": 90000}
+    assert (plan.sort_by, plan.ascending, plan.limit) == ("salary_expectation", True, 3)
+
+
+def test_count_with_location_alias():
+    plan = parse_query("How many candidates are based in the USA?", VOCABULARY)
+    assert plan is not None
+    assert plan.count
+    assert plan.predicates == {"locations": ["United States"]}
+
+
+def test_any_skill_and_degree_or_higher():
+    plan = parse_query("Candidates with a master's degree or higher who know Python or React", VOCABULARY)
+    assert plan is not None
+    assert plan.predicates["skills_any"] == ["Python", "React"]
+    assert set(plan.predicates["levels"]) >= {"Master's Degree", "Doctorate"}
+    assert "Bachelor's Degree" not in plan.predicates["levels"]
+
+
+@pytest.mark.parametrize("message", [
+    "Who would be the best fit for a leadership role?",
+    "Python developers with startup experience",
+    "Hello",
+])
+def test_open_ended_questions_go_to_the_agent(message):
+    assert parse_query(message, VOCABULARY) is None
+
+
+@pytest.mark.parametrize("message, predicates", [
+    ("Who knows Docker and AWS in the US?", {"skills_all": ["Docker", "Amazon Web Services"], "locations": ["United States"]}),
+    ("full-time candidates in US", {"locations": ["United States"], "availability": ["full-time"]}),
+    ("candidates in US with less than 100k", {"locations": ["United States"], "salary_max": 100000}),
+    ("Python candidates from the U.S.", {"skills_all": ["Python"], "locations": ["United States"]}),
+])
+def test_us_is_kept_as_a_location(message, predicates):
+    plan = parse_query(message, VOCABULARY)
+    assert plan is not None
+    assert plan.predicates == predicates
+
+
+def test_us_as_a_pronoun_is_filler():
+    plan = parse_query("Can you show us candidates who know Python?", VOCABULARY)
+    assert plan is not None
+    assert plan.predicates == {"skills_all": ["Python"]}
+
+
+@pytest.mark.parametrize("message, vocabulary", [
+    ("US-based Python developers", VOCABULARY),
+    ("Python candidates in the US", Vocabulary(["Python"], ["Brazil"])),
+])
+def test_unresolved_us_goes_to_the_agent(message, vocabulary):
+    assert parse_query(message, vocabulary) is None
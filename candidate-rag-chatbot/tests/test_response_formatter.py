@@ -0,0 +1,46 @@
+import pytest
+
+from utils.response_formatter import StreamingEnhancer, enhance_candidate_response
+
+ANSWER = (
+    "Here are two matches:\n\n"
+    "Name: Ana Souza\nEmail: ana@example.com\nCurrent Company: Acme\nSalary Expectation: $90,000\n"
+    "skills: Python, React\n\n"
+    "name: Bob\nLocation: Brazil\ncurrent company: Initech"
+)
+
+
+def stream(chunks):
+    enhancer = StreamingEnhancer()
+    return "".join(enhancer.feed(chunk) for chunk in chunks) + enhancer.flush()
+
+
+def test_markers_are_enhanced_once():
+    enhanced = enhance_candidate_response(ANSWER)
+    assert "👤 **Name:** Ana Souza" in enhanced
+    assert "🏢 **Current Company:** Acme" in enhanced
+    assert "💰 **Salary Expectation:** $90,000" in enhanced
+    assert "🛠️ **Skills:** Python, React" in enhanced
+    assert "👤 **Name:** Bob" in enhanced
+    assert "🏢 **Current Company:** Initech" in enhanced
+    assert enhanced.count("👤") == 2
+    assert "**👤" not in enhanced
+
+
+def test_every_split_point_gives_the_same_text():
+    expected = enhance_candidate_response(ANSWER)
+    for split in range(len(ANSWER) + 1):
+        assert stream([ANSWER[:split], ANSWER[split:]]) == expected, split
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 16])
+def test_small_chunks_give_the_same_text(size):
+    chunks = [ANSWER[start:start + size] for start in range(0, len(ANSWER), size)]
+    assert stream(chunks) == enhance_candidate_response(ANSWER)
+
+
+def test_text_is_released_before_the_stream_ends():
+    enhancer = StreamingEnhancer()
+    sent = enhancer.feed(ANSWER)
+    assert sent
+    assert enhance_candidate_response(ANSWER).startswith(sent)
@@ -0,0 +1,90 @@
+import json
+from types import SimpleNamespace
+
+from analyze_slow_queries import analyze, log_files, only_filters, question_pattern, search_signature
+from utils import slow_query_log
+from utils.query_router import Vocabulary
+
+VOCABULARY = Vocabulary(["Python", "React", "Docker"], ["Brazil", "New York", "Chile"])
+
+AGENT_SEARCH = {"collection": "Candidates", "queries": ["python developers"], "filters": [[{"property_name": "location"}]]}
+FILTER_SEARCH = {"collection": "Candidates", "queries": [None], "filters": [{"property_name": "salary_expectation"}, {"property_name": "location"}]}
+
+
+class ListLogger:
+    def __init__(self):
+        self.lines = []
+
+    def info(self, line):
+        self.lines.append(line)
+
+
+def traced(monkeypatch, threshold_ms):
+    logger = ListLogger()
+    monkeypatch.setattr(slow_query_log, "SLOW_QUERY_LOG_ENABLED", True)
+    monkeypatch.setattr(slow_query_log, "SLOW_QUERY_THRESHOLD_MS", threshold_ms)
+    monkeypatch.setattr(slow_query_log, "_get_logger", lambda: logger)
+    return logger
+
+
+def test_slow_requests_are_logged_with_the_agent_searches(monkeypatch):
+    logger = traced(monkeypatch, 0)
+    trace = slow_query_log.start_trace("chat")
+    slow_query_log.trace_question("Python developers in Brazil", None)
+    slow_query_log.trace_answer("agent", SimpleNamespace(
+        final_answer="Two candidates.",
+        searches=[[AGENT_SEARCH, {"object_id": "1", "name": "Ana"}]],
+        sources=[1, 2],
+        total_time=1.5,
+    ))
+    trace.stages["agent"] = 1.5
+    trace.finish(200)
+
+    entry = json.loads(logger.lines[0])
+    assert (entry["endpoint"], entry["route"], entry["status"]) == ("chat", "agent", 200)
+    assert entry["searches"] == [AGENT_SEARCH]
+    assert (entry["result_count"], entry["agent_total_time_ms"], entry["stages_ms"]) == (2, 1500.0, {"agent": 1500.0})
+
+
+def test_fast_requests_are_not_logged(monkeypatch):
+    logger = traced(monkeypatch, 60000)
+    trace = slow_query_log.start_trace("chat")
+    slow_query_log.trace_question("Python developers", None)
+    trace.finish(200)
+    assert logger.lines == []
+
+
+def test_question_pattern_replaces_known_terms():
+    assert question_pattern("React developers in New York with a Master's degree under $90k?", VOCABULARY) == (
+        "<skill> developers in <location> with a <degree> degree under <n>"
+    )
+    assert question_pattern("Python developers in Chile", VOCABULARY) == question_pattern("Docker developers in Brazil", VOCABULARY)
+
+
+def test_search_signature_and_only_filters():
+    assert search_signature(AGENT_SEARCH) == "Candidates:search[location]"
+    assert search_signature(FILTER_SEARCH) == "Candidates:filter[location,salary_expectation]"
+    assert only_filters({"searches": [FILTER_SEARCH]})
+    assert not only_filters({"searches": [FILTER_SEARCH, AGENT_SEARCH]})
+    assert not only_filters({"searches": []})
+
+
+def test_analyze_groups_patterns_and_hints():
+    entries = [
+        {"message": "Candidates who know Python in Chile", "route": "agent", "total_ms": 9000, "searches": [AGENT_SEARCH]},
+        {"message": "Candidates who know Python in Chile", "route": "agent", "total_ms": 7000, "searches": [AGENT_SEARCH]},
+        {"message": "Tell me about Ana's background", "route": "agent", "total_ms": 3000, "searches": [AGENT_SEARCH]},
+    ]
+    patterns = analyze(entries, VOCABULARY)
+    assert [pattern["pattern"] for pattern in patterns] == ["candidates who know <skill> in <location>", "tell me about ana's background"]
+    slowest = patterns[0]
+    assert (slowest["count"], slowest["distinct_questions"], slowest["total_time_ms"]) == (2, 1, 16000)
+    assert slowest["hints"] == ["cache", "route"]
+    assert patterns[1]["hints"] == []
+
+
+def test_log_files_reads_rotations_oldest_first(tmp_path):
+    for name in ("slow.jsonl", "slow.jsonl.1", "slow.jsonl.2", "other.txt"):
+        (tmp_path / name).write_text("")
+    paths = log_files([str(tmp_path / "slow.jsonl")])
+    assert [path.rsplit("/", 1)[-1] for path in paths] == ["slow.jsonl.2", "slow.jsonl.1", "slow.jsonl"]
@@ -0,0 +1,424 @@
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict, deque
+
+# Import configuration
+from config import ADMISSION_TRUST_PROXY
+from utils.metrics import ADMISSION_QUEUE_SECONDS, ADMISSION_PROCESSING_SECONDS, ADMISSION_REJECTED, record_stage
+
+# Admission control in front of the chat routes, so one client running
+# scripted queries can't take every worker from the other recruiters.
+#
+# Each client (API key, or IP address without one) has a token bucket: a
+# request needs a token and takes `cost` of them (one per question, so a batch
+# of 50 takes 50), going into debt if it has to. A client that keeps sending
+# faster than `rate` per second is answered 429 until its debt is repaid,
+# while a recruiter asking a question now and then never notices the bucket.
+#
+# At most `max_concurrency` chat requests are processed at once. Requests
+# beyond that wait in one FIFO queue per client, and a freed slot goes to the
+# next client in round-robin order, not to the oldest request: an interactive
+# request waits behind at most one request of each other client, however many
+# a batch client has queued. A full queue (503), a full per-client queue (429)
+# or a deadline passing in the queue (503) sheds the request before any work
+# is done on it.
+#
+# The controller is shared by the Flask threads and the event loop of
+# asgi.py; waiters are woken through a callback, so both kinds can wait in the
+# same queue.
+
+
+class AdmissionRejected(Exception):
+    """A request shed by admission control; `status` is the HTTP status to answer with."""
+
+    status = 503
+
+    def __init__(self, message, reason, retry_after):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ThrottledError(AdmissionRejected):
+    """The client is over its rate or already has too many requests waiting (429)."""
+
+    status = 429
+
+
+class OverloadedError(AdmissionRejected):
+    """The server is at capacity: the queue is full or the request's deadline passed in it (503)."""
+
+    status = 503
+
+
+_warned_untrusted_proxy = False
+
+
+def client_key(api_key, authorization, forwarded_for, remote_addr):
+    """
+    Identifies the client of a request for rate limiting and fair queuing.
+
+    Args:
+        api_key: The X-API-Key header, or None.
+        authorization: The Authorization header, or None; a bearer token counts as an API key.
+        forwarded_for: The X-Forwarded-For header, or None; used only with ADMISSION_TRUST_PROXY.
+        remote_addr: The peer address of the connection.
+
+    Returns:
+        "key:<hash>" for requests with an API key (keys are hashed so stats
+        never show them), otherwise "ip:<address>".
+    """
+    if not api_key and authorization and authorization[:7].lower() == "bearer ":
+        api_key = authorization[7:].strip()
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    if ADMISSION_TRUST_PROXY and forwarded_for:
+        return "ip:" + forwarded_for.split(",")[0].strip()
+    if forwarded_for:
+        _warn_untrusted_proxy(remote_addr)
+    return "ip:" + (remote_addr or "unknown")
+
+
+def _warn_untrusted_proxy(remote_addr):
+    global _warned_untrusted_proxy
+    if _warned_untrusted_proxy:
+        return
+    _warned_untrusted_proxy = True
+    print(f"Warning: requests arrive through a proxy ({remote_addr}) but ADMISSION_TRUST_PROXY is off, "
+          f"so all clients without an API key share one rate limit and queue. "
+          f"Set ADMISSION_TRUST_PROXY=True if the proxy sets X-Forwarded-For.")
+
+
+class _Client:
+    """Token bucket and counters of one client."""
+
+    __slots__ = ("tokens", "updated", "admitted", "rejected")
+
+    def __init__(self, burst, now):
+        self.tokens = burst
+        self.updated = now
+        self.admitted = 0
+        self.rejected = 0
+
+
+class _Waiter:
+    """A queued request; wake() is called once a slot was granted to it."""
+
+    __slots__ = ("client", "wake", "granted")
+
+    def __init__(self, client, wake):
+        self.client = client
+        self.wake = wake
+        self.granted = False
+
+
+class Admission:
+    """
+    A slot held by an admitted request; release() it when the response is done.
+
+    Attributes:
+        queue_seconds: How long the request waited in the queue for its slot.
+    """
+
+    def __init__(self, controller, endpoint, queue_seconds):
+        self._controller = controller
+        self.endpoint = endpoint
+        self.queue_seconds = queue_seconds
+        self.started_at = time.perf_counter()
+        self._released = False
+
+    def release(self):
+        """Frees the slot for the next queued request (only the first call counts)."""
+        if self._released:
+            return
+        self._released = True
+        processing_seconds = time.perf_counter() - self.started_at
+        ADMISSION_PROCESSING_SECONDS.labels(endpoint=self.endpoint).observe(processing_seconds)
+        self._controller._release(processing_seconds)
+
+    def server_timing(self):
+        """The Server-Timing header value reporting the queue wait."""
+        return f"queue;dur={self.queue_seconds * 1000:.1f}"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class AdmissionController:
+    """
+    Per-client token buckets and a bounded, fair queue for chat requests.
+
+    Args:
+        max_concurrency: Chat requests processed at once.
+        max_queue: Requests that may wait for a slot, over all clients.
+        max_queue_per_client: Requests one client may have waiting.
+        rate: Tokens per second each client's bucket refills at; 0 disables rate limiting.
+        burst: Bucket size, the requests a client can send at once after being idle.
+        max_clients: Clients whose buckets are kept; the least recently seen are forgotten.
+        retry_after: Retry-After seconds suggested when the server is at capacity.
+        enabled: When False every request is admitted at once.
+
+    Usage:
+        with controller.acquire(client, deadline, "chat") as admission:
+            ...
+    """
+
+    def __init__(self, max_concurrency, max_queue, max_queue_per_client, rate, burst, max_clients, retry_after, enabled=True):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.retry_after = retry_after
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()
+        # Client -> deque of waiters, in round-robin order
+        self._queues = OrderedDict()
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = {"rate_limited": 0, "client_queue_full": 0, "queue_full": 0, "queue_timeout": 0}
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+        self.processing_seconds = 0.0
+        self.completed = 0
+
+    def _client(self, client, now):
+        state = self._clients.get(client)
+        if state is None:
+            state = self._clients[client] = _Client(self.burst, now)
+            if len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(client)
+        return state
+
+    def _reject(self, error_type, message, reason, retry_after, state, endpoint):
+        self.rejected[reason] += 1
+        if state is not None:
+            state.rejected += 1
+        ADMISSION_REJECTED.labels(endpoint=endpoint, reason=reason).inc()
+        return error_type(message, reason, retry_after)
+
+    def take_tokens(self, client, cost, endpoint):
+        """
+        Charges a request to its client's token bucket.
+
+        Args:
+            client: The client key (see client_key).
+            cost: Tokens to take, one per question.
+            endpoint: The route, for the metrics.
+
+        Raises:
+            ThrottledError: If the bucket holds less than one token.
+        """
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            state = self._client(client, now)
+            if self.rate <= 0:
+                return
+            state.tokens = min(self.burst, state.tokens + (now - state.updated) * self.rate)
+            state.updated = now
+            if state.tokens < 1:
+                retry_after = (1 - state.tokens) / self.rate
+                raise self._reject(ThrottledError, "Too many requests from this client, please slow down",
+                                   "rate_limited", retry_after, state, endpoint)
+            # A batch may leave the bucket in debt; the client waits until it is repaid
+            state.tokens -= cost
+
+    def _enter(self, client, wake, endpoint):
+        """Takes a free slot (returns None) or queues a waiter (returns it)."""
+        with self._lock:
+            state = self._clients.get(client)
+            if self.in_flight < self.max_concurrency and not self.waiting:
+                self.in_flight += 1
+                self.admitted += 1
+                return None
+            if self.waiting >= self.max_queue:
+                raise self._reject(OverloadedError, "Server is busy, please retry shortly",
+                                   "queue_full", self.retry_after, state, endpoint)
+            queue = self._queues.get(client)
+            if queue is not None and len(queue) >= self.max_queue_per_client:
+                raise self._reject(ThrottledError, "Too many requests from this client are already waiting",
+                                   "client_queue_full", self.retry_after, state, endpoint)
+            if queue is None:
+                queue = self._queues[client] = deque()
+            waiter = _Waiter(client, wake)
+            queue.append(waiter)
+            self.waiting += 1
+            self.queued += 1
+            return waiter
+
+    def _leave(self, waiter, endpoint):
+        """
+        Takes a waiter whose wait ended (deadline or cancellation) out of the queue.
+
+        Returns:
+            True if it had been granted a slot just before, False if it was removed.
+        """
+        with self._lock:
+            if waiter.granted:
+                return True
+            queue = self._queues[waiter.client]
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.client]
+            self.waiting -= 1
+            self.rejected["queue_timeout"] += 1
+            state = self._clients.get(waiter.client)
+            if state is not None:
+                state.rejected += 1
+            ADMISSION_REJECTED.labels(endpoint=endpoint, reason="queue_timeout").inc()
+            return False
+
+    def _release(self, processing_seconds):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self.processing_seconds += processing_seconds
+            if not self._queues:
+                return
+            # Round robin: the first client's oldest request, then that client goes last
+            client, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(client)
+            else:
+                del self._queues[client]
+            self.waiting -= 1
+            self.in_flight += 1
+            self.admitted += 1
+            waiter.granted = True
+        waiter.wake()
+
+    def _admitted(self, client, endpoint, start_time):
+        queue_seconds = time.perf_counter() - start_time
+        with self._lock:
+            state = self._clients.get(client)
+            if state is not None:
+                state.admitted += 1
+            self.queue_seconds += queue_seconds
+            self.max_queue_seconds = max(self.max_queue_seconds, queue_seconds)
+        ADMISSION_QUEUE_SECONDS.labels(endpoint=endpoint).observe(queue_seconds)
+        record_stage("admission_queue", queue_seconds)
+        return Admission(self, endpoint, queue_seconds)
+
+    def _queue_timeout(self):
+        return OverloadedError("Timed out waiting for a free slot, please retry shortly", "queue_timeout", self.retry_after)
+
+    def acquire(self, client, deadline, endpoint, cost=1):
+        """
+        Admits a request, waiting in the fair queue for a slot if needed.
+
+        Args:
+            client: The client key (see client_key).
+            deadline: The request's Deadline; the wait for a slot ends with it.
+            endpoint: The route, for the metrics.
+            cost: Tokens to take from the client's bucket (0 when already charged).
+
+        Returns:
+            The Admission holding the slot.
+
+        Raises:
+            ThrottledError: Over the client's rate or per-client queue (429).
+            OverloadedError: Queue full or deadline passed while waiting (503).
+        """
+        if not self.enabled:
+            return Admission(_Unlimited, endpoint, 0.0)
+        start_time = time.perf_counter()
+        if cost:
+            self.take_tokens(client, cost, endpoint)
+        granted = threading.Event()
+        waiter = self._enter(client, granted.set, endpoint)
+        if waiter is not None:
+            try:
+                granted.wait(deadline.remaining())
+            except BaseException:
+                if self._leave(waiter, endpoint):
+                    self._release(0.0)
+                raise
+            if not self._leave(waiter, endpoint):
+                raise self._queue_timeout()
+        return self._admitted(client, endpoint, start_time)
+
+    async def acquire_async(self, client, deadline, endpoint, cost=1):
+        """Async counterpart of acquire(), for the native routes of asgi.py."""
+        if not self.enabled:
+            return Admission(_Unlimited, endpoint, 0.0)
+        start_time = time.perf_counter()
+        if cost:
+            self.take_tokens(client, cost, endpoint)
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            # Called from whichever thread released the slot
+            loop.call_soon_threadsafe(_resolve, granted)
+
+        waiter = self._enter(client, wake, endpoint)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(granted, deadline.remaining())
+            except asyncio.TimeoutError:
+                pass
+            except BaseException:
+                # Cancelled (the client went away): give back a slot granted meanwhile
+                if self._leave(waiter, endpoint):
+                    self._release(0.0)
+                raise
+            if not self._leave(waiter, endpoint):
+                raise self._queue_timeout()
+        return self._admitted(client, endpoint, start_time)
+
+    def stats(self):
+        with self._lock:
+            admitted = self.admitted
+            heaviest = sorted(self._clients.items(), key=lambda item: -item[1].rejected)[:10]
+            return {
+                "enabled": self.enabled,
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "max_queue_per_client": self.max_queue_per_client,
+                "rate": self.rate,
+                "burst": self.burst,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "waiting_clients": len(self._queues),
+                "tracked_clients": len(self._clients),
+                "admitted": admitted,
+                "queued": self.queued,
+                "rejected": dict(self.rejected),
+                "avg_queue_wait_ms": round(self.queue_seconds / admitted * 1000, 1) if admitted else 0.0,
+                "max_queue_wait_ms": round(self.max_queue_seconds * 1000, 1),
+                "avg_processing_ms": round(self.processing_seconds / self.completed * 1000, 1) if self.completed else 0.0,
+                "most_rejected_clients": [
+                    {"client": client, "admitted": state.admitted, "rejected": state.rejected}
+                    for client, state in heaviest if state.rejected
+                ],
+            }
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _UnlimitedController:
+    """Stands in for the controller behind the Admission of a disabled controller."""
+
+    def _release(self, processing_seconds):
+        pass
+
+
+_Unlimited = _UnlimitedController()
@@ -0,0 +1,70 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Runs the questions of a /api/chat/batch request concurrently. Each question
+# goes through the same cache -> direct -> agent path as /api/chat; at most
+# `max_concurrency` of them are in progress at once, so a batch of 50 takes
+# roughly the time of its slowest few questions instead of their sum.
+
+def run_batch(messages, answer, max_concurrency):
+    """
+    Answers messages with bounded parallelism.
+
+    Args:
+        messages: The questions of the batch.
+        answer: Function (index, message) -> result dictionary; it must not raise.
+        max_concurrency: Questions answered at once.
+
+    Yields:
+        Result dictionaries in completion order.
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(messages))), thread_name_prefix="batch")
+    try:
+        futures = [executor.submit(answer, index, message) for index, message in enumerate(messages)]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Drop questions not started yet if the client went away mid-batch
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def timed(answer):
+    """
+    Wraps an answer function so its result records latency_ms, index and message.
+
+    Args:
+        answer: Function (index, message) -> result dictionary.
+    """
+    def run(index, message):
+        start_time = time.perf_counter()
+        result = answer(index, message)
+        result['index'] = index
+        result['message'] = message
+        result['latency_ms'] = round((time.perf_counter() - start_time) * 1000, 1)
+        return result
+    return run
+
+def batch_summary(results, wall_time, max_concurrency):
+    """
+    Summarizes a finished batch.
+
+    Args:
+        results: The result dictionaries of every question.
+        wall_time: Seconds from the first question started to the last answered.
+        max_concurrency: Questions answered at once.
+
+    Returns:
+        Counts, wall-clock time and summed per-question latency (in ms). Their
+        ratio is the speedup over asking the questions one after another.
+    """
+    summed = sum(result['latency_ms'] for result in results)
+    wall_time_ms = round(wall_time * 1000, 1)
+    succeeded = sum(1 for result in results if result.get('success'))
+    return {
+        "count": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "max_concurrency": max_concurrency,
+        "wall_time_ms": wall_time_ms,
+        "summed_latency_ms": round(summed, 1),
+        "speedup": round(summed / wall_time_ms, 2) if wall_time_ms else 0.0,
+    }
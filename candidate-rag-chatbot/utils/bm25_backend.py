@@ -0,0 +1,192 @@
+import re
+import time
+import threading
+import unicodedata
+
+import numpy as np
+
+# Import configuration
+from config import CANDIDATE_COLLECTION, BM25_SOURCE_FILE, BM25_TOP_K
+from utils.data_version import get_data_version
+from utils.ingestion import iter_submissions, iter_candidates
+from utils.query_router import DirectQueryResponse, DirectSource, format_candidate
+
+# Offline retrieval backend for run_query: BM25 over the candidates in the
+# source file, with no Weaviate or OpenAI calls. It answers with the top
+# matching profiles instead of a generated answer, which is enough to load
+# test and run CI against the API, caching and formatting layers.
+
+# BM25 parameters (the usual defaults)
+K1 = 1.2
+B = 0.75
+
+# Searchable fields and how much a term occurrence in each counts
+FIELD_WEIGHTS = {
+    "skills": 2.0,
+    "roles": 1.5,
+    "companies": 1.0,
+    "subjects": 1.0,
+    "location": 1.0,
+}
+
+STOPWORDS = frozenset("a an and or the of in at on for to with from by is are".split())
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[+#]+|\.[a-z0-9]+)*")
+
+def tokenize(text):
+    """Lowercases, strips accents and splits text into terms ("c++", "node.js" stay whole)."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return [token for token in _TOKEN.findall(folded) if token not in STOPWORDS]
+
+def candidate_fields(properties):
+    """Returns the searchable text of a candidate, per field."""
+    experiences = properties.get("work_experiences", [])
+    degrees = properties.get("education_degrees", [])
+    return {
+        "skills": properties.get("skills_text", ""),
+        "roles": " ".join(experience.get("roleName") or "" for experience in experiences),
+        "companies": " ".join(experience.get("company") or "" for experience in experiences),
+        "subjects": " ".join(degree.get("subject") or "" for degree in degrees),
+        "location": properties.get("location", ""),
+    }
+
+
+class BM25Index:
+    """
+    Inverted index with precomputed BM25 term weights.
+
+    Each posting list stores the document numbers containing a term and the
+    term's BM25 contribution to each of them, so scoring a query is one
+    vectorized add per query term.
+    """
+
+    def __init__(self, candidates):
+        self.ids = []
+        self.properties = []
+        term_frequencies = []
+        for object_id, properties in candidates:
+            frequencies = {}
+            for field, text in candidate_fields(properties).items():
+                weight = FIELD_WEIGHTS[field]
+                for token in tokenize(text):
+                    frequencies[token] = frequencies.get(token, 0.0) + weight
+            self.ids.append(object_id)
+            self.properties.append(properties)
+            term_frequencies.append(frequencies)
+
+        self.size = len(self.ids)
+        lengths = np.array([sum(frequencies.values()) for frequencies in term_frequencies], dtype=np.float32)
+        average_length = lengths.mean() if self.size else 1.0
+        norms = K1 * (1 - B + B * lengths / average_length)
+
+        documents = {}
+        for document, frequencies in enumerate(term_frequencies):
+            for term, frequency in frequencies.items():
+                documents.setdefault(term, []).append((document, frequency))
+
+        self.postings = {}
+        for term, entries in documents.items():
+            rows = np.array([document for document, _ in entries], dtype=np.int32)
+            frequency = np.array([frequency for _, frequency in entries], dtype=np.float32)
+            idf = np.log(1 + (self.size - len(entries) + 0.5) / (len(entries) + 0.5))
+            self.postings[term] = (rows, (idf * frequency * (K1 + 1) / (frequency + norms[rows])).astype(np.float32))
+
+    def search(self, query, k):
+        """
+        Scores every candidate against a query.
+
+        Args:
+            query: Free-text query.
+            k: Number of results.
+
+        Returns:
+            A list of (row, score) for the best k candidates with a positive
+            score, best first.
+        """
+        scores = np.zeros(self.size, dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+                matched = True
+        if not matched:
+            return []
+
+        k = min(k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(row), float(scores[row])) for row in top if scores[row] > 0]
+
+    def stats(self):
+        return {
+            "candidates": self.size,
+            "terms": len(self.postings),
+            "postings": int(sum(len(rows) for rows, _ in self.postings.values())),
+        }
+
+
+# Process-wide index, rebuilt when the Candidates data version changes
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+def get_bm25_index():
+    """
+    Returns the process-wide BM25 index over BM25_SOURCE_FILE, building it on first use.
+
+    Returns:
+        A BM25Index.
+    """
+    global _index, _index_version
+
+    version = get_data_version()
+    if _index is not None and _index_version == version:
+        return _index
+
+    with _lock:
+        if _index is None or _index_version != version:
+            start_time = time.perf_counter()
+            _index = BM25Index(iter_candidates(iter_submissions(BM25_SOURCE_FILE)))
+            _index_version = version
+            print(f"Built BM25 index: {_index.size} candidates in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return _index
+
+def run_bm25_query(query, context=None, k=BM25_TOP_K):
+    """
+    Answers a query with the best BM25 matches, in the shape of a QueryAgent response.
+
+    Args:
+        query: The natural language query string.
+        context: Ignored; every query is answered on its own.
+        k: Number of candidates to return.
+
+    Returns:
+        A DirectQueryResponse.
+    """
+    start_time = time.perf_counter()
+    index = get_bm25_index()
+    results = index.search(query, k)
+
+    if not results:
+        return DirectQueryResponse(
+            query,
+            "I couldn't find any candidates whose skills, roles, companies, education or location match your query.",
+            [], [], [], time.perf_counter() - start_time,
+            is_partial_answer=True,
+            missing_information=["No candidate matched any term of the query"],
+        )
+
+    paragraphs = [f"Here are the {len(results)} best matching candidates:"]
+    searches = []
+    sources = []
+    for position, (row, score) in enumerate(results, start=1):
+        properties = index.properties[row]
+        paragraphs.append(f"{format_candidate(position, properties)}\nScore: {score:.2f}")
+        searches.append({"object_id": index.ids[row], "score": score})
+        sources.append(DirectSource(index.ids[row], CANDIDATE_COLLECTION))
+
+    return DirectQueryResponse(
+        query, "\n\n".join(paragraphs), [searches], [], sources, time.perf_counter() - start_time
+    )
@@ -0,0 +1,166 @@
+import os
+import json
+import mmap
+import struct
+
+import numpy as np
+
+# Binary container for precompiled candidate data (see CandidateIndex.save).
+#
+# Layout:
+#   8 bytes   magic
+#   8 bytes   header length (little-endian uint64)
+#   header    UTF-8 JSON: format version, metadata and a section table
+#             {name: {"dtype", "shape", "offset"}}
+#   sections  raw little-endian arrays, each aligned to 64 bytes
+#
+# Fixed-width columns are stored as-is. A string table is two sections,
+# "<name>.offsets" (int64, n + 1) and "<name>.data" (UTF-8 bytes). A list
+# column is "<name>.offsets" (int64, rows + 1) and "<name>.values". The
+# index's derived structures are stored the same way (a 2-D "skill_bitmaps"
+# and "<posting>.offsets"/"<posting>.rows" per posting list). Readers
+# memory-map the file read-only and view sections in place, so loading costs
+# no parsing and every worker shares the same pages.
+
+MAGIC = b"CANDART\x01"
+FORMAT_VERSION = 1
+_ALIGNMENT = 64
+_PREFIX = struct.Struct("<8sQ")
+
+def _aligned(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+def encode_strings(values):
+    """
+    Packs strings into a string table.
+
+    Returns:
+        (offsets, data) arrays; string i is data[offsets[i]:offsets[i + 1]].
+    """
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+def encode_lists(lists, dtype=np.int32):
+    """
+    Packs variable-length lists of integers.
+
+    Returns:
+        (offsets, values) arrays; list i is values[offsets[i]:offsets[i + 1]].
+    """
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(values) for values in lists], out=offsets[1:])
+    values = np.fromiter((value for values in lists for value in values), dtype=dtype, count=int(offsets[-1]))
+    return offsets, values
+
+def source_fingerprint(path):
+    """Returns size and modification time of a source file, to detect stale artifacts."""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def write_artifact(path, sections, metadata):
+    """
+    Writes an artifact atomically.
+
+    The file is written next to `path` and renamed over it, so processes that
+    still map the previous version keep reading it undisturbed.
+
+    Args:
+        path: Destination file.
+        sections: Dictionary of name -> NumPy array.
+        metadata: JSON-serializable dictionary stored in the header.
+
+    Returns:
+        The size of the written file in bytes.
+    """
+    table = {}
+    offset = 0
+    for name, array in sections.items():
+        array = np.ascontiguousarray(array)
+        sections[name] = array
+        table[name] = {"dtype": array.dtype.newbyteorder("<").str, "shape": list(array.shape), "offset": offset}
+        offset = _aligned(offset + array.nbytes)
+
+    header = json.dumps({
+        "format_version": FORMAT_VERSION,
+        "metadata": metadata,
+        "sections": table,
+    }).encode("utf-8")
+    data_start = _aligned(_PREFIX.size + len(header))
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, len(header)))
+        f.write(header)
+        for name, array in sections.items():
+            f.seek(data_start + table[name]["offset"])
+            f.write(array.astype(table[name]["dtype"], copy=False).tobytes())
+        size = f.tell()
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+    return size
+
+
+class Artifact:
+    """
+    Read-only, memory-mapped view of an artifact file.
+
+    Args:
+        path: File written by write_artifact().
+
+    Raises:
+        ValueError: If the file is not an artifact of a supported version.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, header_length = _PREFIX.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a candidate artifact")
+        header = json.loads(self._mmap[_PREFIX.size:_PREFIX.size + header_length])
+        if header["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {header['format_version']}, expected {FORMAT_VERSION}")
+
+        self.metadata = header["metadata"]
+        data_start = _aligned(_PREFIX.size + header_length)
+        self._sections = {}
+        for name, entry in header["sections"].items():
+            count = int(np.prod(entry["shape"]))
+            self._sections[name] = np.frombuffer(
+                self._mmap, dtype=np.dtype(entry["dtype"]), count=count, offset=data_start + entry["offset"]
+            ).reshape(entry["shape"])
+        self._string_tables = {}
+
+    def __contains__(self, name):
+        return name in self._sections
+
+    def array(self, name):
+        """Returns a section as a read-only array backed by the mapped file."""
+        return self._sections[name]
+
+    def string(self, table, index):
+        offsets = self._sections[f"{table}.offsets"]
+        return self._sections[f"{table}.data"][offsets[index]:offsets[index + 1]].tobytes().decode("utf-8")
+
+    def strings(self, table):
+        """Decodes a whole string table (cached)."""
+        values = self._string_tables.get(table)
+        if values is None:
+            data = self._sections[f"{table}.data"].tobytes()
+            offsets = self._sections[f"{table}.offsets"].tolist()
+            values = [data[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+            self._string_tables[table] = values
+        return values
+
+    def list_values(self, name, row):
+        """Returns list `row` of a list column as a view."""
+        offsets = self._sections[f"{name}.offsets"]
+        return self._sections[f"{name}.values"][offsets[row]:offsets[row + 1]]
+
+    def size_bytes(self):
+        return len(self._mmap)
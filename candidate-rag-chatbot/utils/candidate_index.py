@@ -0,0 +1,579 @@
+import os
+import re
+import time
+import threading
+import unicodedata
+from datetime import datetime
+from collections import namedtuple
+
+import numpy as np
+
+# Import configuration
+from config import LOCAL_INDEX_ENABLED, LOCAL_INDEX_SOURCE, CANDIDATE_ARTIFACT_PATH
+from utils.data_version import get_data_version
+from utils.ingestion import iter_submissions, iter_candidates
+from utils.candidate_artifact import Artifact, encode_lists, encode_strings, write_artifact, source_fingerprint
+
+# Columnar, in-process index over the candidates in the source file, for
+# filters that should never need a round trip to Weaviate. Scalar attributes
+# are NumPy columns; skills are bitmaps (one boolean row per skill) and
+# companies and roles posting lists (row numbers grouped by code, in the
+# offsets/values layout of list columns), since they have far more distinct
+# values.
+
+# Degree levels and availability options, as bit positions
+DEGREE_LEVELS = [
+    "High School Diploma",
+    "Associate's Degree",
+    "Bachelor's Degree",
+    "Master's Degree",
+    "Doctorate",
+    "Juris Doctor (J.D)",
+]
+AVAILABILITY_OPTIONS = ["full-time", "part-time"]
+
+# Stand-ins for missing values in integer columns
+MISSING = -1
+
+# Columns results can be ordered by
+SORTABLE_COLUMNS = ("salary_expectation", "submitted_at")
+
+# Properties kept per row for displaying results
+DISPLAY_PROPERTIES = [
+    "name", "email", "location", "current_role", "current_company",
+    "skills", "education_highest_level", "salary_expectation",
+]
+
+# Fixed-width columns (in encoded row order) and their dtypes
+COLUMNS = [
+    ("salary_expectation", np.int64),
+    ("submitted_at", np.int64),
+    ("is_top_school", np.uint8),
+    ("degree_bits", np.uint8),
+    ("availability_bits", np.uint8),
+    ("location", np.int32),
+]
+_COLUMN_ATTRIBUTES = {
+    "salary_expectation": "salary",
+    "submitted_at": "submitted_at",
+    "is_top_school": "top_school",
+    "degree_bits": "degree_bits",
+    "availability_bits": "availability_bits",
+    "location": "location",
+}
+
+# Variable-length columns of interned codes
+LIST_COLUMNS = ["skills", "companies", "roles", "schools"]
+
+STRING_TABLES = ("location", "skill", "company", "role", "school")
+
+# Posting lists derived from list columns: attribute -> (list column, string table)
+POSTINGS = {"company_postings": ("companies", "company"), "role_postings": ("roles", "role")}
+
+# Artifact sections holding the structures derived from the list columns
+_DERIVED_SECTIONS = ["skill_bitmaps"] + [f"{name}.{part}" for name in POSTINGS for part in ("offsets", "rows")]
+
+# Display properties stored as codes into the artifact's "text" string table
+TEXT_PROPERTIES = ["name", "email", "current_role", "current_company", "education_highest_level"]
+
+SearchResult = namedtuple("SearchResult", "ids rows total")
+
+_TOKEN = re.compile(r"\w+")
+
+def _tokens(text):
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return frozenset(_TOKEN.findall("".join(c for c in decomposed if not unicodedata.combining(c))))
+
+def _bits(values, options):
+    mask = 0
+    for value in values or []:
+        if value in options:
+            mask |= 1 << options.index(value)
+    return mask
+
+def _timestamp(value):
+    if not value:
+        return MISSING
+    return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+
+
+class _Interner:
+    """Maps strings to dense integer codes. Codes are stable across rebuilds."""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    @classmethod
+    def from_values(cls, values):
+        interner = cls()
+        interner.values = list(values)
+        interner.codes = {value: code for code, value in enumerate(interner.values)}
+        return interner
+
+    def copy(self):
+        copied = _Interner()
+        copied.codes = dict(self.codes)
+        copied.values = list(self.values)
+        return copied
+
+
+class _ArtifactRows:
+    """Display properties of an artifact-backed index, decoded per row on access."""
+
+    def __init__(self, artifact, index):
+        self.artifact = artifact
+        self.index = index
+
+    def __len__(self):
+        return self.index.size
+
+    def __getitem__(self, row):
+        artifact = self.artifact
+        properties = {}
+        for key in TEXT_PROPERTIES:
+            code = int(artifact.array(key)[row])
+            if code != MISSING:
+                properties[key] = artifact.string("text", code)
+        location = self.index.strings["location"].values[self.index.location[row]]
+        if location:
+            properties["location"] = location
+        skills = self.index.strings["skill"].values
+        properties["skills"] = [skills[code] for code in artifact.list_values("skills", row)]
+        if self.index.salary[row] != MISSING:
+            properties["salary_expectation"] = int(self.index.salary[row])
+        return properties
+
+
+class CandidateIndex:
+    """
+    Read-only columnar index over candidate properties.
+
+    Build it with build() or from_file(), or map a precompiled artifact with
+    load(); instances are never modified, a refresh builds a new one (see
+    get_candidate_index()).
+
+    Args:
+        ids: Candidate UUIDs, one per row.
+        hashes: Content hashes, one per row.
+        columns: Dictionary of the fixed-width columns in COLUMNS.
+        lists: Dictionary of list column name -> (offsets, values) for
+            "skills", "companies", "roles" and "schools".
+        strings: Dictionary of interners for "location", "skill", "company", "role" and "school".
+        display: Sequence of display property dictionaries, one per row.
+        encoded: Optional (uuid, content hash) -> encoded row map, for reuse by build().
+        derived: Optional dictionary of the precomputed "skill_bitmaps" and the
+            "<posting>.offsets"/"<posting>.rows" of POSTINGS, as saved in an
+            artifact; whatever is missing is computed from the list columns.
+    """
+
+    def __init__(self, ids, hashes, columns, lists, strings, display, encoded=None, derived=None):
+        self.ids = ids
+        self.hashes = hashes
+        self.strings = strings
+        self.display = display
+        self.lists = lists
+        self._encoded = encoded or {}
+        self.size = len(ids)
+
+        self.salary = columns["salary_expectation"]
+        self.submitted_at = columns["submitted_at"]
+        self.top_school = columns["is_top_school"].view(bool)
+        self.degree_bits = columns["degree_bits"]
+        self.availability_bits = columns["availability_bits"]
+        self.location = columns["location"]
+
+        derived = derived or {}
+
+        # Skill bitmaps: skill code x row
+        self.skill_bitmaps = derived.get("skill_bitmaps")
+        if self.skill_bitmaps is None:
+            self.skill_bitmaps = np.zeros((len(strings["skill"].values), self.size), dtype=bool)
+            offsets, values = lists["skills"]
+            self.skill_bitmaps[values, self._list_rows(offsets)] = True
+
+        for name, (column, table) in POSTINGS.items():
+            if f"{name}.offsets" in derived:
+                postings = (derived[f"{name}.offsets"], derived[f"{name}.rows"])
+            else:
+                postings = self._postings(*lists[column], len(strings[table].values))
+            setattr(self, name, postings)
+
+        self._location_tokens = [_tokens(value) for value in strings["location"].values]
+        self._location_matches = {}
+
+    def _list_rows(self, offsets):
+        # Row number of every entry of a list column
+        return np.repeat(np.arange(self.size, dtype=np.int32), np.diff(offsets))
+
+    def _postings(self, offsets, values, codes):
+        # (offsets, rows): the rows holding code c are rows[offsets[c]:offsets[c + 1]], ascending
+        order = np.argsort(values, kind="stable")
+        rows = self._list_rows(offsets)[order].astype(np.int32)
+        posting_offsets = np.zeros(codes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(values, minlength=codes), out=posting_offsets[1:])
+        return posting_offsets, rows
+
+    @classmethod
+    def build(cls, records, previous=None):
+        """
+        Builds an index from raw form submissions.
+
+        Records are validated, transformed and de-duplicated exactly like
+        ingestion does, so rows correspond one-to-one to Weaviate objects.
+
+        Args:
+            records: Iterable of raw submission dictionaries.
+            previous: An earlier index; rows whose content hash is unchanged
+                are reused instead of re-encoded.
+
+        Returns:
+            A CandidateIndex.
+        """
+        # Copied, so the previous index stays consistent while requests still use it
+        if previous:
+            strings = {name: interner.copy() for name, interner in previous.strings.items()}
+        else:
+            strings = {name: _Interner() for name in STRING_TABLES}
+        reused = previous._encoded if previous else {}
+
+        ids = []
+        hashes = []
+        rows = []
+        for object_id, properties in iter_candidates(records):
+            digest = properties["content_hash"]
+            encoded = reused.get((object_id, digest))
+            if encoded is None:
+                encoded = cls._encode(properties, strings)
+            ids.append(object_id)
+            hashes.append(digest)
+            rows.append(encoded)
+
+        count = len(rows)
+        columns = {
+            name: np.fromiter((row[position] for row in rows), dtype=dtype, count=count)
+            for position, (name, dtype) in enumerate(COLUMNS)
+        }
+        lists = {
+            name: encode_lists([row[position] for row in rows])
+            for position, name in enumerate(LIST_COLUMNS, start=len(COLUMNS))
+        }
+        return cls(
+            np.array(ids, dtype=object),
+            hashes,
+            columns,
+            lists,
+            strings,
+            [row[-1] for row in rows],
+            {(object_id, digest): row for object_id, digest, row in zip(ids, hashes, rows)},
+        )
+
+    @classmethod
+    def from_file(cls, path, previous=None):
+        """Builds an index from a form-submissions.json file (see build())."""
+        return cls.build(iter_submissions(path), previous)
+
+    @staticmethod
+    def _encode(properties, strings):
+        # Same order as COLUMNS and LIST_COLUMNS, then the display properties
+        companies = {experience.get("company") for experience in properties.get("work_experiences", [])}
+        roles = {experience.get("roleName") for experience in properties.get("work_experiences", [])}
+        schools = {degree.get("originalSchool") or degree.get("school") for degree in properties.get("education_degrees", [])}
+        salary = properties.get("salary_expectation")
+        return (
+            salary if salary is not None else MISSING,
+            _timestamp(properties.get("submitted_at")),
+            bool(properties.get("is_top_school")),
+            _bits(properties.get("education_levels"), DEGREE_LEVELS),
+            _bits(properties.get("work_availability"), AVAILABILITY_OPTIONS),
+            strings["location"].code(properties.get("location", "")),
+            tuple(dict.fromkeys(strings["skill"].code(skill) for skill in properties.get("skills", []))),
+            tuple(sorted(strings["company"].code(company) for company in companies if company)),
+            tuple(sorted(strings["role"].code(role) for role in roles if role)),
+            tuple(sorted(strings["school"].code(school) for school in schools if school)),
+            {key: properties[key] for key in DISPLAY_PROPERTIES if properties.get(key) not in (None, "")} | {"skills": properties.get("skills", [])},
+        )
+
+    def save(self, path, source_path=None):
+        """
+        Writes the index as a memory-mappable artifact (see load()).
+
+        Args:
+            path: Destination file; replaced atomically.
+            source_path: The submissions file the index was built from,
+                recorded so stale artifacts can be detected.
+
+        Returns:
+            The size of the artifact in bytes.
+        """
+        text = _Interner()
+        sections = {
+            "ids": np.array(self.ids.tolist() if hasattr(self.ids, "tolist") else self.ids, dtype="S36"),
+            "content_hash": np.array(list(self.hashes), dtype="S64"),
+        }
+        for name, _ in COLUMNS:
+            sections[name] = getattr(self, _COLUMN_ATTRIBUTES[name])
+        for key in TEXT_PROPERTIES:
+            sections[key] = np.fromiter(
+                (text.code(self.display[row][key]) if self.display[row].get(key) else MISSING for row in range(self.size)),
+                dtype=np.int32,
+                count=self.size,
+            )
+        for name, (offsets, values) in self.lists.items():
+            sections[f"{name}.offsets"] = offsets
+            sections[f"{name}.values"] = values
+        for name, interner in list(self.strings.items()) + [("text", text)]:
+            sections[f"{name}.offsets"], sections[f"{name}.data"] = encode_strings(interner.values)
+        # Derived structures too, so workers map them instead of rebuilding them
+        sections["skill_bitmaps"] = self.skill_bitmaps
+        for name in POSTINGS:
+            sections[f"{name}.offsets"], sections[f"{name}.rows"] = getattr(self, name)
+
+        metadata = {"candidates": self.size}
+        if source_path:
+            metadata["source"] = {"path": os.path.abspath(source_path), **source_fingerprint(source_path)}
+        return write_artifact(path, sections, metadata)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Maps an artifact written by save(). Columns are views of the mapped
+        file, so loading takes milliseconds and the pages are shared by every
+        process that maps the same file. The skill bitmaps and posting lists
+        are mapped as well; they are only rebuilt for artifacts that predate
+        them.
+
+        Args:
+            path: The artifact file.
+
+        Returns:
+            A CandidateIndex whose `artifact` attribute is the mapped Artifact.
+        """
+        artifact = Artifact(path)
+        strings = {name: _Interner.from_values(artifact.strings(name)) for name in STRING_TABLES}
+        index = cls(
+            artifact.array("ids").astype(str),
+            artifact.array("content_hash"),
+            {name: artifact.array(name) for name, _ in COLUMNS},
+            {name: (artifact.array(f"{name}.offsets"), artifact.array(f"{name}.values")) for name in LIST_COLUMNS},
+            strings,
+            None,
+            derived={name: artifact.array(name) for name in _DERIVED_SECTIONS if name in artifact},
+        )
+        index.display = _ArtifactRows(artifact, index)
+        index.artifact = artifact
+        return index
+
+    def _location_codes(self, value):
+        # Same semantics as a Weaviate equal filter on word-tokenized text:
+        # every token of the value must appear in the stored location
+        codes = self._location_matches.get(value)
+        if codes is None:
+            wanted = _tokens(value)
+            codes = np.array(
+                [code for code, tokens in enumerate(self._location_tokens) if wanted and wanted <= tokens],
+                dtype=np.int32,
+            )
+            self._location_matches[value] = codes
+        return codes
+
+    def _posting_mask(self, postings, interner, values):
+        offsets, rows = postings
+        mask = np.zeros(self.size, dtype=bool)
+        for value in values:
+            code = interner.codes.get(value)
+            if code is not None and code < len(offsets) - 1:
+                mask[rows[offsets[code]:offsets[code + 1]]] = True
+        return mask
+
+    def mask(self, levels=None, skills_all=None, skills_any=None, locations=None, availability=None,
+             companies=None, roles=None, salary_min=None, salary_max=None, top_school=None):
+        """
+        Evaluates a conjunction of predicates. Omitted predicates match everything.
+
+        Args:
+            levels: Degree levels; matches candidates holding any of them.
+            skills_all: Skills the candidate must all have.
+            skills_any: Skills of which the candidate must have at least one.
+            locations: Location values; matches any of them (token containment).
+            availability: Availability options; matches any of them.
+            companies: Companies the candidate worked at; matches any of them.
+            roles: Role names the candidate held; matches any of them.
+            salary_min: Minimum salary expectation (inclusive).
+            salary_max: Maximum salary expectation (inclusive).
+            top_school: Whether the candidate attended a top-ranked school.
+
+        Returns:
+            A boolean NumPy array with one entry per row.
+        """
+        mask = np.ones(self.size, dtype=bool)
+
+        if levels:
+            mask &= (self.degree_bits & _bits(levels, DEGREE_LEVELS)) != 0
+        if availability:
+            mask &= (self.availability_bits & _bits(availability, AVAILABILITY_OPTIONS)) != 0
+        if top_school is not None:
+            mask &= self.top_school == bool(top_school)
+        if salary_min is not None:
+            mask &= (self.salary >= salary_min) & (self.salary != MISSING)
+        if salary_max is not None:
+            mask &= (self.salary <= salary_max) & (self.salary != MISSING)
+
+        skill_codes = self.strings["skill"].codes
+        for skill in skills_all or []:
+            code = skill_codes.get(skill)
+            if code is None:
+                return np.zeros(self.size, dtype=bool)
+            mask &= self.skill_bitmaps[code]
+        if skills_any:
+            codes = [skill_codes[skill] for skill in skills_any if skill in skill_codes]
+            mask &= self.skill_bitmaps[codes].any(axis=0) if codes else False
+
+        if locations:
+            codes = np.concatenate([self._location_codes(value) for value in locations])
+            mask &= np.isin(self.location, codes)
+        if companies:
+            mask &= self._posting_mask(self.company_postings, self.strings["company"], companies)
+        if roles:
+            mask &= self._posting_mask(self.role_postings, self.strings["role"], roles)
+
+        return mask
+
+    def search(self, sort_by="submitted_at", ascending=False, limit=None, **predicates):
+        """
+        Filters and ranks candidates.
+
+        Args:
+            sort_by: "salary_expectation" or "submitted_at". Rows missing the
+                value sort last either way.
+            ascending: Sort direction.
+            limit: Maximum number of rows to return (None for all).
+            **predicates: Keyword arguments of mask().
+
+        Returns:
+            A SearchResult with the ranked candidate UUIDs, their row numbers
+            and the total number of matches.
+        """
+        if sort_by not in SORTABLE_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort_by}")
+
+        rows = np.flatnonzero(self.mask(**predicates))
+        total = len(rows)
+
+        values = (self.salary if sort_by == "salary_expectation" else self.submitted_at)[rows]
+        keys = values if ascending else -values
+        # Primary key (last) puts missing values at the end; ties keep source order
+        order = np.lexsort((keys, values == MISSING))
+        if limit is not None:
+            order = order[:limit]
+        rows = rows[order]
+        return SearchResult(self.ids[rows].tolist(), rows, total)
+
+    def count(self, **predicates):
+        """Returns the number of candidates matching the predicates of mask()."""
+        return int(np.count_nonzero(self.mask(**predicates)))
+
+    def properties(self, row):
+        """Returns the display properties of a row."""
+        return self.display[row]
+
+    def skills(self):
+        return list(self.strings["skill"].values)
+
+    def locations(self):
+        return [value for value in self.strings["location"].values if value]
+
+    def stats(self):
+        return {
+            "candidates": self.size,
+            "skills": len(self.strings["skill"].values),
+            "locations": len(self.strings["location"].values),
+            "companies": int(np.count_nonzero(np.diff(self.company_postings[0]))),
+            "roles": int(np.count_nonzero(np.diff(self.role_postings[0]))),
+            "artifact": getattr(getattr(self, "artifact", None), "path", None),
+            "memory_bytes": int(
+                self.salary.nbytes + self.submitted_at.nbytes + self.top_school.nbytes
+                + self.degree_bits.nbytes + self.availability_bits.nbytes + self.location.nbytes
+                + self.skill_bitmaps.nbytes
+                + sum(array.nbytes for array in self.company_postings + self.role_postings)
+            ),
+        }
+
+
+# Process-wide index, rebuilt when the Candidates data version changes
+_lock = threading.Lock()
+_index = None
+_index_version = None
+_build_seconds = 0.0
+
+def _load_artifact():
+    """
+    Maps the precompiled artifact if it exists and was built from the current source file.
+
+    Returns:
+        A CandidateIndex, or None to build from the source file instead.
+    """
+    if not CANDIDATE_ARTIFACT_PATH or not os.path.exists(CANDIDATE_ARTIFACT_PATH):
+        return None
+    try:
+        index = CandidateIndex.load(CANDIDATE_ARTIFACT_PATH)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Note: Ignoring unreadable candidate artifact {CANDIDATE_ARTIFACT_PATH}: {e}")
+        return None
+
+    source = index.artifact.metadata.get("source")
+    if source and os.path.exists(LOCAL_INDEX_SOURCE):
+        current = source_fingerprint(LOCAL_INDEX_SOURCE)
+        if (current["size"], current["mtime_ns"]) != (source["size"], source["mtime_ns"]):
+            print(f"Note: {CANDIDATE_ARTIFACT_PATH} is older than {LOCAL_INDEX_SOURCE}; rebuild it with build_artifact.py")
+            return None
+    return index
+
+def get_candidate_index():
+    """
+    Returns the process-wide candidate index, building or refreshing it as needed.
+
+    The precompiled artifact at CANDIDATE_ARTIFACT_PATH is mapped when it is
+    up to date with LOCAL_INDEX_SOURCE (or the source isn't deployed);
+    otherwise the index is built from the source file. It is reloaded when
+    ingestion bumps the data version, reusing the encoded rows of unchanged
+    candidates.
+
+    Returns:
+        A CandidateIndex, or None if the local index is disabled or the
+        source file can't be read.
+    """
+    global _index, _index_version, _build_seconds
+
+    if not LOCAL_INDEX_ENABLED:
+        return None
+
+    version = get_data_version()
+    if _index is not None and _index_version == version:
+        return _index
+
+    with _lock:
+        if _index is None or _index_version != version:
+            start_time = time.perf_counter()
+            try:
+                _index = _load_artifact() or CandidateIndex.from_file(LOCAL_INDEX_SOURCE, previous=_index)
+                _build_seconds = time.perf_counter() - start_time
+                print(f"Loaded local candidate index: {_index.size} candidates in {_build_seconds * 1000:.1f} ms")
+            except (OSError, ValueError) as e:
+                print(f"Note: Local candidate index unavailable: {e}")
+            # Don't retry a failed build until the data changes again
+            _index_version = version
+    return _index
+
+def candidate_index_stats():
+    """Returns size and build time of the process-wide index, or None if it isn't built."""
+    if _index is None:
+        return None
+    return {**_index.stats(), "build_seconds": round(_build_seconds, 4), "data_version": _index_version}
@@ -0,0 +1,366 @@
+import copy
+import json
+
+from utils.response_formatter import format_chatbot_response, enhance_candidate_response, candidate_cards, StreamingEnhancer
+from utils.response_cache import create_response_cache, make_cache_key
+from utils.coalescing import SingleFlight, CoalescingStats
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.admission import AdmissionController
+from utils.slow_query_log import trace_question, trace_answer, trace_error
+from utils.context_budget import ContextStats
+from utils.conversation_store import create_conversation_store, compact_response, to_context
+from utils.query_router import QueryRouter, RouteStats
+from utils.candidate_index import get_candidate_index
+from utils.metrics import FORMAT_RESPONSE, ENHANCE_RESPONSE, ROUTE_QUERY, RESPONSES, CACHE_LOOKUPS, RESULT_COUNT
+from config import (
+    CANDIDATE_COLLECTION,
+    QUERY_ROUTER_ENABLED,
+    COALESCING_ENABLED,
+    CIRCUIT_BREAKER_ENABLED,
+    CIRCUIT_WINDOW,
+    CIRCUIT_MIN_CALLS,
+    CIRCUIT_ERROR_RATE,
+    CIRCUIT_SLOW_CALL_SECONDS,
+    CIRCUIT_SLOW_CALL_RATE,
+    CIRCUIT_OPEN_SECONDS,
+    DEGRADED_LOCAL_SEARCH,
+    ADMISSION_ENABLED,
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_MAX_QUEUE_PER_CLIENT,
+    ADMISSION_RATE,
+    ADMISSION_BURST,
+    ADMISSION_MAX_CLIENTS,
+    ADMISSION_RETRY_AFTER,
+)
+
+# Shared by the Flask app (app.py) and the async server (asgi.py). Everything
+# here is independent of the web framework and of how the agent is called.
+
+# Compact per-conversation state for follow-up questions
+conversation_store = create_conversation_store()
+
+# Payload saved by compacting follow-up context
+context_stats = ContextStats()
+
+# Cache of agent responses for repeated questions (None when disabled)
+response_cache = create_response_cache()
+
+# Direct answers for structured questions (None when disabled)
+def _candidate_collection():
+    # Imported on first use: weaviate takes most of a second to import (see warmup.py)
+    from utils.weaviate_client import get_weaviate_client
+    return get_weaviate_client().collections.get(CANDIDATE_COLLECTION)
+
+query_router = QueryRouter(_candidate_collection, get_candidate_index) if QUERY_ROUTER_ENABLED else None
+
+# Which path answered each request: "cache", "direct", "agent", "coalesced" or "degraded"
+route_stats = RouteStats()
+
+# Identical concurrent agent questions share one upstream call. The Flask app
+# uses agent_flights; asgi.py has its own event-loop coalescer recording into
+# the same stats.
+coalescing_stats = CoalescingStats()
+agent_flights = SingleFlight(coalescing_stats, enabled=COALESCING_ENABLED)
+
+# Fails agent calls fast while the upstream cluster is erroring or slow (shared by app.py and asgi.py)
+agent_breaker = CircuitBreaker(
+    CIRCUIT_WINDOW,
+    CIRCUIT_MIN_CALLS,
+    CIRCUIT_ERROR_RATE,
+    CIRCUIT_SLOW_CALL_SECONDS,
+    CIRCUIT_SLOW_CALL_RATE,
+    CIRCUIT_OPEN_SECONDS,
+    enabled=CIRCUIT_BREAKER_ENABLED,
+)
+
+# Per-client rate limits and the fair queue in front of the chat routes (shared by app.py and asgi.py)
+admission_control = AdmissionController(
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_MAX_QUEUE_PER_CLIENT,
+    ADMISSION_RATE,
+    ADMISSION_BURST,
+    ADMISSION_MAX_CLIENTS,
+    ADMISSION_RETRY_AFTER,
+    enabled=ADMISSION_ENABLED,
+)
+
+# Agent failures answered from the fallbacks (degraded_answer) instead of with an error:
+# an open circuit, a missed deadline or a coalesced wait that ran out
+DEGRADABLE_ERRORS = (CircuitOpenError, TimeoutError)
+
+def get_context(conversation_id):
+    """
+    Returns the previous exchange of a conversation, used as context for follow-ups.
+
+    Args:
+        conversation_id: The conversation to look up.
+
+    Returns:
+        A compact QueryAgent response, or None for a new or expired conversation.
+    """
+    record = conversation_store.get(conversation_id)
+    if record and "full_bytes" in record:
+        context_stats.record(record["full_bytes"], {key: record[key] for key in ("query", "answer", "candidate_ids")})
+    return to_context(record)
+
+def get_cached_response(message, context):
+    """Returns a cached agent response for this message and context, or None."""
+    if response_cache:
+        agent_response = response_cache.get(message, context)
+        CACHE_LOOKUPS.labels(result="miss" if agent_response is None else "hit").inc()
+        return agent_response
+    return None
+
+def route_query(message, context):
+    """
+    Answers a structured question with a direct Weaviate query.
+
+    Follow-up questions always go to the agent, which can resolve references
+    to the previous answer.
+
+    Args:
+        message: The user's chat message.
+        context: The conversation context, or None for a new conversation.
+
+    Returns:
+        A DirectQueryResponse, or None if the Query Agent should answer.
+    """
+    if query_router is None or context is not None:
+        return None
+    with ROUTE_QUERY.time():
+        return query_router.answer(message)
+
+def flight_key(message, context):
+    """Identifies identical agent requests: same normalized message and context, as in the response cache."""
+    return make_cache_key(message, context)
+
+def cache_response(message, context, agent_response):
+    """Stores an agent response in the response cache (if enabled)."""
+    if response_cache and agent_response is not None:
+        response_cache.set(message, context, agent_response)
+
+def remember_response(conversation_id, message, agent_response):
+    """Stores the latest exchange of a conversation for follow-up questions."""
+    if agent_response is not None:
+        conversation_store.put(conversation_id, compact_response(message, agent_response))
+
+def mark_partial(agent_response, note):
+    """
+    Returns a copy of a response marked as a partial answer.
+
+    Args:
+        agent_response: A QueryAgent or direct query response.
+        note: Appended to its missing_information.
+    """
+    missing_information = list(getattr(agent_response, 'missing_information', None) or []) + [note]
+    if hasattr(agent_response, 'model_copy'):
+        return agent_response.model_copy(update={"is_partial_answer": True, "missing_information": missing_information})
+    partial = copy.copy(agent_response)
+    partial.is_partial_answer = True
+    partial.missing_information = missing_information
+    return partial
+
+def degraded_answer(message, context, error):
+    """
+    Answers without the Query Agent, after a missed deadline or while the circuit is open.
+
+    Tries the cached answer to the same question asked outside the
+    conversation, then a keyword (BM25) search of the local candidate data.
+
+    Args:
+        message: The user's chat message.
+        context: The conversation context, or None for a new conversation.
+        error: Why the agent couldn't answer (one of DEGRADABLE_ERRORS).
+
+    Returns:
+        A response marked partial, or None if no fallback could answer.
+    """
+    reason = "The Query Agent is unavailable" if isinstance(error, CircuitOpenError) else "The Query Agent did not answer in time"
+
+    if response_cache and context is not None:
+        agent_response = response_cache.get(message)
+        if agent_response is not None:
+            return mark_partial(agent_response, f"{reason}; this answer ignores the earlier conversation")
+
+    if DEGRADED_LOCAL_SEARCH:
+        try:
+            from utils.bm25_backend import run_bm25_query
+            return mark_partial(run_bm25_query(message), f"{reason}; these are keyword matches from the local candidate data")
+        except Exception as e:
+            print(f"Local fallback search failed: {str(e)}")
+
+    return None
+
+def build_chat_response(message, conversation_id, agent_response, route, remember=True):
+    """
+    Turns an agent response into the /api/chat response body and records the exchange.
+
+    Args:
+        message: The user's chat message.
+        conversation_id: The conversation this message belongs to.
+        agent_response: The QueryAgent response (fresh or cached) or direct query response.
+        route: Which path answered: "cache", "direct", "agent", "coalesced" or "degraded".
+        remember: Whether to store the exchange as the conversation's latest.
+
+    Returns:
+        The JSON-serializable response dictionary.
+    """
+    trace_answer(route, agent_response)
+
+    # Format the response for the chatbot interface
+    with FORMAT_RESPONSE.time():
+        formatted_response = format_chatbot_response(agent_response)
+
+    # Enhance the text with better formatting for candidate information
+    if formatted_response['success']:
+        with ENHANCE_RESPONSE.time():
+            formatted_response['response'] = enhance_candidate_response(formatted_response['response'])
+            _add_cards(formatted_response, agent_response)
+
+    # Store the response in conversation history
+    if remember:
+        remember_response(conversation_id, message, agent_response)
+
+    # Include conversation_id in the response
+    formatted_response['conversation_id'] = conversation_id
+    _set_route(formatted_response, route)
+
+    return formatted_response
+
+def _add_cards(formatted_response, agent_response):
+    """Adds the structured candidate cards of a response, when it carries candidate objects."""
+    cards = candidate_cards(agent_response)
+    if cards:
+        formatted_response['candidates'] = cards
+
+def _set_route(formatted_response, route):
+    route_stats.record(route)
+    RESPONSES.labels(route=route).inc()
+    if 'meta' in formatted_response:
+        RESULT_COUNT.observe(formatted_response['meta']['result_count'])
+        formatted_response['meta']['cached'] = route == "cache"
+        formatted_response['meta']['route'] = route
+
+def sse_event(event, data):
+    """Encodes a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class ChatStream:
+    """
+    Converts streamed Query Agent output into Server-Sent Events for /api/chat/stream.
+
+    The caller drives the agent (synchronously or asynchronously) and passes each
+    output to handle(); start(), finish() and error() produce the framing events.
+    """
+
+    def __init__(self, message, conversation_id, context):
+        self.message = message
+        self.conversation_id = conversation_id
+        self.context = context
+        self.agent_response = None
+        self._enhancer = StreamingEnhancer()
+        self._streamed_tokens = False
+        trace_question(message, context)
+
+    def start(self):
+        return sse_event("start", {"conversation_id": self.conversation_id})
+
+    def handle(self, output):
+        """
+        Converts one agent output into an event.
+
+        Args:
+            output: A progress message, streamed tokens or the final response.
+
+        Returns:
+            The encoded event, or None if there is nothing to send yet.
+        """
+        output_type = getattr(output, 'output_type', 'final_state')
+        if output_type == 'progress_message':
+            details = getattr(output, 'details', None) or {}
+            return sse_event("progress", {
+                "stage": output.stage,
+                "message": output.message,
+                "queries": details.get('queries', [])
+            })
+        if output_type == 'streamed_tokens':
+            self._streamed_tokens = True
+            text = self._enhancer.feed(output.delta)
+            return sse_event("token", {"text": text}) if text else None
+
+        self.agent_response = output
+        return None
+
+    def finish(self, route):
+        """
+        Returns the remaining answer text, result count and done events, and records the exchange.
+
+        Args:
+            route: Which path answered: "cache", "direct", "agent", "coalesced" or "degraded".
+        """
+        trace_answer(route, self.agent_response)
+        events = []
+        with FORMAT_RESPONSE.time():
+            formatted_response = format_chatbot_response(self.agent_response)
+
+        if self._streamed_tokens:
+            text = self._enhancer.flush()
+            if text:
+                events.append(sse_event("token", {"text": text}))
+        elif formatted_response['success']:
+            # No token stream (cache hit, direct answer, shared or non-streaming agent call): send the answer paragraph by paragraph
+            paragraphs = formatted_response['response'].split('\n\n')
+            with ENHANCE_RESPONSE.time():
+                for index, paragraph in enumerate(paragraphs):
+                    separator = '\n\n' if index < len(paragraphs) - 1 else ''
+                    events.append(sse_event("token", {"text": enhance_candidate_response(paragraph + separator)}))
+        else:
+            events.append(sse_event("token", {"text": formatted_response['response']}))
+
+        if formatted_response['success']:
+            with ENHANCE_RESPONSE.time():
+                _add_cards(formatted_response, self.agent_response)
+
+        if 'meta' in formatted_response:
+            events.append(sse_event("results", {
+                "result_count": formatted_response['meta']['result_count'],
+                "has_results": formatted_response['meta']['has_results']
+            }))
+
+        remember_response(self.conversation_id, self.message, self.agent_response)
+
+        formatted_response.pop('response', None)
+        formatted_response['conversation_id'] = self.conversation_id
+        _set_route(formatted_response, route)
+        events.append(sse_event("done", formatted_response))
+        return events
+
+    def degrade(self, e):
+        """
+        Finishes the stream with a degraded answer after an agent failure.
+
+        Args:
+            e: The exception the agent call (or the wait for it) raised.
+
+        Returns:
+            The remaining events (see finish()), or None if the answer can't be
+            degraded: it isn't one of DEGRADABLE_ERRORS, answer tokens were
+            already sent or no fallback could answer.
+        """
+        if self._streamed_tokens or not isinstance(e, DEGRADABLE_ERRORS):
+            return None
+        agent_response = degraded_answer(self.message, self.context, e)
+        if agent_response is None:
+            return None
+        self.agent_response = agent_response
+        return self.finish("degraded")
+
+    def error(self, e):
+        trace_error(e)
+        return sse_event("error", {
+            "error": f"Failed to process request: {str(e)}",
+            "success": False
+        })
@@ -0,0 +1,245 @@
+import time
+import asyncio
+import threading
+from collections import deque
+
+from utils.deadline import DeadlineExceeded
+
+# Circuit breaker around the upstream agent calls (Weaviate and OpenAI).
+#
+# While closed, the outcome of the last `window` calls is kept. Once at least
+# `min_calls` are known and the share of failed calls reaches `error_rate`, or
+# the share of calls slower than `slow_call_seconds` reaches `slow_call_rate`,
+# the circuit opens: for `open_seconds` calls fail immediately with
+# CircuitOpenError and the chat routes serve a degraded answer instead of
+# waiting on a cluster that is down or overloaded. Then a single trial call is
+# let through (half open); it closes the circuit if it succeeds in time and
+# opens it again otherwise.
+#
+# A call cut off by its request's deadline is not a failure (the client chose
+# the deadline). It counts as slow once it ran for `slow_call_seconds`, so an
+# upstream that hangs still opens the circuit. Cut off sooner, it says nothing
+# about the upstream and is not recorded: a few clients sending short
+# deadlines must not open the circuit for everyone. A trial call cut off that
+# way leaves the circuit half open for the next call to try.
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit is open."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"The Query Agent is unavailable, retrying in {retry_after:.0f}s (circuit open)")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Fails fast while the upstream error rate or latency is over its threshold.
+
+    Args:
+        window: Number of recent calls the rates are computed over.
+        min_calls: Calls needed in the window before the circuit can open.
+        error_rate: Share of failed calls that opens the circuit.
+        slow_call_seconds: Duration from which a call counts as slow.
+        slow_call_rate: Share of slow calls that opens the circuit.
+        open_seconds: How long the circuit stays open before a trial call.
+        enabled: When False every call goes through and nothing is recorded.
+
+    Usage:
+        response = breaker.call(run_query, message, context)
+    """
+
+    def __init__(self, window, min_calls, error_rate, slow_call_seconds, slow_call_rate, open_seconds, enabled=True):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._outcomes = deque()
+        self._failures = 0
+        self._slow = 0
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self):
+        """
+        Admits one upstream call; every admitted call must be followed by record().
+
+        Raises:
+            CircuitOpenError: While the circuit is open, or half open with the trial call in flight.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            self.rejected += 1
+            raise CircuitOpenError(self._retry_after())
+
+    def record(self, seconds, failed, timed_out=False):
+        """
+        Records the outcome of an admitted call.
+
+        Args:
+            seconds: How long the call took.
+            failed: Whether it raised an upstream error.
+            timed_out: Whether the request's deadline cut it off; it then only
+                counts if it lasted at least slow_call_seconds.
+        """
+        if not self.enabled:
+            return
+        slow = seconds >= self.slow_call_seconds
+        inconclusive = timed_out and not slow
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trial_in_flight = False
+                if failed or slow:
+                    self._open()
+                elif inconclusive:
+                    return
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                    self._failures = self._slow = 0
+                return
+            if self.state == OPEN or inconclusive:
+                # A call admitted before the circuit opened, or one cut short by its client
+                return
+
+            self._outcomes.append((failed, slow))
+            self._failures += failed
+            self._slow += slow
+            if len(self._outcomes) > self.window:
+                old_failed, old_slow = self._outcomes.popleft()
+                self._failures -= old_failed
+                self._slow -= old_slow
+
+            calls = len(self._outcomes)
+            if calls >= self.min_calls and (
+                self._failures / calls >= self.error_rate or self._slow / calls >= self.slow_call_rate
+            ):
+                print(f"Opening the agent circuit: {self._failures}/{calls} failed, {self._slow}/{calls} slow")
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+        self._outcomes.clear()
+        self._failures = self._slow = 0
+
+    def _retry_after(self):
+        return max(1.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def call(self, function, *args):
+        """Calls function(*args) through the breaker and records its outcome."""
+        self.allow()
+        start_time = time.perf_counter()
+        failed = timed_out = False
+        try:
+            return function(*args)
+        except DeadlineExceeded:
+            timed_out = True
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.record(time.perf_counter() - start_time, failed, timed_out)
+
+    async def call_async(self, awaitable, deadline=None):
+        """
+        Async counterpart of call(): awaits the awaitable through the breaker.
+
+        Args:
+            awaitable: The upstream call.
+            deadline: The request's Deadline, if an outer asyncio.wait_for enforces
+                it; a cancellation once it has passed counts as a timeout.
+        """
+        try:
+            self.allow()
+        except CircuitOpenError:
+            awaitable.close()
+            raise
+        start_time = time.perf_counter()
+        failed = timed_out = False
+        try:
+            return await awaitable
+        except DeadlineExceeded:
+            timed_out = True
+            raise
+        except asyncio.CancelledError:
+            timed_out = deadline is not None and deadline.expired()
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.record(time.perf_counter() - start_time, failed, timed_out)
+
+    def iterate(self, produce):
+        """
+        Streaming counterpart of call(): yields from produce() through the breaker.
+
+        The call succeeds when the iterator is exhausted; stopping early (the
+        client went away) records it as successful.
+        """
+        self.allow()
+        start_time = time.perf_counter()
+        failed = timed_out = False
+        try:
+            yield from produce()
+        except DeadlineExceeded:
+            timed_out = True
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.record(time.perf_counter() - start_time, failed, timed_out)
+
+    async def aiterate(self, iterator):
+        """Async counterpart of iterate() for an async generator."""
+        self.allow()
+        start_time = time.perf_counter()
+        failed = timed_out = False
+        try:
+            async for output in iterator:
+                yield output
+        except DeadlineExceeded:
+            timed_out = True
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.record(time.perf_counter() - start_time, failed, timed_out)
+
+    def stats(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                "enabled": self.enabled,
+                "state": self.state,
+                "retry_after": round(self._retry_after(), 1) if self.state != CLOSED else 0,
+                "window_calls": calls,
+                "window_error_rate": round(self._failures / calls, 3) if calls else 0.0,
+                "window_slow_rate": round(self._slow / calls, 3) if calls else 0.0,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
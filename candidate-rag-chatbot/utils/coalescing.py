@@ -0,0 +1,256 @@
+import time
+import asyncio
+import threading
+
+# Single-flight coalescing of identical concurrent agent calls.
+#
+# The first request for a key (the leader) makes the upstream call; requests
+# for the same key that arrive while it is in flight (followers) wait for it
+# and share its result or exception instead of calling upstream themselves.
+# Each follower waits at most its own timeout; the leader's call is not
+# affected when a follower gives up. A flight is removed as soon as it
+# completes, so only truly concurrent requests are coalesced; repeats after
+# that are the response cache's job.
+
+
+class CoalescedTimeoutError(TimeoutError):
+    """Raised in a follower that waited longer than its timeout for the shared call."""
+
+    def __init__(self, timeout):
+        super().__init__(f"Timed out after {timeout:g}s waiting for an identical request in progress")
+        self.timeout = timeout
+
+
+def _shareable(error):
+    # A leader stopped by cancellation or a closed generator (its client went
+    # away) must not cancel or close its followers: hand them a plain error
+    if error is not None and not isinstance(error, Exception):
+        return RuntimeError("The identical request this one was waiting for was interrupted")
+    return error
+
+
+class CoalescingStats:
+    """
+    Counters shared by the thread and async coalescers of a process.
+
+    Leader latency is the upstream call itself; follower latency is the time
+    spent waiting on someone else's call, reported separately.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+        self.upstream_seconds = 0.0
+        self.coalesced = 0
+        self.follower_timeouts = 0
+        self.follower_errors = 0
+        self.follower_seconds = 0.0
+        self.follower_max_seconds = 0.0
+
+    def record_leader(self, seconds, failed):
+        with self._lock:
+            self.upstream_calls += 1
+            self.upstream_errors += failed
+            self.upstream_seconds += seconds
+
+    def record_follower(self, seconds, timed_out=False, failed=False):
+        with self._lock:
+            self.coalesced += 1
+            self.follower_timeouts += timed_out
+            self.follower_errors += failed
+            self.follower_seconds += seconds
+            self.follower_max_seconds = max(self.follower_max_seconds, seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "upstream_calls": self.upstream_calls,
+                "upstream_errors": self.upstream_errors,
+                "avg_upstream_ms": round(self.upstream_seconds / self.upstream_calls * 1000, 1) if self.upstream_calls else 0.0,
+                "coalesced": self.coalesced,
+                "saved_calls": self.coalesced - self.follower_timeouts,
+                "follower_timeouts": self.follower_timeouts,
+                "follower_errors": self.follower_errors,
+                "avg_follower_wait_ms": round(self.follower_seconds / self.coalesced * 1000, 1) if self.coalesced else 0.0,
+                "max_follower_wait_ms": round(self.follower_max_seconds * 1000, 1),
+            }
+
+
+class _Flight:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls across threads (the Flask app).
+
+    Usage:
+        response, leader = flights.run(key, lambda: run_query(message, context), timeout)
+
+    Streaming callers, which produce the result incrementally, use join() and
+    complete() (leader) or wait() (follower) directly.
+
+    Args:
+        stats: A CoalescingStats to record into.
+        enabled: When False every caller is a leader and nothing is shared.
+    """
+
+    def __init__(self, stats, enabled=True):
+        self.stats = stats
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def join(self, key):
+        """
+        Returns (flight, leader): a new flight the caller must complete(), or
+        the flight already in progress for this key.
+        """
+        if not self.enabled:
+            return _Flight(), True
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def complete(self, key, flight, result=None, error=None):
+        """Publishes the leader's result (or exception) to every follower; later calls are ignored."""
+        with self._lock:
+            if flight.done.is_set():
+                return
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.result = result
+        flight.error = _shareable(error)
+        flight.done.set()
+        self.stats.record_leader(time.perf_counter() - flight.started, error is not None)
+
+    def wait(self, flight, timeout=None):
+        """
+        Waits for a flight led by another request.
+
+        Returns:
+            The leader's result.
+
+        Raises:
+            CoalescedTimeoutError: If the call didn't finish within `timeout` seconds.
+            Exception: Whatever the leader's call raised.
+        """
+        start_time = time.perf_counter()
+        if not flight.done.wait(timeout):
+            self.stats.record_follower(time.perf_counter() - start_time, timed_out=True)
+            raise CoalescedTimeoutError(timeout)
+        self.stats.record_follower(time.perf_counter() - start_time, failed=flight.error is not None)
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def run(self, key, fn, timeout=None):
+        """
+        Calls fn() once for all concurrent callers with the same key.
+
+        Args:
+            key: Identifies identical requests (see make_cache_key).
+            fn: The upstream call, run by the leader.
+            timeout: Seconds a follower waits before giving up (None waits forever).
+
+        Returns:
+            (result, leader) where leader is False if the result was shared.
+        """
+        flight, leader = self.join(key)
+        if not leader:
+            return self.wait(flight, timeout), False
+        try:
+            result = fn()
+        except BaseException as e:
+            self.complete(key, flight, error=e)
+            raise
+        self.complete(key, flight, result)
+        return result, True
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+
+class _AsyncFlight:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces identical concurrent calls on one event loop (asgi.py).
+
+    Same interface as SingleFlight, with wait() and run() as coroutines and
+    run() taking a coroutine function. Followers wait on a shielded future,
+    so a follower timing out or disconnecting never cancels the shared call.
+    """
+
+    def __init__(self, stats, enabled=True):
+        self.stats = stats
+        self.enabled = enabled
+        self._flights = {}
+
+    def join(self, key):
+        if not self.enabled:
+            return _AsyncFlight(), True
+        flight = self._flights.get(key)
+        if flight is not None:
+            return flight, False
+        flight = self._flights[key] = _AsyncFlight()
+        return flight, True
+
+    def complete(self, key, flight, result=None, error=None):
+        if flight.future.done():
+            return
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        error = _shareable(error)
+        if error is not None:
+            flight.future.set_exception(error)
+            # Retrieved here so an unshared failure isn't logged as never retrieved
+            flight.future.exception()
+        else:
+            flight.future.set_result(result)
+        self.stats.record_leader(time.perf_counter() - flight.started, error is not None)
+
+    async def wait(self, flight, timeout=None):
+        start_time = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(asyncio.shield(flight.future), timeout)
+        except asyncio.TimeoutError:
+            if flight.future.done():
+                # The leader's own call timed out
+                self.stats.record_follower(time.perf_counter() - start_time, failed=True)
+                raise
+            self.stats.record_follower(time.perf_counter() - start_time, timed_out=True)
+            raise CoalescedTimeoutError(timeout)
+        except Exception:
+            self.stats.record_follower(time.perf_counter() - start_time, failed=True)
+            raise
+        self.stats.record_follower(time.perf_counter() - start_time)
+        return result
+
+    async def run(self, key, fn, timeout=None):
+        flight, leader = self.join(key)
+        if not leader:
+            return await self.wait(flight, timeout), False
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.complete(key, flight, error=e)
+            raise
+        self.complete(key, flight, result)
+        return result, True
+
+    def in_flight(self):
+        return len(self._flights)
@@ -0,0 +1,66 @@
+import asyncio
+
+
+class QueueFullError(Exception):
+    """Raised when too many requests are already waiting for an upstream slot."""
+
+    def __init__(self, retry_after):
+        super().__init__("Too many requests are waiting for the Query Agent")
+        self.retry_after = retry_after
+
+
+class AgentConcurrencyLimiter:
+    """
+    Bounds concurrent upstream agent calls in the async server.
+
+    At most `max_concurrency` calls run at once and at most `max_queue` more
+    wait for a slot. Beyond that, entering the limiter fails immediately with
+    QueueFullError so the server can answer 503 instead of piling up work.
+
+    Usage:
+        async with limiter:
+            response = await run_query_async(message, context)
+    """
+
+    def __init__(self, max_concurrency, max_queue, retry_after):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._semaphore = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def _get_semaphore(self):
+        # Created on first use so it belongs to the server's event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def __aenter__(self):
+        semaphore = self._get_semaphore()
+        if semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(self.retry_after)
+
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.in_flight -= 1
+        self._get_semaphore().release()
+        return False
+
+    def stats(self):
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,163 @@
+import json
+import threading
+
+# Import configuration
+from config import CONTEXT_TOKEN_BUDGET, CONTEXT_MAX_CANDIDATES
+
+# Keeps the context of follow-up questions small. The agent gets the previous
+# question, a bounded summary of its answer and the referenced candidate IDs,
+# sized to fit CONTEXT_TOKEN_BUDGET, so the prompt (and the latency) of a
+# follow-up stays flat however long the previous answer was.
+#
+# Tokens are estimated as characters / 4, which is close for English text
+# with OpenAI tokenizers and needs no tokenizer dependency.
+
+CHARS_PER_TOKEN = 4
+
+# The answer gets at least this many tokens (or the whole budget, if it is
+# smaller), even if that means dropping candidate IDs
+MIN_ANSWER_TOKENS = 64
+
+def estimate_tokens(text):
+    """Approximate token count of a string."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _truncate(text, max_chars):
+    """Cuts text at the last word boundary within max_chars and marks the cut."""
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= 0:
+        return ""
+    cut = text[:max(0, max_chars - 1)]
+    if " " in cut:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip() + "…"
+
+def summarize_answer(answer, max_tokens):
+    """
+    Shortens an answer to about max_tokens.
+
+    Answers list candidates in paragraphs, so the summary keeps the first line
+    of each paragraph (the introduction and each candidate's name line) in
+    order until the budget is used, and notes how many were left out.
+
+    Args:
+        answer: The previous answer text.
+        max_tokens: Token budget for the summary.
+
+    Returns:
+        The answer itself if it fits, otherwise the summary.
+    """
+    if estimate_tokens(answer) <= max_tokens:
+        return answer
+    if max_tokens <= 0:
+        return ""
+
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    paragraphs = [paragraph.strip() for paragraph in answer.split("\n\n") if paragraph.strip()]
+    # Room for the "[n more omitted]" note
+    available = max_chars - 32
+
+    lines = []
+    used = 0
+    for paragraph in paragraphs:
+        line = paragraph.splitlines()[0].strip()
+        if used + len(line) + 1 > available:
+            break
+        lines.append(line)
+        used += len(line) + 1
+
+    if not lines:
+        return _truncate(paragraphs[0] if paragraphs else answer, max_chars)
+
+    omitted = len(paragraphs) - len(lines)
+    if omitted:
+        lines.append(f"[{omitted} more omitted]")
+    return "\n".join(lines)
+
+def fit_context(query, answer, candidate_ids, budget=CONTEXT_TOKEN_BUDGET, max_candidates=CONTEXT_MAX_CANDIDATES):
+    """
+    Fits the previous exchange of a conversation into a token budget.
+
+    The question is cut to a quarter of the budget and the answer is given
+    at least MIN_ANSWER_TOKENS of it (all of it, for smaller budgets). The
+    candidate IDs (at most max_candidates, in the order the answer cited them)
+    fill the room in between, and the answer gets whatever they leave, so the
+    whole context never exceeds the budget.
+
+    Args:
+        query: The previous question.
+        answer: The previous answer.
+        candidate_ids: Object IDs of the candidates the answer referred to.
+        budget: Token budget for the whole context.
+        max_candidates: How many candidate IDs to keep.
+
+    Returns:
+        A dictionary with "query", "answer" and "candidate_ids".
+    """
+    budget = max(0, budget)
+    query = _truncate(query, budget // 4 * CHARS_PER_TOKEN)
+    reserved = estimate_tokens(query)
+    min_answer = min(MIN_ANSWER_TOKENS, budget - reserved)
+
+    kept_ids = []
+    for object_id in candidate_ids[:max_candidates]:
+        tokens = estimate_tokens(object_id)
+        if reserved + tokens > budget - min_answer:
+            break
+        kept_ids.append(object_id)
+        reserved += tokens
+
+    return {
+        "query": query,
+        "answer": summarize_answer(answer, budget - reserved),
+        "candidate_ids": kept_ids,
+    }
+
+def response_size(agent_response):
+    """Size in bytes of a whole agent response as it would be passed as context."""
+    try:
+        if hasattr(agent_response, "model_dump_json"):
+            return len(agent_response.model_dump_json().encode("utf-8"))
+        return len(json.dumps(vars(agent_response), default=str).encode("utf-8"))
+    except Exception:
+        return 0
+
+
+class ContextStats:
+    """How much context payload compaction saved, measured on every follow-up."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.follow_ups = 0
+        self.full_bytes = 0
+        self.context_bytes = 0
+        self.context_tokens = 0
+
+    def record(self, full_bytes, context):
+        """
+        Records one follow-up.
+
+        Args:
+            full_bytes: Size of the previous response had it been passed whole.
+            context: The compact record passed instead.
+        """
+        encoded = json.dumps(context)
+        with self._lock:
+            self.follow_ups += 1
+            self.full_bytes += full_bytes
+            self.context_bytes += len(encoded.encode("utf-8"))
+            self.context_tokens += estimate_tokens(encoded)
+
+    def stats(self):
+        with self._lock:
+            follow_ups = self.follow_ups
+            return {
+                "token_budget": CONTEXT_TOKEN_BUDGET,
+                "follow_ups": follow_ups,
+                "avg_full_response_bytes": round(self.full_bytes / follow_ups) if follow_ups else 0,
+                "avg_context_bytes": round(self.context_bytes / follow_ups) if follow_ups else 0,
+                "avg_context_tokens": round(self.context_tokens / follow_ups) if follow_ups else 0,
+                "bytes_saved": self.full_bytes - self.context_bytes,
+                "saved_ratio": round(1 - self.context_bytes / self.full_bytes, 4) if self.full_bytes else 0.0,
+            }
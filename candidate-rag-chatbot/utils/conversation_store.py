@@ -0,0 +1,258 @@
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Import configuration
+from config import (
+    CANDIDATE_COLLECTION,
+    CONVERSATION_STORE_BACKEND,
+    CONVERSATION_TTL,
+    CONVERSATION_MAX_ENTRIES,
+    CONVERSATION_STORE_PATH,
+)
+from utils.context_budget import fit_context, response_size
+
+def compact_response(message, agent_response):
+    """
+    Reduces an agent response to what a follow-up question needs.
+
+    Follow-ups only rely on the previous question, its answer and which
+    candidates it referred to; search plans, aggregations and usage data are
+    dropped, and the rest is fitted into CONTEXT_TOKEN_BUDGET (see
+    utils/context_budget.py).
+
+    Args:
+        message: The user's chat message.
+        agent_response: The QueryAgent response to that message.
+
+    Returns:
+        A JSON-serializable dictionary. "full_bytes" is the size of the whole
+        response, to measure what compaction saves.
+    """
+    candidate_ids = []
+    for source in getattr(agent_response, 'sources', None) or []:
+        object_id = getattr(source, 'object_id', None)
+        if object_id and object_id not in candidate_ids:
+            candidate_ids.append(object_id)
+
+    record = fit_context(message, getattr(agent_response, 'final_answer', None) or "", candidate_ids)
+    record["full_bytes"] = response_size(agent_response)
+    return record
+
+def to_context(record):
+    """
+    Rebuilds a minimal QueryAgent response from a compact record, for use as
+    the `context` argument of agent.run().
+
+    Args:
+        record: A dictionary produced by compact_response().
+
+    Returns:
+        A QueryAgentResponse, or None if it could not be built.
+    """
+    if not record:
+        return None
+
+    try:
+        from weaviate.agents.classes import QueryAgentResponse
+
+        return QueryAgentResponse.model_validate({
+            "original_query": record["query"],
+            "collection_names": [CANDIDATE_COLLECTION],
+            "searches": [],
+            "aggregations": [],
+            "usage": {},
+            "total_time": 0.0,
+            "is_partial_answer": False,
+            "missing_information": [],
+            "final_answer": record["answer"],
+            "sources": [
+                {"object_id": object_id, "collection": CANDIDATE_COLLECTION}
+                for object_id in record["candidate_ids"]
+            ],
+        })
+    except Exception as e:
+        print(f"Note: Could not rebuild conversation context: {e}")
+        return None
+
+def _record_size(record):
+    return len(json.dumps(record).encode("utf-8"))
+
+
+class MemoryConversationStore:
+    """Per-process conversation store with idle-TTL and max-entries eviction."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._records = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def _drop(self, conversation_id):
+        record, _ = self._records.pop(conversation_id)
+        self._bytes -= _record_size(record)
+
+    def _expire(self, now):
+        # Least recently used first, so stop at the first live entry
+        while self._records:
+            conversation_id, (_, last_used) = next(iter(self._records.items()))
+            if now - last_used < self.ttl:
+                break
+            self._drop(conversation_id)
+            self.expirations += 1
+
+    def get(self, conversation_id):
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            entry = self._records.get(conversation_id)
+            if entry is None:
+                return None
+            self._records[conversation_id] = (entry[0], now)
+            self._records.move_to_end(conversation_id)
+            return entry[0]
+
+    def put(self, conversation_id, record):
+        with self._lock:
+            now = time.monotonic()
+            if conversation_id in self._records:
+                self._drop(conversation_id)
+            self._records[conversation_id] = (record, now)
+            self._bytes += _record_size(record)
+            self._expire(now)
+            while len(self._records) > self.max_entries:
+                self._drop(next(iter(self._records)))
+                self.evictions += 1
+
+    def delete(self, conversation_id):
+        with self._lock:
+            if conversation_id not in self._records:
+                return False
+            self._drop(conversation_id)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+            self._bytes = 0
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "conversations": len(self._records),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "memory_bytes": self._bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SQLiteConversationStore:
+    """
+    Conversation store in a SQLite database (WAL mode), shared by all worker
+    processes on the host so a follow-up can land on any worker.
+    """
+
+    def __init__(self, path, ttl, max_entries):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self.evictions = 0
+        self.expirations = 0
+        self._connection().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS conversations (
+                conversation_id TEXT PRIMARY KEY,
+                record TEXT NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS conversations_last_used
+                ON conversations (last_used);
+            """
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, conversation_id):
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT record FROM conversations WHERE conversation_id = ? AND last_used > ?",
+            (conversation_id, now - self.ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE conversations SET last_used = ? WHERE conversation_id = ?",
+            (now, conversation_id),
+        )
+        return json.loads(row[0])
+
+    def put(self, conversation_id, record):
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO conversations (conversation_id, record, last_used) VALUES (?, ?, ?)",
+            (conversation_id, json.dumps(record), now),
+        )
+        self.expirations += conn.execute(
+            "DELETE FROM conversations WHERE last_used <= ?", (now - self.ttl,)
+        ).rowcount
+        overflow = conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM conversations WHERE conversation_id IN "
+                "(SELECT conversation_id FROM conversations ORDER BY last_used LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def delete(self, conversation_id):
+        cursor = self._connection().execute(
+            "DELETE FROM conversations WHERE conversation_id = ?", (conversation_id,)
+        )
+        return cursor.rowcount > 0
+
+    def clear(self):
+        self._connection().execute("DELETE FROM conversations")
+
+    def stats(self):
+        count, size = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(record)), 0) FROM conversations"
+        ).fetchone()
+        return {
+            "backend": "sqlite",
+            "conversations": count,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "memory_bytes": size,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+def create_conversation_store():
+    """
+    Builds the conversation store configured in config.py.
+
+    Returns:
+        A MemoryConversationStore or SQLiteConversationStore.
+    """
+    if CONVERSATION_STORE_BACKEND == "sqlite":
+        return SQLiteConversationStore(CONVERSATION_STORE_PATH, CONVERSATION_TTL, CONVERSATION_MAX_ENTRIES)
+    if CONVERSATION_STORE_BACKEND == "memory":
+        return MemoryConversationStore(CONVERSATION_TTL, CONVERSATION_MAX_ENTRIES)
+    raise ValueError(f"Unknown CONVERSATION_STORE_BACKEND: {CONVERSATION_STORE_BACKEND}")
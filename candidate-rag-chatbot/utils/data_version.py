@@ -0,0 +1,155 @@
+import os
+import time
+import uuid
+import threading
+
+# Import configuration
+from config import DATA_VERSION_STORE, DATA_VERSION_COLLECTION, DATA_VERSION_CHECK_INTERVAL, DATA_VERSION_FILE
+
+# The Candidates data version is an opaque token that ingestion replaces.
+# With the "weaviate" store it is the one object of DATA_VERSION_COLLECTION,
+# so every API instance sees a bump made by ingest.py from any host or CI job;
+# with the "file" store it is DATA_VERSION_FILE, shared by the processes of
+# one host only.
+
+# How long a read of the version file is trusted before checking it again
+_CHECK_INTERVAL = 2.0
+
+# The version object has a fixed UUID, so there is only ever one
+_VERSION_UUID = uuid.uuid5(uuid.NAMESPACE_URL, "candidate-rag-chatbot/data-version")
+
+_lock = threading.Lock()
+_cached_version = None
+_last_check = 0.0
+_refreshing = False
+
+def _version_collection(create=False):
+    """The data version collection, or None if it doesn't exist and create is False."""
+    from utils.weaviate_client import get_weaviate_client
+
+    client = get_weaviate_client()
+    if not client.collections.exists(DATA_VERSION_COLLECTION):
+        if not create:
+            return None
+        from weaviate.classes.config import Configure, Property, DataType
+        client.collections.create(
+            DATA_VERSION_COLLECTION,
+            description="Version token of the Candidates data; rewritten by every ingestion",
+            vectorizer_config=Configure.Vectorizer.none(),
+            properties=[Property(name="version", data_type=DataType.TEXT, skip_vectorization=True)],
+        )
+    return client.collections.get(DATA_VERSION_COLLECTION)
+
+def _read_version():
+    if DATA_VERSION_STORE == "weaviate":
+        collection = _version_collection()
+        obj = collection.query.fetch_object_by_id(_VERSION_UUID) if collection is not None else None
+        return (obj.properties.get("version") if obj is not None else None) or "initial"
+    try:
+        with open(DATA_VERSION_FILE, "r", encoding="utf-8") as f:
+            return f.read().strip() or "initial"
+    except FileNotFoundError:
+        return "initial"
+
+def _write_version(version):
+    if DATA_VERSION_STORE == "weaviate":
+        collection = _version_collection(create=True)
+        if collection.data.exists(_VERSION_UUID):
+            collection.data.replace(uuid=_VERSION_UUID, properties={"version": version})
+        else:
+            collection.data.insert(properties={"version": version}, uuid=_VERSION_UUID)
+        return
+
+    directory = os.path.dirname(os.path.abspath(DATA_VERSION_FILE))
+    os.makedirs(directory, exist_ok=True)
+
+    # Write atomically so readers never see a partial token
+    tmp_path = f"{DATA_VERSION_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, DATA_VERSION_FILE)
+
+def refresh_data_version():
+    """
+    Reads the data version from its store now and caches it.
+
+    Warm-up calls this so the first requests find the version loaded.
+
+    Returns:
+        The current data version string.
+
+    Raises:
+        Exception: Whatever reading the store raised; the cached version is kept.
+    """
+    global _cached_version, _last_check, _refreshing
+
+    try:
+        version = _read_version()
+    finally:
+        with _lock:
+            _last_check = time.monotonic()
+            _refreshing = False
+    with _lock:
+        _cached_version = version
+    return version
+
+def _refresh_in_background():
+    try:
+        refresh_data_version()
+    except Exception as e:
+        print(f"Note: Could not read the data version: {str(e)}")
+
+def get_data_version():
+    """
+    Returns an opaque token identifying the current contents of the Candidates collection.
+
+    Nothing is read at import time: the version is loaded by warm-up or on
+    first use. After that this never waits on the store. Once the cached
+    version is older than DATA_VERSION_CHECK_INTERVAL seconds (a couple of
+    seconds for the file), one background thread re-reads it while callers
+    keep the cached one, which also stays in use if Weaviate can't be reached.
+
+    Returns:
+        The current data version string.
+    """
+    global _cached_version, _refreshing
+
+    if _cached_version is None:
+        # First use without warm-up: the one read that happens in a request
+        try:
+            return refresh_data_version()
+        except Exception as e:
+            print(f"Note: Could not read the data version: {str(e)}")
+            with _lock:
+                _cached_version = _cached_version or "initial"
+            return _cached_version
+
+    interval = DATA_VERSION_CHECK_INTERVAL if DATA_VERSION_STORE == "weaviate" else _CHECK_INTERVAL
+    if time.monotonic() - _last_check >= interval:
+        with _lock:
+            start = not _refreshing
+            _refreshing = True
+        if start:
+            threading.Thread(target=_refresh_in_background, name="data-version", daemon=True).start()
+    return _cached_version
+
+def bump_data_version():
+    """
+    Records that the Candidates collection was (re-)ingested.
+
+    Anything keyed on the data version (e.g. the response cache) is invalidated
+    in every worker once it next checks the version.
+
+    Returns:
+        The new data version string.
+    """
+    global _cached_version, _last_check
+
+    version = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    _write_version(version)
+
+    with _lock:
+        _cached_version = version
+        _last_check = time.monotonic()
+
+    return version
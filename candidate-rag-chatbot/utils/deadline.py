@@ -0,0 +1,177 @@
+import time
+import queue
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Import configuration
+from config import REQUEST_TIMEOUT, REQUEST_TIMEOUT_MAX, UPSTREAM_MAX_WORKERS
+from utils.profiler import run_profiled
+
+# Per-request deadlines. Every chat request gets a time budget, from the
+# X-Request-Timeout header (seconds) or REQUEST_TIMEOUT, and the agent call
+# has to finish within what is left of it. A blocking agent call can't be
+# interrupted, so it runs in a small pool of upstream threads and the request
+# stops waiting for it at the deadline; the abandoned call finishes in the
+# background (bounded by AGENT_TIMEOUT) and its answer still reaches the
+# response cache.
+
+DEADLINE_HEADER = "X-Request-Timeout"
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request's deadline passes before the upstream call finished."""
+
+    def __init__(self, deadline, what="the Query Agent answered"):
+        super().__init__(f"Deadline of {deadline.seconds:g}s exceeded before {what}")
+        self.deadline = deadline
+
+
+class Deadline:
+    """
+    The point in time by which a request must be answered.
+
+    Args:
+        seconds: Time budget from now.
+    """
+
+    def __init__(self, seconds=REQUEST_TIMEOUT):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_header(cls, value):
+        """
+        Builds the deadline of a request from its X-Request-Timeout header.
+
+        Args:
+            value: The header value in seconds, or None.
+
+        Returns:
+            A Deadline of that many seconds (at most REQUEST_TIMEOUT_MAX), or of
+            REQUEST_TIMEOUT when the header is missing or not a positive number.
+        """
+        try:
+            seconds = float(value) if value else REQUEST_TIMEOUT
+        except ValueError:
+            seconds = REQUEST_TIMEOUT
+        if not seconds > 0:
+            seconds = REQUEST_TIMEOUT
+        return cls(min(seconds, REQUEST_TIMEOUT_MAX))
+
+    def remaining(self):
+        """Seconds left, never negative."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    def check(self, what="the Query Agent answered"):
+        """Raises DeadlineExceeded if the deadline has passed."""
+        if self.expired():
+            raise DeadlineExceeded(self, what)
+
+
+_executor = ThreadPoolExecutor(max_workers=UPSTREAM_MAX_WORKERS, thread_name_prefix="upstream")
+
+def call_with_deadline(function, deadline):
+    """
+    Calls function in the upstream pool and waits for it until the deadline.
+
+    Args:
+        function: Callable without arguments, e.g. the agent call.
+        deadline: The request's Deadline.
+
+    Returns:
+        The function's result.
+
+    Raises:
+        DeadlineExceeded: If it didn't finish in time; it keeps running in the background.
+    """
+    deadline.check()
+    # In the request's context, so the call's stage timings reach its slow-query
+    # trace and its thread is sampled if the request is being profiled
+    future = _executor.submit(contextvars.copy_context().run, run_profiled, function)
+    if not wait([future], timeout=deadline.remaining()).done:
+        # Drops the call if it is still queued for a thread
+        future.cancel()
+        raise DeadlineExceeded(deadline)
+    return future.result()
+
+_END = object()
+
+def iterate_with_deadline(produce, deadline):
+    """
+    Iterates a blocking generator (a streamed agent call) until the deadline.
+
+    The generator runs in the upstream pool; each output is handed over
+    through a queue so waiting for the next one can time out.
+
+    Args:
+        produce: Callable without arguments returning the iterator.
+        deadline: The request's Deadline.
+
+    Yields:
+        The iterator's outputs.
+
+    Raises:
+        DeadlineExceeded: If the next output didn't arrive in time.
+    """
+    deadline.check()
+    outputs = queue.Queue()
+    stopped = threading.Event()
+
+    def run():
+        try:
+            for output in produce():
+                if stopped.is_set():
+                    # Nobody is reading any more; closing the generator ends the upstream call
+                    return
+                outputs.put((output, None))
+        except BaseException as e:
+            outputs.put((None, e))
+            return
+        outputs.put((_END, None))
+
+    _executor.submit(contextvars.copy_context().run, run_profiled, run)
+    try:
+        while True:
+            try:
+                output, error = outputs.get(timeout=deadline.remaining())
+            except queue.Empty:
+                raise DeadlineExceeded(deadline)
+            if error is not None:
+                raise error
+            if output is _END:
+                return
+            yield output
+    finally:
+        stopped.set()
+
+async def await_with_deadline(awaitable, deadline):
+    """Async counterpart of call_with_deadline(); the awaitable is cancelled at the deadline."""
+    deadline.check()
+    try:
+        return await asyncio.wait_for(awaitable, deadline.remaining())
+    except asyncio.TimeoutError:
+        if deadline.expired():
+            raise DeadlineExceeded(deadline)
+        raise
+
+async def aiterate_with_deadline(iterator, deadline):
+    """Async counterpart of iterate_with_deadline() for an async generator."""
+    deadline.check()
+    try:
+        while True:
+            try:
+                output = await asyncio.wait_for(iterator.__anext__(), deadline.remaining())
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                if deadline.expired():
+                    raise DeadlineExceeded(deadline)
+                raise
+            yield output
+    finally:
+        await iterator.aclose()
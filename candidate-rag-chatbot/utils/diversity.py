@@ -0,0 +1,142 @@
+import numpy as np
+
+# Diversity-aware top-K selection with Maximal Marginal Relevance:
+#
+#     next = argmax  (1 - diversity) * relevance(i) - diversity * max_sim(i, selected)
+#
+# Similarity between two candidates is a weighted mix of facet similarities:
+# same location, shared schools, shared companies and skill overlap (cosine),
+# plus the cosine of their embeddings when vectors are supplied. Only the
+# similarity of each candidate to the latest pick is computed per step, as
+# one vectorized pass over the pool, so selecting K out of N costs O(K * N)
+# instead of materializing an N x N matrix.
+
+# Facet weights; they are normalized to sum to 1 over the facets in use
+DEFAULT_FACET_WEIGHTS = {
+    "location": 1.0,
+    "school": 1.0,
+    "company": 1.0,
+    "skills": 1.0,
+    "vector": 1.0,
+}
+
+
+class _ListFacet:
+    """A multi-valued facet of the pool (e.g. companies), as flattened codes."""
+
+    def __init__(self, offsets, values, rows):
+        starts = offsets[rows]
+        lengths = (offsets[rows + 1] - starts).astype(np.int64)
+        self.lengths = lengths
+        self.starts = np.r_[0, np.cumsum(lengths)[:-1]]
+        # Gather every pool row's codes into one flat array
+        positions = np.repeat(starts - self.starts, lengths) + np.arange(lengths.sum())
+        self.values = values[positions]
+        self.owner = np.repeat(np.arange(len(rows)), lengths)
+
+    def codes(self, member):
+        start = self.starts[member]
+        return self.values[start:start + self.lengths[member]]
+
+    def overlap(self, member):
+        """Cosine of the code sets of `member` and every pool member."""
+        codes = self.codes(member)
+        if not len(codes):
+            return np.zeros(len(self.lengths), dtype=np.float32)
+        shared = np.bincount(self.owner[np.isin(self.values, codes)], minlength=len(self.lengths))
+        norms = np.sqrt(self.lengths * len(codes))
+        return np.divide(shared, norms, out=np.zeros(len(self.lengths), dtype=np.float32), where=norms > 0)
+
+
+class CandidatePool:
+    """
+    A set of candidates to choose from, with the facets used to compare them.
+
+    Args:
+        index: The CandidateIndex the rows belong to.
+        rows: Row numbers of the pool in the index.
+        vectors: Optional (len(rows), dim) embedding matrix, in pool order.
+        weights: Optional facet weights overriding DEFAULT_FACET_WEIGHTS.
+    """
+
+    def __init__(self, index, rows, vectors=None, weights=None):
+        self.index = index
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.size = len(self.rows)
+
+        weights = {**DEFAULT_FACET_WEIGHTS, **(weights or {})}
+        if vectors is None:
+            weights.pop("vector")
+        total = sum(weights.values())
+        self.weights = {facet: weight / total for facet, weight in weights.items() if weight > 0}
+
+        self.location = index.location[self.rows]
+        skill_offsets, skill_values = index.lists["skills"]
+        self.skills = _ListFacet(skill_offsets, skill_values, self.rows)
+        self.companies = _ListFacet(*index.lists["companies"], self.rows)
+        self.schools = _ListFacet(*index.lists["schools"], self.rows)
+
+        self.vectors = None
+        if vectors is not None:
+            vectors = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            self.vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    def similarity(self, member):
+        """
+        Similarity of pool member `member` to every pool member, in [0, 1].
+
+        Returns:
+            A float32 array of length len(pool).
+        """
+        similarity = np.zeros(self.size, dtype=np.float32)
+        if "location" in self.weights:
+            similarity += self.weights["location"] * (self.location == self.location[member])
+        if "school" in self.weights:
+            similarity += self.weights["school"] * self.schools.overlap(member)
+        if "company" in self.weights:
+            similarity += self.weights["company"] * self.companies.overlap(member)
+        if "skills" in self.weights:
+            similarity += self.weights["skills"] * self.skills.overlap(member)
+        if "vector" in self.weights:
+            similarity += self.weights["vector"] * np.clip(self.vectors @ self.vectors[member], 0, 1)
+        return similarity
+
+def select_diverse(pool, relevance, k, diversity=0.5):
+    """
+    Selects up to k candidates from a pool with Maximal Marginal Relevance.
+
+    Args:
+        pool: A CandidatePool.
+        relevance: Array of relevance scores in pool order (any scale; it is
+            rescaled to [0, 1]).
+        k: Number of candidates to select.
+        diversity: 0 ranks by relevance only, 1 by novelty only.
+
+    Returns:
+        Positions of the selected candidates in the pool, in selection order.
+    """
+    if not 0 <= diversity <= 1:
+        raise ValueError("diversity must be between 0 and 1")
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    spread = relevance.max() - relevance.min() if pool.size else 0
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(pool.size, dtype=np.float32)
+
+    max_similarity = np.zeros(pool.size, dtype=np.float32)
+    available = np.ones(pool.size, dtype=bool)
+    selected = []
+    for _ in range(min(k, pool.size)):
+        scores = (1 - diversity) * relevance - diversity * max_similarity
+        scores[~available] = -np.inf
+        member = int(np.argmax(scores))
+        selected.append(member)
+        available[member] = False
+        np.maximum(max_similarity, pool.similarity(member), out=max_similarity)
+    return selected
+
+def rank_relevance(size):
+    """Relevance from an existing ranking: the first of `size` candidates scores 1, the last 0."""
+    if size <= 1:
+        return np.ones(size, dtype=np.float32)
+    return 1 - np.arange(size, dtype=np.float32) / (size - 1)
@@ -0,0 +1,436 @@
+import re
+import json
+import time
+import uuid
+import hashlib
+from datetime import datetime, timezone
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Size of each read from the submissions file
+_READ_SIZE = 64 * 1024
+
+# Namespace for deterministic candidate UUIDs; never change it, or every
+# candidate gets a new ID (and a new embedding) on the next import
+CANDIDATE_UUID_NAMESPACE = uuid.UUID("6f0d3c4e-8a52-4b8e-9d1f-3c2b7a9e5f10")
+
+# Object IDs per delete request when removing candidates that left the source
+_DELETE_CHUNK = 500
+
+_NON_DIGITS = re.compile(r"\D")
+_SUBMITTED_AT_FORMATS = ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S")
+
+def parse_salary(value):
+    """
+    Parses a salary expectation like "$117548" or "$117,548.00" into whole dollars.
+
+    Returns:
+        An int, or None if the value is empty or not a number.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    cleaned = re.sub(r"[^\d.]", "", value or "")
+    try:
+        return int(float(cleaned)) if cleaned else None
+    except ValueError:
+        return None
+
+def parse_submitted_at(value):
+    """
+    Converts a submission timestamp ("2025-01-28 09:02:16.000000", UTC) to RFC 3339.
+
+    Returns:
+        The RFC 3339 string, or None if the value can't be parsed.
+    """
+    for date_format in _SUBMITTED_AT_FORMATS:
+        try:
+            parsed = datetime.strptime(value or "", date_format)
+        except ValueError:
+            continue
+        return parsed.replace(tzinfo=timezone.utc).isoformat().replace("+00:00", "Z")
+    return None
+
+def iter_submissions(path, read_size=_READ_SIZE):
+    """
+    Streams the records of a JSON array file one at a time.
+
+    Only the current record and one read buffer are held in memory, so the
+    file can be arbitrarily large.
+
+    Args:
+        path: Path to a file containing a JSON array of objects.
+        read_size: Number of characters to read at a time.
+
+    Yields:
+        Each element of the top-level array.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            # Skip whitespace and separators between records
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+
+            if position >= len(buffer):
+                if eof:
+                    raise ValueError(f"Unexpected end of file in {path}")
+                chunk = f.read(read_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError(f"{path} does not contain a JSON array")
+                started = True
+                position += 1
+                continue
+
+            if buffer[position] == "]":
+                return
+
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # The record continues past the end of the buffer
+                if eof:
+                    raise ValueError(f"Truncated or invalid JSON in {path}")
+                chunk = f.read(read_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            yield record
+
+def transform_submission(d):
+    """
+    Converts a raw form submission into Candidates properties.
+
+    Applies the same validation and derived fields as the original import in
+    weaver.ipynb, with salary and submission time converted to the typed
+    schema (int dollars, RFC 3339 date).
+
+    Args:
+        d: One record from form-submissions.json.
+
+    Returns:
+        (properties, None) for a valid record, or (None, skip_reason).
+    """
+    # VALIDATION 1: Name is required
+    if not d.get("name"):
+        return None, "empty_name"
+
+    # VALIDATION 2: Either phone OR email is required
+    if not d.get("phone") and not d.get("email"):
+        return None, "no_contact"
+
+    # Extract primary work experience (most recent/first in list)
+    primary_work_experience = d.get("work_experiences", [])[0] if d.get("work_experiences") else {}
+
+    # Extract highest education degree
+    degrees = (d.get("education") or {}).get("degrees", [])
+    primary_degree = degrees[0] if degrees else {}
+
+    # Prepare full_time salary expectation as whole dollars
+    salary_expectation = parse_salary((d.get("annual_salary_expectation") or {}).get("full-time", ""))
+
+    # Every degree level held, for filtering (e.g. "Master's Degree")
+    education_levels = sorted({degree.get("degree") for degree in degrees if degree.get("degree")})
+
+    # Format skills as a comma-separated string for searchability
+    skills_string = ", ".join(d.get("skills", []))
+
+    # Check if a candidate attended a top school (either top 25 or top 50)
+    is_top_school = any((degree.get("isTop50", False) or degree.get("isTop25", False)) for degree in degrees)
+
+    properties = {
+        "name": d.get("name", ""),
+        "email": d.get("email", ""),
+        "phone": d.get("phone", ""),
+        "location": d.get("location", ""),
+        "submitted_at": parse_submitted_at(d.get("submitted_at")),
+        "work_availability": d.get("work_availability", []),
+        "salary_expectation": salary_expectation,
+        "work_experiences": d.get("work_experiences", []),
+        "current_company": primary_work_experience.get("company", ""),
+        "current_role": primary_work_experience.get("roleName", ""),
+        "education_highest_level": (d.get("education") or {}).get("highest_level", ""),
+        "education_levels": education_levels,
+        "education_degrees": degrees,
+        "primary_degree_subject": primary_degree.get("subject", ""),
+        "primary_degree_school": primary_degree.get("originalSchool", ""),
+        "skills": d.get("skills", []),
+        "skills_text": skills_string,
+        "is_top_school": is_top_school
+    }
+
+    # Typed properties can't hold "" placeholders; leave unknown values unset
+    properties = {key: value for key, value in properties.items() if value is not None}
+    properties["content_hash"] = content_hash(properties)
+    return properties, None
+
+def candidate_key(properties):
+    """
+    Returns the stable identity of a candidate: normalized email plus phone digits.
+
+    Email alone is not unique in the submissions (different people share
+    placeholder addresses), the pair is.
+    """
+    email = (properties.get("email") or "").strip().lower()
+    phone = _NON_DIGITS.sub("", properties.get("phone") or "")
+    return f"{email}|{phone}"
+
+def candidate_uuid(properties):
+    """Returns the deterministic Weaviate object UUID of a candidate."""
+    return str(uuid.uuid5(CANDIDATE_UUID_NAMESPACE, candidate_key(properties)))
+
+def iter_candidates(records):
+    """
+    Yields the candidates a set of raw submissions imports as.
+
+    Applies transform_submission() and the de-duplication of ingest(): invalid
+    records are dropped and the first occurrence of a candidate wins.
+
+    Args:
+        records: Iterable of raw submission dictionaries.
+
+    Yields:
+        (uuid, properties) tuples.
+    """
+    seen = set()
+    for record in records:
+        properties, _ = transform_submission(record)
+        if properties is None:
+            continue
+        object_uuid = candidate_uuid(properties)
+        if object_uuid in seen:
+            continue
+        seen.add(object_uuid)
+        yield object_uuid, properties
+
+def content_hash(properties):
+    """
+    Hashes a candidate's stored properties.
+
+    Any change must reach Weaviate, while unchanged candidates (the vast
+    majority on a refresh) are skipped entirely and cost no embedding calls.
+    """
+    payload = {key: value for key, value in properties.items() if key != "content_hash"}
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+def fetch_existing_hashes(collection):
+    """
+    Reads the UUID and content hash of every object in the collection.
+
+    Args:
+        collection: The Weaviate collection.
+
+    Returns:
+        A dictionary mapping UUID strings to content hashes (None for objects
+        imported before content hashing).
+    """
+    existing = {}
+    for obj in collection.iterator(return_properties=["content_hash"]):
+        existing[str(obj.uuid)] = obj.properties.get("content_hash")
+    return existing
+
+def delete_objects(collection, object_ids):
+    """Deletes objects by UUID in chunks. Returns the number deleted."""
+    from weaviate.classes.query import Filter
+
+    object_ids = list(object_ids)
+    deleted = 0
+    for start in range(0, len(object_ids), _DELETE_CHUNK):
+        chunk = object_ids[start:start + _DELETE_CHUNK]
+        result = collection.data.delete_many(where=Filter.by_id().contains_any(chunk))
+        deleted += result.successful
+        if result.failed:
+            print(f"Failed to delete {result.failed} objects")
+    return deleted
+
+def _transform_chunk(records):
+    return [transform_submission(d) for d in records]
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def transform_parallel(records, workers, chunk_size=256):
+    """
+    Transforms records in a process pool while preserving input order.
+
+    At most two chunks per worker are in flight, so memory stays bounded no
+    matter how many records the input yields.
+
+    Args:
+        records: An iterable of raw submissions.
+        workers: Number of worker processes (1 transforms inline).
+        chunk_size: Records sent to a worker per task.
+
+    Yields:
+        (properties, skip_reason) tuples, see transform_submission().
+    """
+    if workers <= 1:
+        for d in records:
+            yield transform_submission(d)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in _chunked(records, chunk_size):
+            pending.append(executor.submit(_transform_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class IngestionStats:
+    """Counters and throughput for an ingestion run."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.read = 0
+        self.imported = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.skipped = {}
+        self.failed = 0
+        self.retried = 0
+
+    def skip(self, reason):
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def throughput(self):
+        elapsed = self.elapsed()
+        return (self.imported + self.unchanged) / elapsed if elapsed > 0 else 0.0
+
+    def changed(self):
+        return self.imported > 0 or self.deleted > 0
+
+    def as_dict(self):
+        return {
+            "read": self.read,
+            "imported": self.imported,
+            "unchanged": self.unchanged,
+            "deleted": self.deleted,
+            "skipped": dict(self.skipped),
+            "failed": self.failed,
+            "retried": self.retried,
+            "elapsed_seconds": round(self.elapsed(), 2),
+            "objects_per_second": round(self.throughput(), 1),
+        }
+
+def _send(collection, objects, batch_size, concurrent_requests):
+    """
+    Sends (properties, uuid) pairs in one batch context.
+
+    Returns:
+        The batch's failed objects.
+    """
+    with collection.batch.fixed_size(batch_size=batch_size, concurrent_requests=concurrent_requests) as batch:
+        for properties, object_uuid in objects:
+            batch.add_object(properties=properties, uuid=object_uuid)
+    return list(collection.batch.failed_objects)
+
+def ingest(path, collection, batch_size=100, concurrent_requests=2, workers=1,
+           retries=2, progress_every=500, existing_hashes=None, delete_missing=False):
+    """
+    Streams form submissions from `path` into a Weaviate collection.
+
+    Records are parsed incrementally, transformed in a worker pool and sent
+    with a fixed-size batch. Failed objects are retried up to `retries` times.
+
+    Every candidate gets a deterministic UUID (see candidate_uuid), so sending
+    it again replaces the existing object. When `existing_hashes` is given,
+    candidates whose content hash is unchanged are not sent at all, so a
+    refresh costs embeddings proportional to the delta. If the same candidate
+    appears more than once in the source, the first occurrence wins.
+
+    Args:
+        path: Path to form-submissions.json (or any file with the same layout).
+        collection: The Weaviate collection to import into, or None for a dry run.
+        batch_size: Objects per batch request.
+        concurrent_requests: Batch requests in flight at once.
+        workers: Transform worker processes.
+        retries: Attempts for objects that failed to import.
+        progress_every: Print progress every N processed candidates (0 disables).
+        existing_hashes: UUID -> content hash of the objects already in the
+                         collection (see fetch_existing_hashes), or None to send everything.
+        delete_missing: Delete objects in `existing_hashes` that are no longer in the source.
+
+    Returns:
+        An IngestionStats instance.
+    """
+    stats = IngestionStats()
+    seen = set()
+
+    def objects():
+        for properties, reason in transform_parallel(iter_submissions(path), workers):
+            stats.read += 1
+            if properties is None:
+                stats.skip(reason)
+                continue
+
+            object_uuid = candidate_uuid(properties)
+            if object_uuid in seen:
+                stats.skip("duplicate_candidate")
+                continue
+            seen.add(object_uuid)
+
+            if existing_hashes is not None and existing_hashes.get(object_uuid) == properties["content_hash"]:
+                stats.unchanged += 1
+            else:
+                stats.imported += 1
+                yield properties, object_uuid
+
+            processed = stats.imported + stats.unchanged
+            if progress_every and processed % progress_every == 0:
+                print(f"Processed {processed} candidates, {stats.imported} to import ({stats.throughput():.1f}/s)")
+
+    if collection is None:
+        for _ in objects():
+            pass
+        if delete_missing and existing_hashes is not None:
+            stats.deleted = len(set(existing_hashes) - seen)
+        return stats
+
+    failed = _send(collection, objects(), batch_size, concurrent_requests)
+
+    for attempt in range(retries):
+        if not failed:
+            break
+        print(f"Retrying {len(failed)} failed objects (attempt {attempt + 1}/{retries}); first error: {failed[0].message}")
+        stats.retried += len(failed)
+        retry_objects = [(error.object_.properties, error.object_.uuid) for error in failed]
+        failed = _send(collection, retry_objects, batch_size, concurrent_requests)
+
+    stats.failed = len(failed)
+    stats.imported -= len(failed)
+    for error in failed[:5]:
+        print(f"Failed to import {error.object_.uuid}: {error.message}")
+
+    if delete_missing and existing_hashes is not None:
+        missing = set(existing_hashes) - seen
+        if missing:
+            print(f"Deleting {len(missing)} candidates no longer in the source")
+            stats.deleted = delete_objects(collection, missing)
+
+    return stats
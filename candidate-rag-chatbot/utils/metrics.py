@@ -0,0 +1,294 @@
+import time
+import bisect
+import threading
+import contextvars
+
+# In-process metrics for the chat pipeline, exposed at /api/metrics in the
+# Prometheus text format (version 0.0.4). Recording is a lock, a bisect and a
+# few additions, about two microseconds, so the metrics are always on. Every
+# worker process keeps its own values; Prometheus aggregates across workers
+# when each is scraped (or sums them per instance).
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Stage durations of the request being handled ({stage: seconds}), for the
+# slow-query log (utils/slow_query_log.py); None outside a traced request
+current_stages = contextvars.ContextVar("current_stages", default=None)
+
+# Bucket upper bounds in seconds, from sub-millisecond local work to agent calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+RESULT_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base class: a named metric with optional labels, one child per label combination."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, **labels):
+        """Returns the child for one combination of label values (create it on first use)."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _unlabelled(self):
+        return self._children[()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_format_labels(labelnames, key)} {_format_number(self.value)}"]
+
+
+class Counter(_Metric):
+    """A monotonically increasing count."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._unlabelled().inc(amount)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, such as requests in flight."""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount=1):
+        self._unlabelled().dec(amount)
+
+
+class _Timer:
+    """Context manager observing the elapsed time into a histogram child."""
+
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        self._child.observe(elapsed)
+        if self._child.stage is not None:
+            record_stage(self._child.stage, elapsed)
+        return False
+
+
+class _HistogramChild:
+    # Set on pipeline stages, whose timings also go to the current request's stages
+    stage = None
+
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """Times a block: `with histogram.labels(stage="agent_run").time(): ...`"""
+        return _Timer(self)
+
+    def render(self, name, labelnames, key):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = f'le="{_format_number(bound)}"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_number(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, key)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.bucket_bounds = tuple(float(bound) for bound in buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bucket_bounds)
+
+    def observe(self, value):
+        self._unlabelled().observe(value)
+
+    def time(self):
+        return self._unlabelled().time()
+
+
+class Registry:
+    """The set of metrics rendered by /api/metrics."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "chat_stage_duration_seconds",
+    "Time spent in each stage of answering a chat request.",
+    ["stage"],
+))
+REQUEST_SECONDS = registry.register(Histogram(
+    "chat_request_duration_seconds",
+    "End-to-end request time by endpoint, including streaming the response.",
+    ["endpoint"],
+))
+REQUESTS = registry.register(Counter(
+    "chat_requests_total",
+    "Requests handled, by endpoint and HTTP status.",
+    ["endpoint", "status"],
+))
+IN_FLIGHT = registry.register(Gauge(
+    "chat_requests_in_flight",
+    "Requests currently being handled, by endpoint.",
+    ["endpoint"],
+))
+RESPONSES = registry.register(Counter(
+    "chat_responses_total",
+    "Chat answers by the path that produced them (cache, direct, agent, coalesced, degraded).",
+    ["route"],
+))
+CACHE_LOOKUPS = registry.register(Counter(
+    "chat_cache_lookups_total",
+    "Response cache lookups by result (hit or miss).",
+    ["result"],
+))
+ERRORS = registry.register(Counter(
+    "chat_errors_total",
+    "Failed chat requests by endpoint and exception type.",
+    ["endpoint", "type"],
+))
+RESULT_COUNT = registry.register(Histogram(
+    "chat_result_count",
+    "Number of results per successful chat answer.",
+    buckets=RESULT_COUNT_BUCKETS,
+))
+ADMISSION_QUEUE_SECONDS = registry.register(Histogram(
+    "chat_admission_queue_seconds",
+    "Time admitted chat requests waited in the admission queue for a slot, by endpoint.",
+    ["endpoint"],
+))
+ADMISSION_PROCESSING_SECONDS = registry.register(Histogram(
+    "chat_admission_processing_seconds",
+    "Time chat requests held their admission slot (processing, without the queue wait), by endpoint.",
+    ["endpoint"],
+))
+ADMISSION_REJECTED = registry.register(Counter(
+    "chat_admission_rejected_total",
+    "Chat requests shed by admission control, by endpoint and reason.",
+    ["endpoint", "reason"],
+))
+
+def _stage(name):
+    child = STAGE_SECONDS.labels(stage=name)
+    child.stage = name
+    return child
+
+# Pipeline stages, bound once so timing a stage skips the label lookup
+CLIENT_CONNECT = _stage("client_connect")
+AGENT_CONSTRUCTION = _stage("agent_construction")
+AGENT_RUN = _stage("agent_run")
+# A streamed agent call, from the request to the final output
+AGENT_STREAM = _stage("agent_stream")
+# A structured question answered by the query router (or found not to be one)
+ROUTE_QUERY = _stage("route_query")
+FORMAT_RESPONSE = _stage("format_response")
+ENHANCE_RESPONSE = _stage("enhance_response")
+JSON_SERIALIZATION = _stage("json_serialization")
+
+def record_stage(stage, seconds):
+    """Adds a stage duration to the current request's stages, if it is traced."""
+    stages = current_stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+def record_error(endpoint, error):
+    """Counts a failed request under its exception type."""
+    ERRORS.labels(endpoint=endpoint, type=type(error).__name__).inc()
+
+def render_metrics():
+    return registry.render()
@@ -0,0 +1,412 @@
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import random
+import threading
+import contextvars
+from collections import defaultdict
+
+# Import configuration
+from config import (
+    PROFILER_ENABLED,
+    PROFILER_ADMIN_TOKEN,
+    PROFILER_SAMPLE_RATE,
+    PROFILER_INTERVAL_MS,
+    PROFILER_DIR,
+    PROFILER_MAX_PROFILES,
+    PROFILER_MAX_CONCURRENT,
+    PROFILER_MAX_SECONDS,
+)
+
+# Opt-in sampling profiler for single requests, for latency spikes that only
+# show in production. A profile is started for a request that asks for it
+# (PROFILE_HEADER plus the admin token) or for a PROFILER_SAMPLE_RATE share of
+# chat requests, and covers the whole request: routing, the agent call,
+# formatting and serialization, and the body of a streamed response.
+#
+# One background thread samples the stacks of the profiled threads every
+# PROFILER_INTERVAL_MS through sys._current_frames(); nothing is hooked into
+# the profiled code, so a request costs the same whether it is profiled or not
+# apart from the sampler's share of the GIL. Besides the request thread, the
+# upstream pool thread running its agent call and the batch threads answering
+# its questions are sampled (attach_thread()). Each sample charges the time
+# since the previous one to the current stack, as wall-clock time and, where
+# the platform has per-thread CPU clocks, as CPU time, so waiting on the agent
+# and burning CPU in the formatter can be told apart.
+#
+# Finished profiles are written to PROFILER_DIR in the collapsed-stack format
+# read by flamegraph.pl, speedscope and inferno ("frame;frame;frame weight",
+# weights in microseconds), next to a JSON summary. Only the newest
+# PROFILER_MAX_PROFILES are kept.
+
+PROFILE_HEADER = "X-Profile"
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_KINDS = ("wall", "cpu")
+
+# Stacks deeper than this are cut at the root end
+MAX_STACK_DEPTH = 200
+
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+
+
+def admin_authorized(token):
+    """Whether token is the configured admin token; always False when none is configured."""
+    if not PROFILER_ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), PROFILER_ADMIN_TOKEN.encode())
+
+
+def valid_profile_id(profile_id):
+    """Profile ids are generated by this module; anything else (e.g. a path) is rejected."""
+    return bool(profile_id) and all(c.isalnum() or c in "-_" for c in profile_id)
+
+
+class _ThreadState:
+    def __init__(self, label):
+        self.label = label
+        self.last_wall = time.perf_counter()
+        try:
+            # Read in the thread itself, while it is certainly alive
+            self.clock = time.pthread_getcpuclockid(threading.get_ident())
+            self.last_cpu = time.clock_gettime(self.clock)
+        except (AttributeError, OSError):
+            self.clock = None
+            self.last_cpu = None
+
+
+class Profile:
+    """
+    Samples of one request.
+
+    Args:
+        profiler: The SamplingProfiler collecting the samples.
+        endpoint: The Flask view name.
+        method: HTTP method.
+        path: Request path.
+        trigger: "header" or "sampled".
+    """
+
+    def __init__(self, profiler, endpoint, method, path, trigger):
+        self.profiler = profiler
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S')}-{endpoint}-{uuid.uuid4().hex[:8]}"
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.started_at = time.time()
+        self.start_time = time.perf_counter()
+        self.wall = defaultdict(float)
+        self.cpu = defaultdict(float)
+        self.samples = 0
+        self.truncated = False
+        self.cpu_clocks = True
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def attach(self, label):
+        """Samples the calling thread under label until detach()."""
+        state = _ThreadState(label)
+        with self._lock:
+            self._threads[threading.get_ident()] = state
+            self.cpu_clocks = self.cpu_clocks and state.clock is not None
+
+    def detach(self):
+        with self._lock:
+            self._threads.pop(threading.get_ident(), None)
+
+    def sample(self, frames, now):
+        """Charges the time since the last sample to each attached thread's current stack."""
+        with self._lock:
+            threads = list(self._threads.items())
+        for thread_id, state in threads:
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+            stack = self.profiler.collapse(state.label, frame)
+            self.wall[stack] += now - state.last_wall
+            state.last_wall = now
+            if state.clock is not None:
+                try:
+                    cpu = time.clock_gettime(state.clock)
+                except OSError:
+                    continue
+                self.cpu[stack] += cpu - state.last_cpu
+                state.last_cpu = cpu
+            self.samples += 1
+
+    def summary(self, duration, status):
+        return {
+            "id": self.id,
+            "endpoint": self.endpoint,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "trigger": self.trigger,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started_at)),
+            "duration_ms": round(duration * 1000, 1),
+            "interval_ms": self.profiler.interval * 1000,
+            "samples": self.samples,
+            "sampled_wall_ms": round(sum(self.wall.values()) * 1000, 1),
+            "sampled_cpu_ms": round(sum(self.cpu.values()) * 1000, 1) if self.cpu_clocks else None,
+            "truncated": self.truncated,
+            "kinds": [kind for kind in PROFILE_KINDS if kind == "wall" or self.cpu_clocks],
+        }
+
+    def finish(self, status=None):
+        """
+        Stops sampling and writes the profile. Calling it again does nothing.
+
+        Args:
+            status: The HTTP status of the response, if known.
+        """
+        if self._finished:
+            return
+        self._finished = True
+        self.profiler.stop(self)
+        if _current_profile.get() is self:
+            _current_profile.set(None)
+        duration = time.perf_counter() - self.start_time
+        try:
+            self.profiler.save(self, self.summary(duration, status))
+        except OSError as e:
+            print(f"Could not write profile {self.id}: {str(e)}")
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of profiled requests and keeps their profiles on disk.
+
+    Args:
+        directory: Where profiles are written.
+        interval: Seconds between samples.
+        max_profiles: Profiles kept on disk; older ones are deleted.
+        max_concurrent: Requests profiled at once; more are not profiled.
+        max_seconds: Sampling of a request stops after this long (a long stream).
+        sample_rate: Share of eligible requests profiled without being asked.
+        enabled: When False no request is profiled.
+    """
+
+    def __init__(self, directory, interval=0.01, max_profiles=50, max_concurrent=4, max_seconds=120,
+                 sample_rate=0.0, enabled=True):
+        self.directory = os.path.abspath(directory)
+        self.interval = interval
+        self.max_profiles = max_profiles
+        self.max_concurrent = max_concurrent
+        self.max_seconds = max_seconds
+        self.sample_rate = sample_rate
+        self.enabled = enabled
+        self._active = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._labels = {}
+        self.started = 0
+        self.skipped = 0
+
+    def trigger(self, eligible, profile_header, admin_token):
+        """
+        Decides whether to profile a request.
+
+        Args:
+            eligible: Whether the request may be sampled (a chat route).
+            profile_header: Value of the PROFILE_HEADER header, if any.
+            admin_token: Value of the ADMIN_TOKEN_HEADER header, if any.
+
+        Returns:
+            "header", "sampled" or None.
+        """
+        if not self.enabled:
+            return None
+        if profile_header and profile_header.lower() in ("1", "true", "yes") and admin_authorized(admin_token):
+            return "header"
+        if eligible and self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    def start(self, endpoint, method, path, trigger, label="request"):
+        """
+        Starts profiling the calling thread's request.
+
+        Returns:
+            The Profile, or None if max_concurrent requests are already being profiled.
+            Call its finish() when the response has been sent.
+        """
+        profile = Profile(self, endpoint, method, path, trigger)
+        with self._lock:
+            if len(self._active) >= self.max_concurrent:
+                self.skipped += 1
+                return None
+            self._active.append(profile)
+            self.started += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        profile.attach(label)
+        _current_profile.set(profile)
+        return profile
+
+    def stop(self, profile):
+        with self._lock:
+            if profile in self._active:
+                self._active.remove(profile)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._active:
+                    # Started again by the next profile
+                    self._thread = None
+                    return
+                profiles = list(self._active)
+            now = time.perf_counter()
+            frames = sys._current_frames()
+            for profile in profiles:
+                if now - profile.start_time > self.max_seconds:
+                    profile.truncated = True
+                    self.stop(profile)
+                    continue
+                profile.sample(frames, now)
+            del frames
+            time.sleep(self.interval)
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            # "utils/query_router.py:parse_query", without the interpreter's install path
+            path = code.co_filename.replace("\\", "/").split("/")
+            label = f"{'/'.join(path[-2:])}:{code.co_name}".replace(";", ":").replace(" ", "_")
+            self._labels[code] = label
+        return label
+
+    def collapse(self, label, frame):
+        """The collapsed-stack key of a frame: root first, separated by ";"."""
+        names = []
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            names.append(self._label(frame.f_code))
+            frame = frame.f_back
+        names.append(label)
+        return ";".join(reversed(names))
+
+    def file_path(self, profile_id, kind):
+        return os.path.join(self.directory, f"{profile_id}.{kind}.folded" if kind in PROFILE_KINDS else f"{profile_id}.json")
+
+    def save(self, profile, summary):
+        """Writes a finished profile and deletes the oldest ones beyond max_profiles."""
+        os.makedirs(self.directory, exist_ok=True)
+        stacks = {"wall": profile.wall, "cpu": profile.cpu if profile.cpu_clocks else None}
+        for kind, weights in stacks.items():
+            if weights is None:
+                continue
+            with open(self.file_path(profile.id, kind), "w", encoding="utf-8") as f:
+                for stack, seconds in sorted(weights.items(), key=lambda item: -item[1]):
+                    micros = int(seconds * 1_000_000)
+                    if micros > 0:
+                        f.write(f"{stack} {micros}\n")
+        # The summary last: listed profiles are complete
+        with open(self.file_path(profile.id, "json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f)
+        self._enforce_retention()
+
+    def _enforce_retention(self):
+        summaries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    summaries.append((os.path.getmtime(os.path.join(self.directory, name)), name))
+                except FileNotFoundError:
+                    continue
+        summaries.sort()
+        for _, name in summaries[:max(0, len(summaries) - self.max_profiles)]:
+            profile_id = name[:-len(".json")]
+            for kind in PROFILE_KINDS + ("json",):
+                try:
+                    os.remove(self.file_path(profile_id, kind))
+                except FileNotFoundError:
+                    # Not written (no CPU clocks) or removed by another worker
+                    pass
+
+    def list_profiles(self):
+        """Summaries of the profiles on disk, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    profiles.append((os.path.getmtime(path), json.load(f)))
+            except (OSError, ValueError):
+                # Deleted or being written by another worker
+                continue
+        return [profile for _, profile in sorted(profiles, key=lambda item: item[0], reverse=True)]
+
+    def stats(self):
+        with self._lock:
+            active = len(self._active)
+        return {
+            "enabled": self.enabled,
+            "admin_token_configured": bool(PROFILER_ADMIN_TOKEN),
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.interval * 1000,
+            "active": active,
+            "started": self.started,
+            "skipped_concurrency_limit": self.skipped,
+            "max_profiles": self.max_profiles,
+            "directory": self.directory,
+        }
+
+
+profiler = SamplingProfiler(
+    PROFILER_DIR,
+    interval=PROFILER_INTERVAL_MS / 1000,
+    max_profiles=PROFILER_MAX_PROFILES,
+    max_concurrent=PROFILER_MAX_CONCURRENT,
+    max_seconds=PROFILER_MAX_SECONDS,
+    sample_rate=PROFILER_SAMPLE_RATE,
+    enabled=PROFILER_ENABLED,
+)
+
+
+class attach_thread:
+    """
+    Samples the calling thread as part of a request's profile while in the block.
+
+    Args:
+        profile: The request's Profile, or None (nothing is sampled).
+        label: Root frame of the thread's stacks, e.g. "upstream" or "batch".
+    """
+
+    def __init__(self, profile, label):
+        self.profile = profile
+        self.label = label
+        self._token = None
+
+    def __enter__(self):
+        if self.profile is not None:
+            self.profile.attach(self.label)
+            self._token = _current_profile.set(self.profile)
+        return self.profile
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profile is not None:
+            self.profile.detach()
+            # Pooled threads run other requests' work next
+            _current_profile.reset(self._token)
+        return False
+
+
+def current_profile():
+    """The profile of the request being handled in this context, or None."""
+    return _current_profile.get()
+
+
+def run_profiled(function, label="upstream"):
+    """Calls function, sampling this thread as part of the current context's profile if there is one."""
+    with attach_thread(_current_profile.get(), label):
+        return function()
@@ -0,0 +1,55 @@
+# Import configuration
+from config import QUERY_BACKEND
+
+# run_query and its streaming/async variants, dispatched to the configured
+# backend: "weaviate" (the Query Agent), "bm25" (offline, see bm25_backend.py)
+# or "stub" (offline with simulated agent latency, see stub_backend.py).
+# The BM25 backend answers in microseconds, so it runs inline everywhere.
+
+if QUERY_BACKEND == "weaviate":
+    # utils.weaviate_client (and weaviate itself, most of a second) is imported
+    # on the first call, or by the warm-up, so the app starts serving liveness
+    # probes immediately.
+
+    def run_query(query, context=None):
+        from utils.weaviate_client import run_query
+        return run_query(query, context)
+
+    def run_query_stream(query, context=None):
+        from utils.weaviate_client import run_query_stream
+        yield from run_query_stream(query, context)
+
+    async def run_query_async(query, context=None):
+        from utils.weaviate_client import run_query_async
+        return await run_query_async(query, context)
+
+    async def run_query_stream_async(query, context=None):
+        from utils.weaviate_client import run_query_stream_async
+        async for output in run_query_stream_async(query, context):
+            yield output
+elif QUERY_BACKEND == "bm25":
+    from utils.bm25_backend import run_bm25_query as run_query
+
+    def run_query_stream(query, context=None):
+        """Yields the final response only; the BM25 backend has no intermediate output."""
+        yield run_query(query, context)
+
+    async def run_query_async(query, context=None):
+        return run_query(query, context)
+
+    async def run_query_stream_async(query, context=None):
+        yield run_query(query, context)
+elif QUERY_BACKEND == "stub":
+    from utils.stub_backend import StubQueryAgent
+
+    stub_agent = StubQueryAgent()
+    run_query = stub_agent.run
+    run_query_async = stub_agent.run_async
+
+    def run_query_stream(query, context=None):
+        yield run_query(query, context)
+
+    async def run_query_stream_async(query, context=None):
+        yield await run_query_async(query, context)
+else:
+    raise ValueError(f"Unknown QUERY_BACKEND: {QUERY_BACKEND}")
@@ -0,0 +1,722 @@
+import re
+import time
+import threading
+import unicodedata
+from collections import namedtuple
+
+# Import configuration
+from config import CANDIDATE_COLLECTION, QUERY_ROUTER_RESULT_LIMIT, QUERY_ROUTER_MAX_RESULTS, QUERY_ROUTER_DIVERSITY
+from utils.data_version import get_data_version
+from utils.candidate_index import DISPLAY_PROPERTIES
+from utils.diversity import CandidatePool, select_diverse, rank_relevance
+
+# Structured questions ("candidates with a Master's degree", "who knows Docker
+# and AWS", "how many full-time candidates in São Paulo") are answered with a
+# direct filtered query or aggregate against the Candidates collection. Anything
+# the parser cannot fully account for is left to the Query Agent.
+
+# Degree levels, lowest to highest, for "or higher" questions
+DEGREE_RANKS = {
+    "High School Diploma": 0,
+    "Associate's Degree": 1,
+    "Bachelor's Degree": 2,
+    "Master's Degree": 3,
+    "Doctorate": 4,
+    "Juris Doctor (J.D)": 4,
+}
+
+DEGREE_PATTERNS = [
+    (r"\bph\.?\s?d\b\.?|\bdoctorates?\b|\bdoctoral\b", "Doctorate"),
+    (r"\bjuris doctor\b|\bj\.d\b\.?", "Juris Doctor (J.D)"),
+    (r"\bmaster(?:'s|s)?\b|\bmsc\b|\bmba\b", "Master's Degree"),
+    (r"\bbachelor(?:'s|s)?\b|\bbsc\b|\bundergraduate\b", "Bachelor's Degree"),
+    (r"\bassociate(?:'s|s)?\s+degrees?\b", "Associate's Degree"),
+    (r"\bhigh school(?: diplomas?)?\b", "High School Diploma"),
+]
+
+# Common names for skills, mapped to the spelling used in the data
+SKILL_ALIASES = {
+    "aws": "Amazon Web Services",
+    "gcp": "Google Cloud Platform",
+    "google cloud": "Google Cloud Platform",
+    "node": "Node JS",
+    "nodejs": "Node JS",
+    "node.js": "Node JS",
+    "nextjs": "Next JS",
+    "next.js": "Next JS",
+    "nestjs": "Nest JS",
+    "vue": "Vue JS",
+    "vuejs": "Vue JS",
+    "vue.js": "Vue JS",
+    "js": "JavaScript",
+    "ts": "TypeScript",
+    "postgres": "PostgreSQL",
+    "k8s": "Kubernetes",
+    "ml": "Machine Learning",
+    "llm": "Large Language Models (LLMs)",
+    "llms": "Large Language Models (LLMs)",
+    "large language models": "Large Language Models (LLMs)",
+    ".net": "NET",
+    "dotnet": "NET",
+    "fastapi": "Fast API",
+    "html": "HTML/CSS",
+    "css": "HTML/CSS",
+    "rest api": "REST APIs",
+    "rest apis": "REST APIs",
+    "swiftui": "Swift UI",
+    "tailwind": "TailwindCSS",
+    "rails": "Ruby on Rails",
+}
+
+# Skill names that are too ambiguous to spot in free text
+AMBIGUOUS_SKILLS = {"express", "lean"}
+
+# Spellings of the same place, compared after accent folding
+LOCATION_ALIASES = [
+    {"united states", "united states of america", "usa", "us", "u.s.a.", "u.s."},
+    {"brazil", "brasil"},
+]
+
+# Words that carry no meaning of their own in a structured question. If
+# anything else is left after the recognized phrases are removed, the question
+# is treated as open-ended. Negations ("without", "not", "no", "except") must
+# never be filler: dropping one would answer with the opposite set.
+FILLER_WORDS = set("""
+    a an the all any every only also please just currently
+    find show list give get fetch return display search look looking
+    me us i we you our my can could would will should
+    who whom which what whose that those these there their them they it its
+    is are be was were been do does did have has having had hold holds holding
+    with within of in at from on for to by into as
+    and or both either
+    how many much number count total
+    candidate candidates people person applicant applicants profile profiles
+    someone anyone everyone somebody anybody
+    know knows knowing knowledge experience experienced experiences expertise
+    skill skills skilled proficient proficiency familiar familiarity background
+    located location based living live lives
+    available availability work working
+    degree degrees diploma education educated graduated graduate
+    salary salaries expectation expectations expecting expect expects
+    asking ask asks want wants wanting requesting request seeking
+    higher above more better up least
+    backgrounds range set mix
+    sorted ordered ranked order sort
+""".split())
+
+_AMOUNT = r"(\$)?\s*(\d[\d,]*(?:\.\d+)?)\s*(k\b|thousand\b)?"
+
+_SALARY_RANGE = re.compile(r"\bbetween\s+" + _AMOUNT + r"\s*(?:and|to|-)\s*" + _AMOUNT)
+_SALARY_MAX = re.compile(
+    r"\b(?:under|below|less than|at most|no more than|up to|max(?:imum)?(?: of)?)\s+" + _AMOUNT
+)
+_SALARY_MIN = re.compile(
+    r"\b(?:over|above|more than|at least|greater than|min(?:imum)?(?: of)?)\s+" + _AMOUNT
+)
+_TOP_SCHOOL = re.compile(
+    r"\btop[\s-]*(?:\d+)?[\s-]*(?:ranked\s+)?(?:schools?|universit(?:y|ies)|colleges?)\b"
+    r"|\btop[\s-]ranked\b|\b(?:prestigious|elite)\s+(?:schools?|universit(?:y|ies)|colleges?)\b"
+)
+_SORT_PATTERNS = [
+    (re.compile(r"\b(?:highest|largest|biggest|most expensive)\s+salar(?:y|ies)(?:\s+expectations?)?"),
+     "salary_expectation", False, "highest salary expectation"),
+    (re.compile(r"\b(?:lowest|smallest|cheapest)\s+salar(?:y|ies)(?:\s+expectations?)?|\bcheapest\b"),
+     "salary_expectation", True, "lowest salary expectation"),
+    (re.compile(r"\b(?:most recent(?:ly)?|latest|newest)(?:\s+(?:submitted|submissions?|applied|applications?))?"),
+     "submitted_at", False, "most recent submission"),
+]
+_LIMIT = re.compile(r"\b(?:top|first)\s+(\d{1,3})\b")
+_SIZE = re.compile(r"\b(\d{1,3})(?=\s+(?:candidates|people|applicants|profiles)\b)")
+_COUNT = re.compile(r"\bhow many\b|\bnumber of\b|\bcount\b|\btotal\b")
+_DIVERSE = re.compile(r"\b(?:diverse|diversity|varied|variety of|different|mix of)\b(?:\s+(?:set of|range of|backgrounds?|profiles?))?")
+_AVAILABILITY = [
+    (re.compile(r"\bfull[\s-]?time\b"), "full-time"),
+    (re.compile(r"\bpart[\s-]?time\b"), "part-time"),
+]
+_OR_HIGHER = re.compile(r"^\s*(?:degrees?\s+)?(?:or|and)\s+(?:higher|above|up|better)\b")
+_AT_LEAST = re.compile(r"\bat least\s+(?:an?\s+)?$")
+_WORD = re.compile(r"[a-z0-9']+")
+
+def fold(text):
+    """Lowercases text and strips accents so "São Paulo" and "sao paulo" compare equal."""
+    text = text.replace("’", "'")
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+class _NotStructured(Exception):
+    pass
+
+def _lowest_level(levels):
+    return min(levels, key=DEGREE_RANKS.get)
+
+def _display_name(values):
+    # Prefer the longest, accented spelling ("United States" over "US", "São Paulo" over "Sao Paulo")
+    return max(values, key=lambda value: (len(value), sum(ord(c) > 127 for c in value), value))
+
+def _term_pattern(terms):
+    alternatives = "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+    return re.compile(r"(?<![\w#+.])(?:" + alternatives + r")(?![\w#+])")
+
+def _parse_amount(dollar, number, thousands):
+    value = float(number.replace(",", ""))
+    if thousands:
+        value *= 1000
+    # Without "$" or "k", small numbers are more likely years or counts than salaries
+    if not dollar and not thousands and value < 1000:
+        return None
+    return int(value)
+
+
+class Vocabulary:
+    """
+    Skill and location names known to the Candidates collection, used to spot
+    them in free-text questions.
+
+    Args:
+        skills: Iterable of skill names as stored.
+        locations: Iterable of location values as stored.
+    """
+
+    def __init__(self, skills, locations):
+        self.skills = {}
+        for skill in skills:
+            term = fold(skill)
+            if len(term) > 1 and term not in AMBIGUOUS_SKILLS:
+                self.skills[term] = skill
+        for alias, skill in SKILL_ALIASES.items():
+            if fold(skill) in self.skills and alias not in self.skills:
+                self.skills[alias] = skill
+
+        by_term = {}
+        for location in locations:
+            by_term.setdefault(fold(location), set()).add(location)
+        for group in LOCATION_ALIASES:
+            values = set().union(*(by_term.get(term, ()) for term in group))
+            if values:
+                for term in group:
+                    by_term[term] = values
+        self.locations = {term: values for term, values in by_term.items() if len(term) > 2}
+
+        # Two-letter names ("US") are also ordinary words ("show us"), so they
+        # only count as locations after "in" or "from". Aliases without any
+        # candidate are kept (with no values) so such questions aren't
+        # answered as if the place hadn't been mentioned.
+        self.short_locations = {term: values for term, values in by_term.items() if len(term) <= 2}
+        for group in LOCATION_ALIASES:
+            for term in group:
+                if len(term) <= 2:
+                    self.short_locations.setdefault(term, set())
+
+        self.skill_pattern = _term_pattern(self.skills) if self.skills else None
+        self.location_pattern = _term_pattern(self.locations) if self.locations else None
+        self.short_location_pattern = None
+        if self.short_locations:
+            alternatives = "|".join(re.escape(term) for term in sorted(self.short_locations))
+            self.short_location_pattern = re.compile(
+                r"\b(?:in|from)\s+(?:the\s+)?(" + alternatives + r")(?![\w#+])"
+            )
+            # Written in capitals ("US-based") it is a location wherever it stands
+            self.capitalized_short_location = re.compile(
+                r"(?<![\w.])(?:" + "|".join(re.escape(term.upper()) for term in self.short_locations) + r")(?![\w])"
+            )
+
+
+QueryPlan = namedtuple("QueryPlan", "predicates sort_by ascending sort_label limit count diverse description")
+DirectSource = namedtuple("DirectSource", "object_id collection")
+
+
+class DirectQueryResponse:
+    """
+    Answer produced without the Query Agent (by the router or an offline
+    backend), shaped like a QueryAgent response so the formatter, cache and
+    conversation store handle it the same way.
+    """
+
+    output_type = "final_state"
+
+    def __init__(self, original_query, final_answer, searches, aggregations, sources, total_time,
+                 is_partial_answer=False, missing_information=None):
+        self.original_query = original_query
+        self.collection_names = [CANDIDATE_COLLECTION]
+        self.final_answer = final_answer
+        self.searches = searches
+        self.aggregations = aggregations
+        self.sources = sources
+        self.total_time = total_time
+        self.usage = None
+        self.is_partial_answer = is_partial_answer
+        self.missing_information = missing_information or []
+
+
+class _Parser:
+    """Removes recognized phrases from a folded question one extractor at a time."""
+
+    def __init__(self, text):
+        self.text = text
+
+    def take(self, pattern, handler):
+        def replace(match):
+            handler(match)
+            return " "
+        self.text = pattern.sub(replace, self.text)
+
+    def leftover_words(self):
+        return [word for word in _WORD.findall(self.text) if word not in FILLER_WORDS]
+
+def parse_query(message, vocabulary, default_limit=QUERY_ROUTER_RESULT_LIMIT):
+    """
+    Recognizes a structured candidate question.
+
+    Args:
+        message: The user's chat message.
+        vocabulary: A Vocabulary of known skills and locations.
+        default_limit: How many candidates to list when the question doesn't say.
+
+    Returns:
+        A QueryPlan, or None if the question needs the Query Agent.
+    """
+    parser = _Parser(fold(message))
+    description = []
+
+    # Salary bounds
+    salary_min = []
+    salary_max = []
+
+    def on_range(match):
+        low = _parse_amount(*match.group(1, 2, 3))
+        high = _parse_amount(*match.group(4, 5, 6))
+        if low is None or high is None:
+            raise _NotStructured()
+        salary_min.append(low)
+        salary_max.append(high)
+
+    def on_bound(target):
+        def handler(match):
+            amount = _parse_amount(*match.group(1, 2, 3))
+            if amount is None:
+                raise _NotStructured()
+            target.append(amount)
+        return handler
+
+    sort = []
+    limit = []
+    count = []
+    availability = []
+    levels = set()
+    or_higher = []
+    skills = []
+    skill_spans = []
+    skill_text = ""
+    locations = []
+
+    try:
+        parser.take(_SALARY_RANGE, on_range)
+        parser.take(_SALARY_MAX, on_bound(salary_max))
+        parser.take(_SALARY_MIN, on_bound(salary_min))
+    except _NotStructured:
+        return None
+
+    top_school = []
+    parser.take(_TOP_SCHOOL, lambda match: top_school.append(True))
+
+    for pattern, prop, ascending, label in _SORT_PATTERNS:
+        parser.take(pattern, lambda match, s=(prop, ascending, label): sort.append(s))
+    if len(sort) > 1:
+        return None
+    diverse = []
+    parser.take(_DIVERSE, lambda match: diverse.append(True))
+    if sort or diverse:
+        parser.take(_LIMIT, lambda match: limit.append(int(match.group(1))))
+    if diverse and not limit:
+        parser.take(_SIZE, lambda match: limit.append(int(match.group(1))))
+
+    parser.take(_COUNT, lambda match: count.append(True))
+
+    for pattern, value in _AVAILABILITY:
+        parser.take(pattern, lambda match, v=value: availability.append(v))
+
+    for pattern, level in DEGREE_PATTERNS:
+        def on_degree(match, level=level):
+            levels.add(level)
+            rest = match.string[match.end():]
+            before = match.string[:match.start()]
+            if _OR_HIGHER.match(rest) or _AT_LEAST.search(before):
+                or_higher.append(True)
+        parser.take(re.compile(pattern), on_degree)
+
+    if vocabulary.skill_pattern:
+        def on_skill(match):
+            skill = vocabulary.skills[match.group(0)]
+            if skill not in skills:
+                skills.append(skill)
+            skill_spans.append(match.span())
+        # Spans are recorded on the text before removal to tell "and" from "or"
+        skill_text = parser.text
+        parser.take(vocabulary.skill_pattern, on_skill)
+
+    if vocabulary.location_pattern:
+        def on_location(match):
+            values = vocabulary.locations[match.group(0)]
+            if values not in [entry[1] for entry in locations]:
+                locations.append((match.group(0), values))
+        parser.take(vocabulary.location_pattern, on_location)
+
+    if vocabulary.short_location_pattern:
+        short_matches = []
+
+        def on_short_location(match):
+            term = match.group(1)
+            values = vocabulary.short_locations[term]
+            short_matches.append(term)
+            if not values:
+                # No candidate there, or not a place we know the spellings of
+                raise _NotStructured()
+            if values not in [entry[1] for entry in locations]:
+                locations.append((term, values))
+        try:
+            parser.take(vocabulary.short_location_pattern, on_short_location)
+        except _NotStructured:
+            return None
+        # A capitalized "US" none of the patterns took would be dropped as filler
+        if len(vocabulary.capitalized_short_location.findall(message)) > len(short_matches):
+            return None
+
+    if parser.leftover_words():
+        return None
+
+    # Predicates in the keyword form of CandidateIndex.mask()
+    predicates = {}
+    if levels:
+        if or_higher:
+            lowest = min(DEGREE_RANKS[level] for level in levels)
+            levels = {level for level, rank in DEGREE_RANKS.items() if rank >= lowest}
+            description.append(f"with a {_lowest_level(levels)} or higher")
+        else:
+            description.append("with a " + " or ".join(sorted(levels, key=DEGREE_RANKS.get)))
+        predicates["levels"] = sorted(levels)
+
+    if skills:
+        between = skill_text[skill_spans[0][1]:skill_spans[-1][0]] if len(skill_spans) > 1 else ""
+        if re.search(r"\bor\b", between):
+            predicates["skills_any"] = skills
+            description.append("with skills in " + " or ".join(skills))
+        else:
+            predicates["skills_all"] = skills
+            description.append("with skills in " + " and ".join(skills))
+
+    if locations:
+        predicates["locations"] = sorted(set().union(*(entry[1] for entry in locations)))
+        description.append("located in " + " or ".join(sorted({_display_name(entry[1]) for entry in locations})))
+
+    if availability:
+        predicates["availability"] = availability
+        description.append("available " + " or ".join(availability))
+
+    if salary_min:
+        predicates["salary_min"] = max(salary_min)
+        description.append(f"expecting at least ${max(salary_min):,}")
+    if salary_max:
+        predicates["salary_max"] = min(salary_max)
+        description.append(f"expecting at most ${min(salary_max):,}")
+
+    if top_school:
+        predicates["top_school"] = True
+        description.append("from a top-ranked school")
+
+    # Nothing recognized besides filler words: not a structured question
+    if not (predicates or sort or count or diverse):
+        return None
+
+    sort_by, ascending, sort_label = sort[0] if sort else ("submitted_at", False, None)
+    return QueryPlan(
+        predicates=predicates,
+        sort_by=sort_by,
+        ascending=ascending,
+        sort_label=sort_label,
+        limit=min(limit[0] if limit else default_limit, QUERY_ROUTER_MAX_RESULTS),
+        count=bool(count),
+        diverse=bool(diverse),
+        description=", ".join(description),
+    )
+
+def weaviate_filters(predicates):
+    """
+    Converts plan predicates into a Weaviate filter.
+
+    Args:
+        predicates: A dictionary in the keyword form of CandidateIndex.mask().
+
+    Returns:
+        A Weaviate filter, or None when there are no predicates.
+    """
+    # Imported on first use, like every weaviate import on the request path (see warmup.py)
+    from weaviate.classes.query import Filter
+
+    filters = []
+    if "levels" in predicates:
+        filters.append(Filter.by_property("education_levels").contains_any(predicates["levels"]))
+    if "skills_all" in predicates:
+        filters.append(Filter.by_property("skills").contains_all(predicates["skills_all"]))
+    if "skills_any" in predicates:
+        filters.append(Filter.by_property("skills").contains_any(predicates["skills_any"]))
+    if "locations" in predicates:
+        location_filters = [Filter.by_property("location").equal(value) for value in predicates["locations"]]
+        filters.append(location_filters[0] if len(location_filters) == 1 else Filter.any_of(location_filters))
+    if "availability" in predicates:
+        filters.append(Filter.by_property("work_availability").contains_any(predicates["availability"]))
+    if "salary_min" in predicates:
+        filters.append(Filter.by_property("salary_expectation").greater_or_equal(predicates["salary_min"]))
+    if "salary_max" in predicates:
+        filters.append(Filter.by_property("salary_expectation").less_or_equal(predicates["salary_max"]))
+    if "top_school" in predicates:
+        filters.append(Filter.by_property("is_top_school").equal(predicates["top_school"]))
+
+    if not filters:
+        return None
+    return filters[0] if len(filters) == 1 else Filter.all_of(filters)
+
+def format_candidate(index, properties):
+    """Formats one numbered candidate profile using the markers the response enhancer styles."""
+    lines = [f"{index}. Name: {properties.get('name') or 'Unknown'}"]
+    if properties.get("email"):
+        lines.append(f"Email: {properties['email']}")
+    if properties.get("location"):
+        lines.append(f"Location: {properties['location']}")
+    if properties.get("current_role"):
+        lines.append(f"Current role: {properties['current_role']}")
+    if properties.get("current_company"):
+        lines.append(f"Current company: {properties['current_company']}")
+    if properties.get("skills"):
+        lines.append(f"Skills: {', '.join(properties['skills'])}")
+    if properties.get("education_highest_level"):
+        lines.append(f"Education: {properties['education_highest_level']}")
+    if properties.get("salary_expectation") is not None:
+        lines.append(f"Salary expectation: ${properties['salary_expectation']:,}")
+    return "\n".join(lines)
+
+def _build_response(message, plan, total, candidates, start_time):
+    """
+    Writes the answer for an executed plan.
+
+    Args:
+        message: The original chat message.
+        plan: The executed QueryPlan.
+        total: Number of matching candidates.
+        candidates: List of (uuid, properties) to show, in order.
+        start_time: perf_counter() value when execution started.
+
+    Returns:
+        A DirectQueryResponse.
+    """
+    matching = f" {plan.description}" if plan.description else ""
+    aggregation = {"metric": "total_count", "value": total}
+
+    if plan.count:
+        noun = "candidate" if total == 1 else "candidates"
+        answer = f"There {'is' if total == 1 else 'are'} {total} {noun}{matching}."
+        return DirectQueryResponse(message, answer, [], [aggregation], [], time.perf_counter() - start_time)
+
+    if total == 0:
+        answer = f"I couldn't find any candidates{matching}."
+        return DirectQueryResponse(message, answer, [], [aggregation], [], time.perf_counter() - start_time)
+
+    shown = len(candidates)
+    order = f", by {plan.sort_label}" if plan.sort_label else ""
+    if plan.diverse:
+        order += ", chosen for a mix of locations, schools, companies and skills"
+    header = f"Found {total} candidate{'s' if total != 1 else ''}{matching}."
+    if shown < total:
+        header += f" Here are {shown}{order}:"
+    elif plan.sort_label:
+        header += f" Sorted by {plan.sort_label}:"
+    paragraphs = [header] + [
+        format_candidate(index, properties) for index, (_, properties) in enumerate(candidates, start=1)
+    ]
+
+    searches = [[{"object_id": object_id, **properties} for object_id, properties in candidates]]
+    sources = [DirectSource(object_id, CANDIDATE_COLLECTION) for object_id, _ in candidates]
+    return DirectQueryResponse(
+        message, "\n\n".join(paragraphs), searches, [aggregation], sources, time.perf_counter() - start_time
+    )
+
+def execute_plan(collection, message, plan):
+    """
+    Runs a QueryPlan against the Candidates collection.
+
+    Args:
+        collection: The Candidates collection.
+        message: The original chat message.
+        plan: A QueryPlan from parse_query().
+
+    Returns:
+        A DirectQueryResponse.
+    """
+    from weaviate.classes.query import Sort
+
+    start_time = time.perf_counter()
+    filters = weaviate_filters(plan.predicates)
+
+    total = collection.aggregate.over_all(total_count=True, filters=filters).total_count
+    candidates = []
+    if total and not plan.count:
+        result = collection.query.fetch_objects(
+            filters=filters,
+            sort=Sort.by_property(plan.sort_by, ascending=plan.ascending),
+            limit=plan.limit,
+            return_properties=DISPLAY_PROPERTIES,
+        )
+        candidates = [(str(obj.uuid), obj.properties) for obj in result.objects]
+
+    return _build_response(message, plan, total, candidates, start_time)
+
+def execute_plan_locally(index, message, plan):
+    """
+    Runs a QueryPlan against the in-process CandidateIndex, without a network round trip.
+
+    Args:
+        index: A CandidateIndex.
+        message: The original chat message.
+        plan: A QueryPlan from parse_query().
+
+    Returns:
+        A DirectQueryResponse.
+    """
+    start_time = time.perf_counter()
+
+    if plan.count:
+        return _build_response(message, plan, index.count(**plan.predicates), [], start_time)
+
+    if plan.diverse:
+        # Rank the whole matching pool, then pick a diverse top-K from it
+        result = index.search(sort_by=plan.sort_by, ascending=plan.ascending, **plan.predicates)
+        pool = CandidatePool(index, result.rows)
+        picks = select_diverse(pool, rank_relevance(pool.size), plan.limit, QUERY_ROUTER_DIVERSITY)
+        candidates = [(result.ids[pick], index.properties(result.rows[pick])) for pick in picks]
+        return _build_response(message, plan, result.total, candidates, start_time)
+
+    result = index.search(sort_by=plan.sort_by, ascending=plan.ascending, limit=plan.limit, **plan.predicates)
+    candidates = [(object_id, index.properties(row)) for object_id, row in zip(result.ids, result.rows)]
+    return _build_response(message, plan, result.total, candidates, start_time)
+
+def load_vocabulary(collection):
+    """
+    Reads every skill and location value from the Candidates collection.
+
+    Args:
+        collection: The Candidates collection.
+
+    Returns:
+        A Vocabulary.
+    """
+    skills = set()
+    locations = set()
+    for obj in collection.iterator(return_properties=["skills", "location"]):
+        skills.update(obj.properties.get("skills") or [])
+        if obj.properties.get("location"):
+            locations.add(obj.properties["location"])
+    return Vocabulary(skills, locations)
+
+
+class QueryRouter:
+    """
+    Answers structured questions directly and leaves the rest to the Query Agent.
+
+    Plans run on the local CandidateIndex when one is available, otherwise as
+    filtered queries against Weaviate. The vocabulary comes from the same
+    place and is reloaded when the Candidates data changes.
+
+    Args:
+        get_collection: Callable returning the Candidates collection.
+        get_index: Optional callable returning the local CandidateIndex or None.
+    """
+
+    def __init__(self, get_collection, get_index=None):
+        self.get_collection = get_collection
+        self.get_index = get_index or (lambda: None)
+        self._vocabulary = None
+        self._vocabulary_source = None
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.local_answers = 0
+        self.remote_answers = 0
+
+    def vocabulary(self, index=None):
+        # Keyed by the index object, or the data version when reading from Weaviate
+        source = index if index is not None else get_data_version()
+        if self._vocabulary is None or self._vocabulary_source is not source:
+            with self._lock:
+                if self._vocabulary is None or self._vocabulary_source is not source:
+                    try:
+                        if index is not None:
+                            self._vocabulary = Vocabulary(index.skills(), index.locations())
+                        else:
+                            self._vocabulary = load_vocabulary(self.get_collection())
+                    except Exception as e:
+                        print(f"Note: Could not load router vocabulary: {e}")
+                        # Keep routing skill- and location-free questions meanwhile
+                        self._vocabulary = self._vocabulary or Vocabulary([], [])
+                    self._vocabulary_source = source
+        return self._vocabulary
+
+    def answer(self, message):
+        """
+        Answers a message directly if it is a structured question.
+
+        Args:
+            message: The user's chat message.
+
+        Returns:
+            A DirectQueryResponse, or None if the Query Agent should answer.
+        """
+        index = self.get_index()
+        plan = parse_query(message, self.vocabulary(index))
+        # Diversity selection needs the local index's facets
+        if plan is None or (plan.diverse and index is None):
+            return None
+        try:
+            if index is not None:
+                response = execute_plan_locally(index, message, plan)
+                self.local_answers += 1
+            else:
+                response = execute_plan(self.get_collection(), message, plan)
+                self.remote_answers += 1
+            return response
+        except Exception as e:
+            # A failed direct query is not fatal: the agent can still answer
+            print(f"Direct query failed, falling back to the Query Agent: {e}")
+            self.failures += 1
+            return None
+
+    def stats(self):
+        vocabulary = self._vocabulary
+        return {
+            "direct_failures": self.failures,
+            "local_answers": self.local_answers,
+            "weaviate_answers": self.remote_answers,
+            "known_skills": len(set(vocabulary.skills.values())) if vocabulary else 0,
+            "known_locations": len(set().union(*vocabulary.locations.values())) if vocabulary and vocabulary.locations else 0,
+        }
+
+
+class RouteStats:
+    """Counts which path (cache, direct, agent or coalesced) answered each chat request."""
+
+    ROUTES = ("cache", "direct", "agent", "coalesced", "degraded")
+
+    def __init__(self):
+        self._counts = dict.fromkeys(self.ROUTES, 0)
+        self._lock = threading.Lock()
+
+    def record(self, route):
+        with self._lock:
+            self._counts[route] = self._counts.get(route, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        return {
+            "requests": total,
+            "routes": counts,
+            "direct_share": round(counts["direct"] / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,285 @@
+import re
+import json
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Import configuration
+from config import (
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_BACKEND,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_PATH,
+)
+from utils.data_version import get_data_version
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_message(message):
+    """Lowercases, collapses whitespace and drops trailing punctuation so trivial variants share a key."""
+    return _WHITESPACE.sub(" ", message.strip().lower()).rstrip("?!. ")
+
+def hash_context(context):
+    """
+    Returns a stable hash of a follow-up context (or "" when there is none).
+
+    Args:
+        context: A previous QueryAgent response, a plain dict, or None.
+    """
+    if context is None:
+        return ""
+    if hasattr(context, "model_dump_json"):
+        encoded = context.model_dump_json()
+    else:
+        encoded = json.dumps(context, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def make_cache_key(message, context=None):
+    """
+    Builds the cache key for a chat message and its conversation context.
+
+    Args:
+        message: The user's chat message.
+        context: Optional previous response passed to the agent for follow-ups.
+
+    Returns:
+        A hex digest string.
+    """
+    raw = f"{normalize_message(message)}\x00{hash_context(context)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with per-entry TTL."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    On-disk LRU/TTL cache shared by every worker process on the host.
+
+    Entries are pickled QueryAgent responses. Each thread keeps its own
+    connection; WAL mode lets readers proceed while another worker writes.
+    """
+
+    def __init__(self, path, max_entries, ttl):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self.evictions = 0
+        self.expirations = 0
+        self._connection().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS response_cache_last_access
+                ON response_cache (last_access);
+            """
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        now = time.time()
+        if expires_at <= now:
+            conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            self.expirations += 1
+            return None
+        conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+        return pickle.loads(value)
+
+    def set(self, key, value):
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, pickle.dumps(value), now + self.ttl, now),
+        )
+        overflow = conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM response_cache WHERE key IN "
+                "(SELECT key FROM response_cache ORDER BY last_access LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def clear(self):
+        self._connection().execute("DELETE FROM response_cache")
+
+    def size(self):
+        return self._connection().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+class ResponseCache:
+    """
+    Cache of QueryAgent responses in front of run_query.
+
+    Keys combine the normalized message with a hash of the conversation context.
+    The whole cache is dropped when the Candidates data version changes, i.e.
+    after a re-ingestion.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Loaded on first use, so creating the cache never touches Weaviate
+        self._data_version = None
+        self._lock = threading.Lock()
+
+    def _check_data_version(self):
+        version = get_data_version()
+        if version != self._data_version:
+            with self._lock:
+                if self._data_version is None:
+                    self._data_version = version
+                elif version != self._data_version:
+                    print(f"Candidates data version changed to {version}, clearing response cache")
+                    self.backend.clear()
+                    self._data_version = version
+                    self.invalidations += 1
+
+    def _key(self, message, context):
+        # Prefixing the data version keeps a worker that hasn't noticed a
+        # re-ingestion yet from writing stale entries other workers would read
+        return f"{self._data_version}:{make_cache_key(message, context)}"
+
+    def get(self, message, context=None):
+        """
+        Looks up a cached agent response.
+
+        Args:
+            message: The user's chat message.
+            context: The conversation context that would be passed to the agent.
+
+        Returns:
+            The cached response, or None on a miss.
+        """
+        self._check_data_version()
+        try:
+            value = self.backend.get(self._key(message, context))
+        except Exception as e:
+            print(f"Response cache read failed: {e}")
+            value = None
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, message, context, agent_response):
+        """
+        Stores an agent response. Empty answers are not cached.
+
+        Args:
+            message: The user's chat message.
+            context: The conversation context that was passed to the agent.
+            agent_response: The response returned by run_query.
+        """
+        if not getattr(agent_response, "final_answer", None):
+            return
+        self._check_data_version()
+        try:
+            self.backend.set(self._key(message, context), agent_response)
+        except Exception as e:
+            print(f"Response cache write failed: {e}")
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": self.backend.size(),
+            "max_entries": self.backend.max_entries,
+            "ttl_seconds": self.backend.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.backend.evictions,
+            "expirations": self.backend.expirations,
+            "invalidations": self.invalidations,
+            "data_version": self._data_version,
+        }
+
+def create_response_cache():
+    """
+    Builds the response cache configured in config.py.
+
+    Returns:
+        A ResponseCache, or None when caching is disabled.
+    """
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+
+    if RESPONSE_CACHE_BACKEND == "sqlite":
+        backend = SQLiteCacheBackend(RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL)
+    elif RESPONSE_CACHE_BACKEND == "memory":
+        backend = MemoryCacheBackend(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL)
+    else:
+        raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND: {RESPONSE_CACHE_BACKEND}")
+
+    return ResponseCache(backend)
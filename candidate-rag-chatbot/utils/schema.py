@@ -0,0 +1,345 @@
+import json
+import uuid
+import hashlib
+from weaviate.classes.config import Configure, Property, DataType, Tokenization
+
+# Import configuration
+from config import CANDIDATE_COLLECTION, CANDIDATE_COLLECTION_DESCRIPTION, SCHEMA_VERSION_COLLECTION
+
+# Bump whenever the collection definition below changes
+SCHEMA_VERSION = 3
+
+# The applied schema version is stored as the one object of SCHEMA_VERSION_COLLECTION
+_SCHEMA_UUID = uuid.uuid5(uuid.NAMESPACE_URL, "candidate-rag-chatbot/schema-version")
+
+# Property fields compared between the declared and the live schema. None of
+# them can be changed on an existing property.
+_SIGNATURE_FIELDS = (
+    "data_type",
+    "tokenization",
+    "range_filters",
+    "filterable",
+    "searchable",
+    "skip_vectorization",
+    "nested",
+)
+
+def _text(name, description=None):
+    return Property(name=name, data_type=DataType.TEXT, description=description)
+
+def _contact(name, description):
+    # Filterable for exact lookups, but never embedded or keyword-searched
+    return Property(
+        name=name,
+        data_type=DataType.TEXT,
+        description=description,
+        skip_vectorization=True,
+        vectorize_property_name=False,
+        index_searchable=False,
+        tokenization=Tokenization.FIELD,
+    )
+
+def _keyword_array(name, description):
+    # Whole-value tokens, so filters like ContainsAll(["Docker", "AWS"]) are exact matches
+    return Property(
+        name=name,
+        data_type=DataType.TEXT_ARRAY,
+        description=description,
+        index_filterable=True,
+        tokenization=Tokenization.FIELD,
+    )
+
+# Canonical definition of the Candidates collection. Structured attributes are
+# typed so salary, date and keyword questions become filter/sort operations
+# instead of semantic search, and contact details are kept out of the vectors.
+# Changing a property's type or tokenization requires recreating the
+# collection (python bootstrap_schema.py --recreate) and a full re-import.
+CANDIDATE_PROPERTIES = [
+    _text("name", "Candidate's full name"),
+    _contact("email", "Contact email address"),
+    _contact("phone", "Contact phone number"),
+    _text("location", "Geographic location"),
+    Property(
+        name="submitted_at",
+        data_type=DataType.DATE,
+        description="Timestamp of application submission",
+        index_range_filters=True,
+    ),
+    _keyword_array("work_availability", "Availability options (full-time, part-time)"),
+    Property(
+        name="salary_expectation",
+        data_type=DataType.INT,
+        description="Expected full-time annual salary in US dollars",
+        index_range_filters=True,
+    ),
+    Property(
+        name="work_experiences",
+        data_type=DataType.OBJECT_ARRAY,
+        description="Work experience entries, most recent first",
+        nested_properties=[
+            _text("company"),
+            _text("roleName"),
+        ],
+    ),
+    _text("current_company", "Current/most recent employer"),
+    _text("current_role", "Current/most recent job title"),
+    Property(
+        name="education_highest_level",
+        data_type=DataType.TEXT,
+        description="Highest degree obtained",
+        tokenization=Tokenization.FIELD,
+    ),
+    _keyword_array("education_levels", "Every degree level the candidate holds"),
+    Property(
+        name="education_degrees",
+        data_type=DataType.OBJECT_ARRAY,
+        description="Education degree entries",
+        nested_properties=[
+            _text("degree"),
+            _text("subject"),
+            _text("school"),
+            _text("gpa"),
+            _text("startDate"),
+            _text("endDate"),
+            _text("originalSchool"),
+            Property(name="isTop50", data_type=DataType.BOOL),
+            Property(name="isTop25", data_type=DataType.BOOL),
+        ],
+    ),
+    _text("primary_degree_subject", "Field of study for primary degree"),
+    _text("primary_degree_school", "Institution name for primary degree"),
+    _keyword_array("skills", "Candidate skills"),
+    _text("skills_text", "Comma-separated string of skills"),
+    Property(name="is_top_school", data_type=DataType.BOOL, description="Attended a top-ranked school"),
+    # Bookkeeping for delta ingestion; never embedded or searched
+    Property(
+        name="content_hash",
+        data_type=DataType.TEXT,
+        description="Hash of the candidate's properties at import time",
+        skip_vectorization=True,
+        vectorize_property_name=False,
+        index_searchable=False,
+    ),
+]
+
+def _data_type_name(data_type):
+    return data_type.value if hasattr(data_type, "value") else str(data_type)
+
+def _attr(prop, name, create_name):
+    # Desired properties are create models (camelCase fields), live ones are
+    # config dataclasses (snake_case fields)
+    if hasattr(prop, create_name):
+        return getattr(prop, create_name)
+    return getattr(prop, name, None)
+
+def _skip_vectorization(prop):
+    if hasattr(prop, "skip_vectorization"):
+        return bool(prop.skip_vectorization)
+    # Live properties carry it in their module config; absent without a vectorizer
+    vectorizer_config = getattr(prop, "vectorizer_config", None)
+    return bool(vectorizer_config.skip) if vectorizer_config is not None else False
+
+def _property_signature(prop, nested_property=False):
+    """Reduces a desired or live property to the fields we manage, in a comparable form."""
+    nested = _attr(prop, "nested_properties", "nestedProperties") or []
+    if not isinstance(nested, list):
+        nested = [nested]
+    data_type = _data_type_name(_attr(prop, "data_type", "dataType"))
+    is_text = data_type in ("text", "text[]")
+    tokenization = _attr(prop, "tokenization", "tokenization")
+    if tokenization is None and is_text:
+        # Server default for text properties
+        tokenization = Tokenization.WORD
+    # Unset index flags take the server defaults: filterable always, searchable for text
+    filterable = _attr(prop, "index_filterable", "indexFilterable")
+    searchable = _attr(prop, "index_searchable", "indexSearchable")
+    return {
+        "name": prop.name,
+        "data_type": data_type,
+        "tokenization": tokenization.value if tokenization is not None else None,
+        "range_filters": bool(_attr(prop, "index_range_filters", "indexRangeFilters")),
+        "filterable": True if filterable is None else bool(filterable),
+        "searchable": is_text if searchable is None else bool(searchable) and is_text,
+        # Nested properties are vectorized as part of their parent
+        "skip_vectorization": False if nested_property else _skip_vectorization(prop),
+        "nested": sorted(
+            (_property_signature(n, nested_property=True) for n in nested),
+            key=lambda n: n["name"],
+        ),
+    }
+
+def _fingerprint(description, properties):
+    payload = {
+        "description": (description or "").strip(),
+        "properties": sorted(
+            (_property_signature(p) for p in properties),
+            key=lambda p: p["name"],
+        ),
+    }
+    encoded = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+def desired_schema_hash():
+    """Returns the hash of the collection definition declared in this module."""
+    return _fingerprint(CANDIDATE_COLLECTION_DESCRIPTION, CANDIDATE_PROPERTIES)
+
+def live_schema_hash(collection_config):
+    """
+    Returns the hash of a live collection's configuration.
+
+    Args:
+        collection_config: The result of collection.config.get().
+    """
+    return _fingerprint(collection_config.description, collection_config.properties)
+
+def _schema_version_collection(client, create=False):
+    if not client.collections.exists(SCHEMA_VERSION_COLLECTION):
+        if not create:
+            return None
+        client.collections.create(
+            SCHEMA_VERSION_COLLECTION,
+            description=f"Schema version and hash last applied to {CANDIDATE_COLLECTION} by bootstrap_schema.py",
+            vectorizer_config=Configure.Vectorizer.none(),
+            properties=[
+                Property(name="schema_version", data_type=DataType.INT),
+                Property(name="schema_hash", data_type=DataType.TEXT, skip_vectorization=True, index_searchable=False),
+            ],
+        )
+    return client.collections.get(SCHEMA_VERSION_COLLECTION)
+
+def stored_schema_version(client):
+    """
+    Returns the schema version and hash recorded with the Candidates collection.
+
+    Args:
+        client: A connected Weaviate client.
+
+    Returns:
+        A (schema_version, schema_hash) tuple, (None, None) if nothing was recorded.
+    """
+    collection = _schema_version_collection(client)
+    obj = collection.query.fetch_object_by_id(_SCHEMA_UUID) if collection is not None else None
+    if obj is None:
+        return None, None
+    return obj.properties.get("schema_version"), obj.properties.get("schema_hash")
+
+def record_schema_version(client):
+    """Records SCHEMA_VERSION and the desired schema hash as applied to the Candidates collection."""
+    collection = _schema_version_collection(client, create=True)
+    properties = {"schema_version": SCHEMA_VERSION, "schema_hash": desired_schema_hash()}
+    if collection.data.exists(_SCHEMA_UUID):
+        collection.data.replace(uuid=_SCHEMA_UUID, properties=properties)
+    else:
+        collection.data.insert(properties=properties, uuid=_SCHEMA_UUID)
+
+def create_collection(client):
+    """Creates the Candidates collection from CANDIDATE_PROPERTIES."""
+    return client.collections.create(
+        name=CANDIDATE_COLLECTION,
+        description=CANDIDATE_COLLECTION_DESCRIPTION,
+        vectorizer_config=Configure.Vectorizer.text2vec_openai(),
+        generative_config=Configure.Generative.openai(),
+        properties=CANDIDATE_PROPERTIES,
+    )
+
+def recreate_collection(client, dry_run=False):
+    """
+    Drops and recreates the Candidates collection. All objects are deleted and
+    must be re-imported (python ingest.py --full).
+
+    Returns:
+        A summary dictionary in the same shape as bootstrap_schema().
+    """
+    summary = {
+        "collection": CANDIDATE_COLLECTION,
+        "schema_version": SCHEMA_VERSION,
+        "stored_version": stored_schema_version(client)[0],
+        "desired_hash": desired_schema_hash(),
+        "live_hash": None,
+        "actions": ["drop collection", "create collection", f"record schema version {SCHEMA_VERSION}"],
+        "conflicts": [],
+    }
+    if not dry_run:
+        if client.collections.exists(CANDIDATE_COLLECTION):
+            client.collections.delete(CANDIDATE_COLLECTION)
+        create_collection(client)
+        record_schema_version(client)
+    return summary
+
+def bootstrap_schema(client, dry_run=False):
+    """
+    Idempotently brings the Candidates collection in line with CANDIDATE_PROPERTIES.
+
+    Creates the collection if it is missing. Otherwise updates the description and
+    adds missing properties. Changes to a property's type, tokenization, index
+    flags or vectorization cannot be applied in place and are reported as
+    conflicts (see recreate_collection). Once the live schema matches,
+    SCHEMA_VERSION and the schema hash are recorded in SCHEMA_VERSION_COLLECTION;
+    nothing is written when the live and recorded hashes already match the
+    desired one.
+
+    Args:
+        client: A connected Weaviate client.
+        dry_run: Report planned changes without writing them.
+
+    Returns:
+        A dictionary summarizing what was (or would be) changed.
+    """
+    desired_hash = desired_schema_hash()
+    stored_version, stored_hash = stored_schema_version(client)
+    summary = {
+        "collection": CANDIDATE_COLLECTION,
+        "schema_version": SCHEMA_VERSION,
+        "stored_version": stored_version,
+        "desired_hash": desired_hash,
+        "live_hash": None,
+        "actions": [],
+        "conflicts": [],
+    }
+
+    def record_version():
+        if (stored_version, stored_hash) != (SCHEMA_VERSION, desired_hash):
+            summary["actions"].append(f"record schema version {SCHEMA_VERSION}")
+            if not dry_run:
+                record_schema_version(client)
+
+    if not client.collections.exists(CANDIDATE_COLLECTION):
+        summary["actions"].append("create collection")
+        if not dry_run:
+            create_collection(client)
+        record_version()
+        return summary
+
+    collection = client.collections.get(CANDIDATE_COLLECTION)
+    live_config = collection.config.get()
+    summary["live_hash"] = live_schema_hash(live_config)
+
+    if summary["live_hash"] == desired_hash:
+        record_version()
+        return summary
+
+    if (live_config.description or "").strip() != CANDIDATE_COLLECTION_DESCRIPTION.strip():
+        summary["actions"].append("update description")
+        if not dry_run:
+            collection.config.update(description=CANDIDATE_COLLECTION_DESCRIPTION)
+
+    live_properties = {p.name: _property_signature(p) for p in live_config.properties}
+    for prop in CANDIDATE_PROPERTIES:
+        desired = _property_signature(prop)
+        live = live_properties.get(prop.name)
+        if live is None:
+            summary["actions"].append(f"add property {prop.name}")
+            if not dry_run:
+                collection.config.add_property(prop)
+        elif live != desired:
+            differences = [
+                f"{field} {live[field]} -> {desired[field]}"
+                for field in _SIGNATURE_FIELDS
+                if live[field] != desired[field]
+            ]
+            summary["conflicts"].append(f"{prop.name}: {', '.join(differences)}")
+
+    # A schema with conflicts doesn't match any version; keep the last recorded one
+    if not summary["conflicts"]:
+        record_version()
+    return summary
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from logging.handlers import RotatingFileHandler
+
+# Import configuration
+from config import (
+    SLOW_QUERY_LOG_ENABLED,
+    SLOW_QUERY_THRESHOLD_MS,
+    SLOW_QUERY_LOG_PATH,
+    SLOW_QUERY_LOG_MAX_BYTES,
+    SLOW_QUERY_LOG_BACKUPS,
+)
+from utils.context_budget import response_size
+from utils.metrics import current_stages
+
+# Slow-query log. Every chat request (and every question of a batch) is
+# traced: the pipeline stages timed for utils/metrics.py also add up per
+# request, and the question, the path that answered it and the agent's
+# response are noted on the trace. Requests that took SLOW_QUERY_THRESHOLD_MS
+# or longer are written as one JSON line to SLOW_QUERY_LOG_PATH. Each line
+# holds the searches and aggregations the agent chose (collections, query
+# text, filters), the result count, the per-stage timings and the response
+# size, so a 20 s agent.run can be explained afterwards. The file rotates at
+# SLOW_QUERY_LOG_MAX_BYTES; analyze_slow_queries.py groups the entries by
+# question pattern.
+#
+# Fast requests cost a contextvar and a few dictionary updates; only slow ones
+# are serialized.
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def _get_logger():
+    """The JSON Lines logger, opened on first use."""
+    global _logger
+    with _logger_lock:
+        if _logger is not None:
+            return _logger
+        # "{pid}" gives each worker process its own file (rotation isn't safe across processes)
+        path = SLOW_QUERY_LOG_PATH.replace("{pid}", str(os.getpid()))
+        handler = RotatingFileHandler(path, maxBytes=SLOW_QUERY_LOG_MAX_BYTES, backupCount=SLOW_QUERY_LOG_BACKUPS, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger = logging.getLogger("candidate_rag_chatbot.slow_queries")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+        _logger = logger
+        return _logger
+
+
+def _plain(item):
+    """A JSON-serializable copy of an agent search, aggregation or usage object."""
+    if hasattr(item, "model_dump"):
+        return item.model_dump(mode="json", exclude_none=True)
+    if isinstance(item, tuple) and hasattr(item, "_asdict"):
+        return item._asdict()
+    return item
+
+
+def describe_searches(searches):
+    """
+    The searches of a response as logged.
+
+    The Query Agent's searches are the queries it generated (collection,
+    query text, filters). Direct and offline answers carry the result objects
+    themselves instead; those are left out, the result count covers them.
+
+    Args:
+        searches: The response's searches, a list of lists.
+
+    Returns:
+        A flat list of search descriptions.
+    """
+    described = []
+    for group in searches or []:
+        for item in group if isinstance(group, list) else [group]:
+            if isinstance(item, dict) and "object_id" in item:
+                continue
+            described.append(_plain(item))
+    return described
+
+
+def describe_aggregations(aggregations):
+    """The aggregations of a response as logged, flattened like describe_searches()."""
+    described = []
+    for group in aggregations or []:
+        for item in group if isinstance(group, list) else [group]:
+            described.append(_plain(item))
+    return described
+
+
+class RequestTrace:
+    """
+    Timings and outcome of one traced request.
+
+    Args:
+        endpoint: The route, e.g. "chat" or "chat_batch".
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started_at = time.perf_counter()
+        self.stages = {}
+        self.message = None
+        self.follow_up = False
+        self.route = None
+        self.agent_response = None
+        self.error = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    def entry(self, total_seconds, status=None):
+        """The slow-query log entry of this request."""
+        agent_response = self.agent_response
+        entry = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "endpoint": self.endpoint,
+            "status": status,
+            "route": self.route,
+            "message": self.message,
+            "follow_up": self.follow_up,
+            "total_ms": round(total_seconds * 1000, 1),
+            "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()},
+        }
+        if self.error:
+            entry["error"] = self.error
+        if agent_response is not None:
+            total_time = getattr(agent_response, "total_time", None)
+            sources = getattr(agent_response, "sources", None) or []
+            usage = getattr(agent_response, "usage", None)
+            entry.update({
+                "agent_total_time_ms": round(total_time * 1000, 1) if total_time is not None else None,
+                "collections": list(getattr(agent_response, "collection_names", None) or []),
+                "searches": describe_searches(getattr(agent_response, "searches", None)),
+                "aggregations": describe_aggregations(getattr(agent_response, "aggregations", None)),
+                "result_count": len(sources),
+                "is_partial": bool(getattr(agent_response, "is_partial_answer", False)),
+                "answer_chars": len(getattr(agent_response, "final_answer", None) or ""),
+                "response_bytes": response_size(agent_response),
+                "usage": _plain(usage) if usage is not None else None,
+            })
+        return entry
+
+    def finish(self, status=None):
+        """
+        Ends the trace and logs the request if it was slow.
+
+        Args:
+            status: The HTTP status of the response, if known.
+        """
+        if _current_trace.get() is self:
+            # Pooled threads serve other requests next
+            current_stages.set(None)
+            _current_trace.set(None)
+        total_seconds = self.elapsed()
+        if total_seconds * 1000 < SLOW_QUERY_THRESHOLD_MS or self.message is None:
+            return
+        try:
+            line = json.dumps(self.entry(total_seconds, status), ensure_ascii=False, default=str)
+            _get_logger().info(line)
+        except Exception as e:
+            print(f"Could not write slow-query log entry: {str(e)}")
+
+
+def start_trace(endpoint):
+    """
+    Starts tracing a request in the current context.
+
+    Returns:
+        The RequestTrace, or None when the slow-query log is disabled. Call
+        its finish() once the response has been sent, in the same thread.
+    """
+    if not SLOW_QUERY_LOG_ENABLED:
+        return None
+    trace = RequestTrace(endpoint)
+    current_stages.set(trace.stages)
+    _current_trace.set(trace)
+    return trace
+
+
+def trace_question(message, context):
+    """Notes the question being answered on the current trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.message = message
+        trace.follow_up = context is not None
+
+
+def trace_answer(route, agent_response):
+    """Notes the path that answered and its response on the current trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.route = route
+        trace.agent_response = agent_response
+
+
+def trace_error(error):
+    """Notes a failure on the current trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.error = f"{type(error).__name__}: {error}"
@@ -0,0 +1,130 @@
+import time
+import random
+import asyncio
+import hashlib
+
+# Import configuration
+from config import CANDIDATE_COLLECTION, STUB_LATENCY, STUB_ERROR_RATE, STUB_SEED
+from utils.query_router import DirectQueryResponse, DirectSource, format_candidate
+
+# Stand-in for the Query Agent (QUERY_BACKEND=stub), for benchmarks and load
+# tests that must run offline and reproducibly. Each query waits for a latency
+# drawn from a configurable distribution and answers with canned candidates.
+# The draw is seeded by STUB_SEED and the query text, so a query gets the same
+# latency (and the same failure, see STUB_ERROR_RATE) on every run no matter
+# how requests interleave.
+
+_CANNED_CANDIDATES = [
+    {
+        "name": "Jordan Silva",
+        "email": "jordan.silva@example.com",
+        "location": "São Paulo",
+        "current_role": "Senior Software Engineer",
+        "current_company": "Example Labs",
+        "skills": ["Python", "React", "Docker", "Amazon Web Services"],
+        "education_highest_level": "Master's Degree",
+        "salary_expectation": 120000,
+    },
+    {
+        "name": "Alex Chen",
+        "email": "alex.chen@example.com",
+        "location": "United States",
+        "current_role": "Full Stack Developer",
+        "current_company": "Sample Corp",
+        "skills": ["TypeScript", "Node JS", "PostgreSQL", "Kubernetes"],
+        "education_highest_level": "Bachelor's Degree",
+        "salary_expectation": 135000,
+    },
+    {
+        "name": "Sam Okafor",
+        "email": "sam.okafor@example.com",
+        "location": "Lagos",
+        "current_role": "Data Engineer",
+        "current_company": "Demo Analytics",
+        "skills": ["Python", "SQL", "Kafka", "Machine Learning"],
+        "education_highest_level": "Doctorate",
+        "salary_expectation": 110000,
+    },
+]
+
+
+class StubAgentError(RuntimeError):
+    """A failure injected by the stub agent (STUB_ERROR_RATE)."""
+
+
+def parse_latency(spec):
+    """
+    Parses a latency distribution spec, in milliseconds.
+
+    Supported specs:
+        fixed:MS
+        uniform:LOW:HIGH
+        normal:MEAN:STDDEV       (clipped at 0)
+        lognormal:MEDIAN:SIGMA   (SIGMA of the underlying normal, e.g. 0.5)
+
+    Returns:
+        A function (rng) -> seconds.
+
+    Raises:
+        ValueError: If the spec is malformed.
+    """
+    kind, _, arguments = spec.partition(":")
+    try:
+        values = [float(value) for value in arguments.split(":")] if arguments else []
+    except ValueError:
+        raise ValueError(f"Invalid latency spec: {spec}")
+
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1])) / 1000
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: values[0] * rng.lognormvariate(0, values[1]) / 1000
+    raise ValueError(f"Invalid latency spec: {spec}")
+
+
+class StubQueryAgent:
+    """
+    Offline stand-in for QueryAgent with reproducible latency.
+
+    Args:
+        latency: Latency spec (see parse_latency).
+        error_rate: Fraction of queries that fail with StubAgentError.
+        seed: Seed combined with each query to draw its latency and failure.
+    """
+
+    def __init__(self, latency=STUB_LATENCY, error_rate=STUB_ERROR_RATE, seed=STUB_SEED):
+        self.latency_spec = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self._latency = parse_latency(latency)
+
+    def plan(self, query):
+        """Returns (seconds, fails) for a query; the same on every run with the same seed."""
+        digest = hashlib.sha256(f"{self.seed}\x00{query}".encode("utf-8")).digest()
+        rng = random.Random(int.from_bytes(digest[:8], "big"))
+        return self._latency(rng), rng.random() < self.error_rate
+
+    def _answer(self, query, elapsed):
+        paragraphs = [f"Here are {len(_CANNED_CANDIDATES)} candidates matching \"{query}\":"] + [
+            format_candidate(index, properties) for index, properties in enumerate(_CANNED_CANDIDATES, start=1)
+        ]
+        searches = [[{"object_id": f"stub-{index}", **properties} for index, properties in enumerate(_CANNED_CANDIDATES)]]
+        sources = [DirectSource(f"stub-{index}", CANDIDATE_COLLECTION) for index in range(len(_CANNED_CANDIDATES))]
+        return DirectQueryResponse(query, "\n\n".join(paragraphs), searches, [], sources, elapsed)
+
+    def run(self, query, context=None):
+        seconds, fails = self.plan(query)
+        time.sleep(seconds)
+        if fails:
+            raise StubAgentError(f"Injected failure after {seconds * 1000:.0f} ms")
+        return self._answer(query, seconds)
+
+    async def run_async(self, query, context=None):
+        seconds, fails = self.plan(query)
+        await asyncio.sleep(seconds)
+        if fails:
+            raise StubAgentError(f"Injected failure after {seconds * 1000:.0f} ms")
+        return self._answer(query, seconds)
@@ -0,0 +1,266 @@
+import os
+import re
+import json
+import time
+import asyncio
+import importlib
+import threading
+
+# Import configuration
+from config import (
+    QUERY_BACKEND,
+    DEGRADED_LOCAL_SEARCH,
+    WARMUP_ENABLED,
+    WARMUP_QUERIES_FILE,
+    WARMUP_MAX_QUERIES,
+    WARMUP_CONCURRENCY,
+    WARMUP_RETRY_INTERVAL,
+)
+from utils.batch import run_batch
+from utils.candidate_index import get_candidate_index
+from utils.chat_pipeline import response_cache, query_router, route_query, cache_response
+from utils.query_backend import run_query
+
+# Startup warm-up. Each worker process connects to Weaviate, builds the Query
+# Agent, reads the data version, loads the local candidate index and
+# optionally answers a list of queries into the response cache, in a
+# background thread, so none of it lands on the first user requests.
+# /api/health answers as soon as the app is imported (liveness); /api/ready
+# answers 503 until the warm-up has finished (readiness), so a rolling deploy
+# only sends traffic to warm workers.
+#
+# Steps that fail are retried every WARMUP_RETRY_INTERVAL seconds: a worker
+# that can't reach Weaviate stays unready instead of serving errors. Cache
+# pre-population is best effort; queries that fail don't block readiness.
+
+
+class WarmupState:
+    """Progress of the warm-up steps of this process, reported by /api/ready."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.steps = {}
+        self.started_at = None
+
+    def expect(self, name, required=True):
+        """Registers a step; the process isn't ready until every required step succeeded."""
+        with self._lock:
+            self.steps[name] = {"status": "pending", "required": required, "attempts": 0}
+
+    def begin(self, name):
+        with self._lock:
+            step = self.steps[name]
+            step["status"] = "running"
+            step["attempts"] += 1
+
+    def succeed(self, name, seconds, detail=None):
+        with self._lock:
+            step = self.steps[name]
+            step["status"] = "ok"
+            step["duration_ms"] = round(seconds * 1000, 1)
+            step.pop("error", None)
+            if detail is not None:
+                step["detail"] = detail
+
+    def fail(self, name, error, retrying):
+        with self._lock:
+            step = self.steps[name]
+            step["status"] = "retrying" if retrying else "failed"
+            step["error"] = f"{type(error).__name__}: {error}"
+
+    def is_ready(self):
+        with self._lock:
+            return all(
+                step["status"] == "ok" or (not step["required"] and step["status"] == "failed")
+                for step in self.steps.values()
+            )
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": WARMUP_ENABLED,
+                "started_at": self.started_at,
+                "uptime_seconds": round(time.time() - self.started_at, 1) if self.started_at else None,
+                "steps": {name: dict(step) for name, step in self.steps.items()},
+            }
+
+
+state = WarmupState()
+_start_lock = threading.Lock()
+_owner_pid = None
+_async_task = None
+
+def read_queries(path):
+    """
+    Reads a warm-up query list.
+
+    Args:
+        path: A markdown file whose fenced code blocks are queries (example_queries.md),
+              a JSON Lines file of requests with a "message" field (benchmark
+              traffic), or a text file with one query per line.
+
+    Returns:
+        The distinct single-line queries, in file order.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith(".md"):
+        queries = [block.strip() for block in re.findall(r"```\n(.*?)\n```", text, re.S)]
+    elif path.endswith(".jsonl"):
+        queries = [json.loads(line).get("message") or "" for line in text.splitlines() if line.strip()]
+    else:
+        queries = [line.strip() for line in text.splitlines()]
+    return list(dict.fromkeys(query for query in queries if query and "\n" not in query))
+
+def _run_step(name, function, retry=True):
+    """
+    Runs one warm-up step, retrying failures if `retry`.
+
+    Returns:
+        True if the step succeeded.
+    """
+    while True:
+        state.begin(name)
+        start_time = time.perf_counter()
+        try:
+            detail = function()
+        except Exception as e:
+            print(f"Warm-up step {name} failed: {str(e)}")
+            state.fail(name, e, retry)
+            if not retry:
+                return False
+            time.sleep(WARMUP_RETRY_INTERVAL)
+            continue
+        state.succeed(name, time.perf_counter() - start_time, detail)
+        return True
+
+def _connect():
+    from utils.weaviate_client import get_weaviate_client
+    get_weaviate_client()
+
+def _build_agent():
+    from utils.weaviate_client import get_query_agent
+    get_query_agent()
+
+def _load_data_version():
+    from utils.data_version import refresh_data_version
+    return {"version": refresh_data_version()}
+
+def _load_index():
+    index = get_candidate_index()
+    if query_router is not None:
+        query_router.vocabulary(index)
+    return {"candidates": index.size} if index is not None else None
+
+def _load_fallback_index():
+    # Degraded answers search it while the agent is unavailable
+    from utils.bm25_backend import get_bm25_index
+    return {"candidates": get_bm25_index().size}
+
+def _prefill_cache():
+    """Answers the warm-up queries that aren't cached yet; agent answers land in the response cache."""
+    queries = read_queries(WARMUP_QUERIES_FILE)[:WARMUP_MAX_QUERIES]
+
+    def answer(index, message):
+        try:
+            if response_cache.get(message) is not None:
+                return {"result": "cached"}
+            # Direct answers aren't cached, but this loads what the router needs
+            if route_query(message, None) is not None:
+                return {"result": "direct"}
+            cache_response(message, None, run_query(message))
+            return {"result": "agent"}
+        except Exception as e:
+            print(f"Warm-up query failed: {message!r}: {str(e)}")
+            return {"result": "failed"}
+
+    counts = {"queries": len(queries), "cached": 0, "direct": 0, "agent": 0, "failed": 0}
+    for result in run_batch(queries, answer, WARMUP_CONCURRENCY):
+        counts[result["result"]] += 1
+    return counts
+
+def _steps():
+    """The (name, function, required) warm-up steps for the configured backend."""
+    steps = []
+    if QUERY_BACKEND == "weaviate":
+        steps.append(("weaviate_connection", _connect, True))
+        steps.append(("query_agent", _build_agent, True))
+    # Read here so requests never wait on the data version store
+    steps.append(("data_version", _load_data_version, True))
+    steps.append(("candidate_index", _load_index, True))
+    if QUERY_BACKEND == "weaviate" and DEGRADED_LOCAL_SEARCH:
+        steps.append(("fallback_index", _load_fallback_index, False))
+    if WARMUP_QUERIES_FILE and response_cache is not None:
+        steps.append(("response_cache", _prefill_cache, False))
+    return steps
+
+def _warm_up(steps):
+    start_time = time.perf_counter()
+    for name, function, required in steps:
+        _run_step(name, function, retry=required)
+    print(f"Warm-up finished in {time.perf_counter() - start_time:.1f} s")
+
+def start_warmup():
+    """
+    Starts the warm-up of this process in a background thread, once.
+
+    Safe to call on every request: under a pre-forking server the thread
+    started in the parent doesn't exist in the workers, so each worker starts
+    its own the first time this is called in it.
+    """
+    global state, _owner_pid
+    if not WARMUP_ENABLED or _owner_pid == os.getpid():
+        return
+    with _start_lock:
+        if _owner_pid == os.getpid():
+            return
+        _owner_pid = os.getpid()
+        state = WarmupState()
+        state.started_at = time.time()
+        steps = _steps()
+        for name, _, required in steps:
+            state.expect(name, required)
+        threading.Thread(target=_warm_up, args=(steps,), name="warmup", daemon=True).start()
+
+async def _warm_up_async_agent():
+    # The first import of weaviate would block the event loop
+    weaviate_client = await asyncio.to_thread(importlib.import_module, "utils.weaviate_client")
+    while True:
+        state.begin("async_query_agent")
+        start_time = time.perf_counter()
+        try:
+            await weaviate_client.get_async_query_agent()
+        except Exception as e:
+            print(f"Warm-up step async_query_agent failed: {str(e)}")
+            state.fail("async_query_agent", e, True)
+            await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+            continue
+        state.succeed("async_query_agent", time.perf_counter() - start_time)
+        return
+
+def start_async_warmup():
+    """
+    Connects the async Weaviate client and builds the AsyncQueryAgent (asgi.py).
+
+    Must be called on the server's event loop, which the async client belongs
+    to. The step is registered before this returns, so the process isn't
+    reported ready until it has succeeded; failures are retried like the
+    other required steps.
+    """
+    global _async_task
+    if not WARMUP_ENABLED or QUERY_BACKEND != "weaviate":
+        return
+    start_warmup()
+    state.expect("async_query_agent")
+    _async_task = asyncio.get_running_loop().create_task(_warm_up_async_agent())
+
+def readiness():
+    """
+    Returns (ready, body) for /api/ready.
+
+    Without warm-up (WARMUP_ENABLED=False) the process is always ready.
+    """
+    start_warmup()
+    ready = not WARMUP_ENABLED or state.is_ready()
+    body = {"status": "ready" if ready else "warming_up", "warmup": state.stats()}
+    return ready, body
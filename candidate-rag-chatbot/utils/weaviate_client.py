@@ -1,96 +1,482 @@
 import os
+import time
+import atexit
+import asyncio
+import threading
 import weaviate
 from weaviate.classes.init import Auth
-from weaviate.agents.query import QueryAgent
-from weaviate.exceptions import WeaviateQueryError
+from weaviate.agents.query import QueryAgent, AsyncQueryAgent
+from weaviate.exceptions import (
+    WeaviateQueryError,
+    WeaviateConnectionError,
+    WeaviateClosedClientError,
+    WeaviateGRPCUnavailableError,
+)
 
 # Import configuration
-from config import WEAVIATE_URL, WEAVIATE_API_KEY, OPENAI_API_KEY, CANDIDATE_COLLECTION, CANDIDATE_COLLECTION_DESCRIPTION
+from config import (
+    WEAVIATE_URL,
+    WEAVIATE_API_KEY,
+    OPENAI_API_KEY,
+    CANDIDATE_COLLECTION,
+    WEAVIATE_HEALTH_CHECK_INTERVAL,
+    AGENT_TIMEOUT,
+)
+from utils.metrics import CLIENT_CONNECT, AGENT_CONSTRUCTION, AGENT_RUN, AGENT_STREAM
 
-def get_weaviate_client():
+# Errors that indicate the pooled connection itself is broken (as opposed to a bad query)
+CONNECTION_ERRORS = (
+    WeaviateConnectionError,
+    WeaviateClosedClientError,
+    WeaviateGRPCUnavailableError,
+)
+
+# Process-wide connection state. A single Weaviate client is shared by all
+# request threads of a worker; the lock only guards (re)creation, not use.
+_lock = threading.Lock()
+_client = None
+_query_agent = None
+_owner_pid = None
+_last_health_check = 0.0
+
+
+# Async client state for the ASGI server (asgi.py). The async client is bound
+# to the event loop it was connected on, so it is tracked together with it.
+_async_lock = None
+_async_client = None
+_async_query_agent = None
+_async_loop = None
+_async_last_health_check = 0.0
+
+
+def _connection_params():
+    """Returns the cluster URL, credentials and headers shared by the sync and async clients."""
+    # Validate required API keys
+    if not OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY is required but not provided")
+
+    return {
+        "cluster_url": WEAVIATE_URL,
+        "auth_credentials": Auth.api_key(WEAVIATE_API_KEY),
+        "headers": {
+            "X-OpenAI-Api-Key": OPENAI_API_KEY
+        }
+    }
+
+def _connect():
     """
-    Establishes a connection to the Weaviate cluster.
-    
+    Opens a new connection to the Weaviate cluster.
+
     Returns:
-        A Weaviate client instance.
+        A connected Weaviate client instance.
     """
     try:
-        # Validate required API keys
-        if not OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY is required but not provided")
-        
         # Connect to Weaviate
-        client = weaviate.connect_to_weaviate_cloud(
-            cluster_url=WEAVIATE_URL,
-            auth_credentials=Auth.api_key(WEAVIATE_API_KEY),
-            headers={
-                "X-OpenAI-Api-Key": OPENAI_API_KEY
-            }
-        )
-        
-        # Update collection description if it exists
-        try:
-            candidates = client.collections.get(CANDIDATE_COLLECTION)
-            candidates.config.update(description=CANDIDATE_COLLECTION_DESCRIPTION)
-            print(f"Updated collection description for {CANDIDATE_COLLECTION}")
-        except Exception as e:
-            print(f"Note: Could not update collection description: {e}")
-        
+        with CLIENT_CONNECT.time():
+            client = weaviate.connect_to_weaviate_cloud(**_connection_params())
+
         return client
-    
+
     except Exception as e:
         print(f"Error connecting to Weaviate: {str(e)}")
         raise
 
+def _close_quietly(client):
+    """Closes a client, ignoring errors from an already broken connection."""
+    try:
+        client.close()
+    except Exception as e:
+        print(f"Note: Error while closing Weaviate client: {e}")
+
+def _reset_after_fork():
+    """
+    Drops connection state inherited from a parent process.
+
+    Pre-forking servers (e.g. gunicorn with --preload) copy module globals into
+    every worker. Sockets must not be shared across processes, so each worker
+    builds its own connection the first time it needs one.
+    """
+    global _client, _query_agent, _owner_pid, _last_health_check
+    _client = None
+    _query_agent = None
+    _owner_pid = os.getpid()
+    _last_health_check = 0.0
+
+def _is_healthy(client):
+    """Returns True if the client is connected and the cluster reports ready."""
+    try:
+        return client.is_connected() and client.is_ready()
+    except Exception as e:
+        print(f"Weaviate health check failed: {e}")
+        return False
+
+def get_weaviate_client():
+    """
+    Returns the process-wide Weaviate client, connecting lazily on first use.
+
+    The connection is health-checked at most once every
+    WEAVIATE_HEALTH_CHECK_INTERVAL seconds and transparently re-established if
+    the cluster stopped responding.
+
+    Returns:
+        A Weaviate client instance.
+    """
+    global _client, _query_agent, _last_health_check
+
+    # Fast path: a warm client that was checked recently
+    client = _client
+    if (
+        client is not None
+        and _owner_pid == os.getpid()
+        and time.monotonic() - _last_health_check < WEAVIATE_HEALTH_CHECK_INTERVAL
+    ):
+        return client
+
+    with _lock:
+        if _owner_pid != os.getpid():
+            _reset_after_fork()
+
+        if _client is not None:
+            if time.monotonic() - _last_health_check < WEAVIATE_HEALTH_CHECK_INTERVAL:
+                return _client
+            if _is_healthy(_client):
+                _last_health_check = time.monotonic()
+                return _client
+            print("Weaviate connection is unhealthy, reconnecting")
+            _close_quietly(_client)
+            _client = None
+            _query_agent = None
+
+        _client = _connect()
+        _last_health_check = time.monotonic()
+        return _client
+
 def get_query_agent(client=None):
     """
-    Creates a Weaviate Query Agent for the Candidates collection.
-    
+    Returns a Weaviate Query Agent for the Candidates collection.
+
+    Without an explicit client the agent is built once per process on top of
+    the pooled connection and reused by every request.
+
     Args:
-        client: An existing Weaviate client instance or None to create a new one.
-        
+        client: An existing Weaviate client instance or None to use the pooled one.
+
     Returns:
         A QueryAgent instance.
     """
-    if client is None:
-        client = get_weaviate_client()
-        
+    global _query_agent
+
     try:
-        # Create the Query Agent with access to the Candidates collection
-        query_agent = QueryAgent(
-            client=client,
-            collections=[CANDIDATE_COLLECTION]
-        )
-        
-        return query_agent
-    
+        if client is not None:
+            # Caller manages its own connection; don't cache the agent
+            with AGENT_CONSTRUCTION.time():
+                return QueryAgent(
+                    client=client,
+                    collections=[CANDIDATE_COLLECTION],
+                    timeout=AGENT_TIMEOUT
+                )
+
+        pooled_client = get_weaviate_client()
+        with _lock:
+            if _query_agent is None or _client is not pooled_client:
+                # Create the Query Agent with access to the Candidates collection
+                with AGENT_CONSTRUCTION.time():
+                    _query_agent = QueryAgent(
+                        client=pooled_client,
+                        collections=[CANDIDATE_COLLECTION],
+                        timeout=AGENT_TIMEOUT
+                    )
+            return _query_agent
+
     except Exception as e:
         print(f"Error creating Query Agent: {str(e)}")
         raise
 
+def invalidate_connection(client=None):
+    """
+    Discards the pooled connection so the next request reconnects.
+
+    Args:
+        client: Only invalidate if the pooled client is still this instance.
+                Prevents a slow failing request from closing a fresh connection.
+    """
+    global _client, _query_agent, _last_health_check
+    with _lock:
+        if _client is None or (client is not None and _client is not client):
+            return
+        _close_quietly(_client)
+        _client = None
+        _query_agent = None
+        _last_health_check = 0.0
+
+def close_weaviate_client():
+    """Closes the pooled Weaviate connection. Registered to run at interpreter exit."""
+    global _client, _query_agent
+    with _lock:
+        if _client is not None and _owner_pid == os.getpid():
+            _close_quietly(_client)
+        _client = None
+        _query_agent = None
+
+atexit.register(close_weaviate_client)
+
 def run_query(query, context=None):
     """
     Executes a natural language query using the Weaviate Query Agent.
-    
+
+    If the pooled connection turns out to be broken the query is retried once
+    on a fresh connection.
+
     Args:
         query: The natural language query string.
         context: Optional previous query response for follow-up questions.
-        
+
     Returns:
         The QueryAgent response.
     """
+    for attempt in range(2):
+        client = None
+        try:
+            # Get the shared Query Agent
+            client = get_weaviate_client()
+            agent = get_query_agent()
+
+            # Run the query
+            with AGENT_RUN.time():
+                response = agent.run(query, context=context)
+
+            return response
+
+        except CONNECTION_ERRORS as e:
+            print(f"Weaviate connection error: {str(e)}")
+            invalidate_connection(client)
+            if attempt == 1:
+                raise
+        except WeaviateQueryError as e:
+            print(f"Weaviate query error: {str(e)}")
+            raise
+        except Exception as e:
+            print(f"Error executing query: {str(e)}")
+            raise
+
+def run_query_stream(query, context=None):
+    """
+    Executes a natural language query and yields the agent's output as it is produced.
+
+    Yields the agent's progress messages, streamed answer tokens and finally the
+    complete response (objects with output_type "progress_message",
+    "streamed_tokens" and "final_state"). Agents without streaming support only
+    yield the final response.
+
+    Args:
+        query: The natural language query string.
+        context: Optional previous query response for follow-up questions.
+    """
+    for attempt in range(2):
+        client = None
+        started = False
+        try:
+            # Get the shared Query Agent
+            client = get_weaviate_client()
+            agent = get_query_agent()
+
+            if not hasattr(agent, "stream"):
+                with AGENT_RUN.time():
+                    response = agent.run(query, context=context)
+                yield response
+                return
+
+            with AGENT_STREAM.time():
+                for output in agent.stream(query, context=context, include_progress=True, include_final_state=True):
+                    started = True
+                    yield output
+            return
+
+        except CONNECTION_ERRORS as e:
+            print(f"Weaviate connection error: {str(e)}")
+            invalidate_connection(client)
+            # Output already sent to the caller can't be taken back, so only retry a stream that never started
+            if attempt == 1 or started:
+                raise
+        except WeaviateQueryError as e:
+            print(f"Weaviate query error: {str(e)}")
+            raise
+        except Exception as e:
+            print(f"Error executing streaming query: {str(e)}")
+            raise
+
+
+async def get_async_weaviate_client():
+    """
+    Async counterpart of get_weaviate_client() for the ASGI server.
+
+    One async client is kept per process (and event loop), connected lazily,
+    health-checked every WEAVIATE_HEALTH_CHECK_INTERVAL seconds and reconnected
+    when the cluster stopped responding.
+
+    Returns:
+        A connected WeaviateAsyncClient instance.
+    """
+    global _async_lock, _async_client, _async_query_agent, _async_loop, _async_last_health_check
+
+    loop = asyncio.get_running_loop()
+    if (
+        _async_client is not None
+        and _async_loop is loop
+        and time.monotonic() - _async_last_health_check < WEAVIATE_HEALTH_CHECK_INTERVAL
+    ):
+        return _async_client
+
+    if _async_lock is None or _async_loop is not loop:
+        # First use on this loop; anything created on another loop is unusable here
+        _async_lock = asyncio.Lock()
+        _async_client = None
+        _async_query_agent = None
+        _async_loop = loop
+
+    async with _async_lock:
+        if _async_client is not None:
+            if time.monotonic() - _async_last_health_check < WEAVIATE_HEALTH_CHECK_INTERVAL:
+                return _async_client
+            try:
+                healthy = _async_client.is_connected() and await _async_client.is_ready()
+            except Exception as e:
+                print(f"Weaviate health check failed: {e}")
+                healthy = False
+            if healthy:
+                _async_last_health_check = time.monotonic()
+                return _async_client
+            print("Async Weaviate connection is unhealthy, reconnecting")
+            await _close_async_quietly(_async_client)
+            _async_client = None
+            _async_query_agent = None
+
+        try:
+            with CLIENT_CONNECT.time():
+                client = weaviate.use_async_with_weaviate_cloud(**_connection_params())
+                await client.connect()
+        except Exception as e:
+            print(f"Error connecting to Weaviate: {str(e)}")
+            raise
+
+        _async_client = client
+        _async_last_health_check = time.monotonic()
+        return _async_client
+
+async def _close_async_quietly(client):
     try:
-        # Get the Query Agent
-        agent = get_query_agent()
-        
-        # Run the query
-        response = agent.run(query, context=context)
-        
-        return response
-    
-    except WeaviateQueryError as e:
-        print(f"Weaviate query error: {str(e)}")
-        raise
+        await client.close()
+    except Exception as e:
+        print(f"Note: Error while closing async Weaviate client: {e}")
+
+async def get_async_query_agent():
+    """
+    Returns the process-wide AsyncQueryAgent for the Candidates collection.
+
+    Returns:
+        An AsyncQueryAgent instance.
+    """
+    global _async_query_agent
+
+    client = await get_async_weaviate_client()
+    try:
+        if _async_query_agent is None or _async_client is not client:
+            with AGENT_CONSTRUCTION.time():
+                _async_query_agent = AsyncQueryAgent(
+                    client=client,
+                    collections=[CANDIDATE_COLLECTION],
+                    timeout=AGENT_TIMEOUT
+                )
+        return _async_query_agent
+
     except Exception as e:
-        print(f"Error executing query: {str(e)}")
+        print(f"Error creating Query Agent: {str(e)}")
         raise
+
+async def invalidate_async_connection(client=None):
+    """Discards the pooled async connection (if it is still `client`) so the next call reconnects."""
+    global _async_client, _async_query_agent, _async_last_health_check
+    if _async_client is None or (client is not None and _async_client is not client):
+        return
+    stale, _async_client, _async_query_agent = _async_client, None, None
+    _async_last_health_check = 0.0
+    await _close_async_quietly(stale)
+
+async def close_async_weaviate_client():
+    """Closes the pooled async connection. Called by the ASGI server on shutdown."""
+    global _async_client, _async_query_agent
+    if _async_client is not None:
+        await _close_async_quietly(_async_client)
+    _async_client = None
+    _async_query_agent = None
+
+async def run_query_async(query, context=None):
+    """
+    Async counterpart of run_query(): the worker's event loop keeps serving other
+    requests while the agent call waits on the network.
+
+    Args:
+        query: The natural language query string.
+        context: Optional previous query response for follow-up questions.
+
+    Returns:
+        The QueryAgent response.
+    """
+    for attempt in range(2):
+        client = None
+        try:
+            client = await get_async_weaviate_client()
+            agent = await get_async_query_agent()
+            with AGENT_RUN.time():
+                return await agent.run(query, context=context)
+
+        except CONNECTION_ERRORS as e:
+            print(f"Weaviate connection error: {str(e)}")
+            await invalidate_async_connection(client)
+            if attempt == 1:
+                raise
+        except WeaviateQueryError as e:
+            print(f"Weaviate query error: {str(e)}")
+            raise
+        except Exception as e:
+            print(f"Error executing query: {str(e)}")
+            raise
+
+async def run_query_stream_async(query, context=None):
+    """
+    Async counterpart of run_query_stream().
+
+    Args:
+        query: The natural language query string.
+        context: Optional previous query response for follow-up questions.
+    """
+    for attempt in range(2):
+        client = None
+        started = False
+        try:
+            client = await get_async_weaviate_client()
+            agent = await get_async_query_agent()
+
+            if not hasattr(agent, "stream"):
+                with AGENT_RUN.time():
+                    response = await agent.run(query, context=context)
+                yield response
+                return
+
+            with AGENT_STREAM.time():
+                async for output in agent.stream(query, context=context, include_progress=True, include_final_state=True):
+                    started = True
+                    yield output
+            return
+
+        except CONNECTION_ERRORS as e:
+            print(f"Weaviate connection error: {str(e)}")
+            await invalidate_async_connection(client)
+            if attempt == 1 or started:
+                raise
+        except WeaviateQueryError as e:
+            print(f"Weaviate query error: {str(e)}")
+            raise
+        except Exception as e:
+            print(f"Error executing streaming query: {str(e)}")
+            raise
@@ -1,16 +1,25 @@
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:5000"
 
+// Seconds the API has to answer a chat message. Sent as the request's deadline;
+// the API replies with a partial answer or an error by then, so the fetch is
+// only aborted if the reply doesn't arrive shortly after.
+const CHAT_TIMEOUT_SECONDS = 30
+
 export async function sendMessage(message: string, conversationId?: string | null) {
+  const controller = new AbortController()
+  const timer = setTimeout(() => controller.abort(), (CHAT_TIMEOUT_SECONDS + 5) * 1000)
   try {
     const response = await fetch(`${API_BASE_URL}/api/chat`, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
+        "X-Request-Timeout": String(CHAT_TIMEOUT_SECONDS),
       },
       body: JSON.stringify({
         message,
         ...(conversationId && { conversation_id: conversationId }),
       }),
+      signal: controller.signal,
     })
 
     if (!response.ok) {
@@ -22,6 +31,8 @@ export async function sendMessage(message: string, conversationId?: string | nul
   } catch (error) {
     console.error("Error sending message:", error)
     throw error
+  } finally {
+    clearTimeout(timer)
   }
 }
 